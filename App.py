@@ -1,19 +1,37 @@
 import streamlit as st
 import os
 import json
+import time
+import uuid
 import base64
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from ai_helpers import (
     enhance_course_description, 
-    process_document, 
     generate_learning_objectives,
     generate_prerequisites,
     generate_learning_methods,
+    generate_course_setup,
     generate_course_structure,
     generate_chapter_content,
+    revise_chapter_fragment,
     generate_quiz,
     generate_podcast_script,
-    generate_podcast_audio
+    generate_podcast_audio,
+    COURSE_CONTEXT_CHARS,
+    CHAPTER_CONTEXT_CHARS
 )
+from artifact_graph import PODCAST, artifact_fingerprints, reconcile_artifacts, chapter_artifact_id, quiz_artifact_id
+from course_export import ExportCache, build_course_bundle, json_payload, podcast_script_text
+from course_views import render_chapter_outline, render_chapter_content, render_quiz_questions, render_podcast_sections
+from document_corpus import DocumentCorpus
+from document_ingestion import IngestionPipeline, load_stored_document
+from llm_metrics import get_metrics, start_metrics_server
+from llm_providers import Credentials, resolve_api_key
+from llm_coalescing import make_request_key
+from llm_scheduler import estimate_tokens
+from prefetch import Prefetcher
+from shared_store import REPLICA_ID, get_draft_store, get_document_store
 
 # Configuration de la page
 st.set_page_config(
@@ -23,15 +41,21 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Exposer les métriques pour Prometheus si un port est configuré
+if os.environ.get("METRICS_PORT"):
+    start_metrics_server(int(os.environ["METRICS_PORT"]), os.environ.get("METRICS_HOST", "127.0.0.1"))
+
 # Initialisation des variables de session si elles n'existent pas
 if 'api_provider' not in st.session_state:
     st.session_state.api_provider = "openai"
+if 'api_keys' not in st.session_state:
+    st.session_state.api_keys = {}
 if 'enhanced_description' not in st.session_state:
     st.session_state.enhanced_description = ""
 if 'uploaded_documents' not in st.session_state:
     st.session_state.uploaded_documents = []
-if 'document_embeddings' not in st.session_state:
-    st.session_state.document_embeddings = {}
+if 'document_corpus' not in st.session_state:
+    st.session_state.document_corpus = DocumentCorpus()
 if 'learning_methods' not in st.session_state:
     st.session_state.learning_methods = []
 if 'learning_objectives' not in st.session_state:
@@ -48,6 +72,33 @@ if 'podcast_script' not in st.session_state:
     st.session_state.podcast_script = {}
 if 'podcast_audio' not in st.session_state:
     st.session_state.podcast_audio = {}
+if 'prefetcher' not in st.session_state:
+    st.session_state.prefetcher = Prefetcher()
+if 'prefetched_quiz_settings' not in st.session_state:
+    st.session_state.prefetched_quiz_settings = {}
+if 'prefetched_podcast' not in st.session_state:
+    st.session_state.prefetched_podcast = None
+if 'export_cache' not in st.session_state:
+    st.session_state.export_cache = ExportCache()
+if 'artifact_inputs' not in st.session_state:
+    st.session_state.artifact_inputs = {}
+if 'stale_artifacts' not in st.session_state:
+    st.session_state.stale_artifacts = {}
+
+# Paramètres par défaut des formulaires de quiz et de podcast (utilisés aussi pour le préchargement)
+DEFAULT_QUIZ_SETTINGS = (10, "Moyen", ("Choix multiple", "Vrai/Faux"))
+DEFAULT_PODCAST_SETTINGS = ("Interview", "15-20 minutes", "Étudiants")
+
+# Éléments du brouillon de cours enregistré dans le stockage partagé (jamais les clés API)
+DRAFT_KEYS = (
+    "course_title", "course_description", "category", "duration", "difficulty", "modules", "price",
+    "enhanced_description", "learning_objectives", "prerequisites", "learning_methods",
+    "course_structure", "chapter_contents", "quizzes", "podcast_script", "podcast_audio", "uploaded_documents",
+    "artifact_inputs", "stale_artifacts"
+)
+
+# Taille maximale d'un document importé (Mo): au-delà de 200, relever aussi server.maxUploadSize de Streamlit
+MAX_DOCUMENT_MB = int(os.environ.get("MAX_DOCUMENT_MB", "200"))
 
 # Titre principal de l'application
 st.title("ZEY LMS - Assistant de Création de Contenu Pédagogique")
@@ -55,6 +106,11 @@ st.title("ZEY LMS - Assistant de Création de Contenu Pédagogique")
 # Création des onglets
 tabs = st.tabs(["Infos cours", "Prérequis", "Générer un cours", "Générer un quizz", "Générer un podcast"])
 
+# Fonction pour obtenir les clés API saisies dans cette session (jamais écrites dans
+# os.environ, partagé par toutes les sessions du serveur)
+def session_credentials():
+    return Credentials.from_keys(st.session_state.api_keys)
+
 # Fonction pour améliorer la description
 def enhance_description():
     title = st.session_state.course_title
@@ -68,7 +124,8 @@ def enhance_description():
         enhanced = enhance_course_description(
             title=title,
             initial_description=initial_description,
-            api_provider=st.session_state.api_provider
+            api_provider=st.session_state.api_provider,
+            api_key=session_credentials()
         )
         st.session_state.enhanced_description = enhanced
         st.session_state.course_description = enhanced
@@ -83,7 +140,7 @@ def generate_objectives():
         return
     
     with st.spinner("Génération des objectifs d'apprentissage en cours..."):
-        objectives = generate_learning_objectives(title, description)
+        objectives = generate_learning_objectives(title, description, api_provider=st.session_state.api_provider, api_key=session_credentials())
         st.session_state.learning_objectives = objectives
 
 # Fonction pour générer des prérequis
@@ -96,7 +153,7 @@ def generate_prereqs():
         return
     
     with st.spinner("Génération des prérequis en cours..."):
-        prereqs = generate_prerequisites(title, description)
+        prereqs = generate_prerequisites(title, description, api_provider=st.session_state.api_provider, api_key=session_credentials())
         st.session_state.prerequisites = prereqs
 
 # Fonction pour générer des méthodes d'apprentissage
@@ -109,9 +166,54 @@ def generate_methods():
         return
     
     with st.spinner("Génération des méthodes d'apprentissage en cours..."):
-        methods = generate_learning_methods(title, description)
+        methods = generate_learning_methods(title, description, api_provider=st.session_state.api_provider, api_key=session_credentials())
         st.session_state.learning_methods = methods
 
+# Fonction pour générer en un seul appel les objectifs, prérequis et méthodes
+def generate_setup():
+    title = st.session_state.course_title
+    description = st.session_state.course_description
+    
+    if not title or not description:
+        st.warning("Veuillez d'abord remplir le titre et la description du cours dans l'onglet 'Infos cours'.")
+        return
+    
+    with st.spinner("Génération des objectifs, prérequis et méthodes en cours..."):
+        setup = generate_course_setup(title, description, api_provider=st.session_state.api_provider, api_key=session_credentials())
+    
+    if "error" in setup:
+        st.error(setup["error"])
+        return
+    
+    st.session_state.learning_objectives = setup["learning_objectives"]
+    st.session_state.prerequisites = setup["prerequisites"]
+    st.session_state.learning_methods = setup["learning_methods"]
+
+# Fonction pour récupérer le contexte des documents uploadés
+def get_document_context():
+    # Corpus indexé des documents cochés (texte intégral), ou None s'il est vide
+    corpus = st.session_state.document_corpus
+    documents = corpus.documents()
+    selected = [name for name in documents if st.session_state.get(f"use_document_{name}", True)]
+    if not selected:
+        return None
+    return corpus if len(selected) == len(documents) else corpus.restricted_to(selected)
+
+# Fonction pour construire les paramètres de génération d'un chapitre
+def chapter_generation_kwargs(module, chapter):
+    return dict(
+        course_title=st.session_state.course_title,
+        course_description=st.session_state.course_description,
+        module_title=module["module_title"],
+        chapter_title=chapter["chapter_title"],
+        chapter_description=chapter["description"],
+        key_points=chapter["key_points"],
+        document_corpus=get_document_context(),
+        course_structure=st.session_state.course_structure,
+        api_provider=st.session_state.api_provider,
+        api_key=session_credentials()
+    )
+
 # Fonction pour générer la structure du cours
 def generate_course_content():
     title = st.session_state.course_title
@@ -128,15 +230,8 @@ def generate_course_content():
         st.warning("Veuillez d'abord remplir le titre et la description du cours dans l'onglet 'Infos cours'.")
         return
     
-    # Récupérer le texte des documents uploadés si disponible
-    document_text = ""
-    document_embeddings = []
-    if st.session_state.uploaded_documents:
-        # Concaténer le texte de tous les documents
-        document_text = "\n\n".join([doc["text"] for doc in st.session_state.uploaded_documents])
-        # Utiliser les embeddings du premier document (si disponible)
-        if st.session_state.document_embeddings:
-            document_embeddings = list(st.session_state.document_embeddings.values())[0]
+    # Récupérer le corpus des documents uploadés si disponible
+    document_corpus = get_document_context()
     
     with st.spinner("Génération de la structure du cours en cours..."):
         course_structure = generate_course_structure(
@@ -145,8 +240,9 @@ def generate_course_content():
             duration=duration,
             difficulty=difficulty,
             num_modules=num_modules,
-            document_text=document_text,
-            document_embeddings=document_embeddings
+            document_corpus=document_corpus,
+            api_provider=st.session_state.api_provider,
+            api_key=session_credentials()
         )
         
         st.session_state.course_structure = course_structure
@@ -180,30 +276,57 @@ def generate_chapter_detail(module_number, chapter_number):
     if chapter_key in st.session_state.chapter_contents:
         return
     
-    # Récupérer le texte des documents uploadés si disponible
-    document_text = ""
-    document_embeddings = []
-    if st.session_state.uploaded_documents:
-        # Concaténer le texte de tous les documents
-        document_text = "\n\n".join([doc["text"] for doc in st.session_state.uploaded_documents])
-        # Utiliser les embeddings du premier document (si disponible)
-        if st.session_state.document_embeddings:
-            document_embeddings = list(st.session_state.document_embeddings.values())[0]
-    
     with st.spinner(f"Génération du contenu détaillé pour le chapitre {chapter_number}..."):
-        chapter_content = generate_chapter_content(
-            course_title=title,
-            course_description=description,
+        # Mêmes paramètres que le préchargement: une requête en cours est partagée
+        chapter_content = generate_chapter_content(**chapter_generation_kwargs(module, chapter))
+        
+        # Stocker le contenu du chapitre
+        st.session_state.chapter_contents[chapter_key] = chapter_content
+        record_artifact_inputs(chapter_artifact_id(module_number, chapter_number))
+
+# Fonction pour lister les parties d'un chapitre qui peuvent être réécrites séparément
+def chapter_fragment_options(chapter_content):
+    options = {("introduction", None): "Introduction"}
+    for index, section in enumerate(chapter_content.get("sections", [])):
+        options[("section", index)] = f"Section {index + 1}: {section.get('title', '')}"
+    options[("conclusion", None)] = "Conclusion"
+    options[("exercises", None)] = "Exercices"
+    return options
+
+# Fonction pour régénérer, développer ou raccourcir une seule partie d'un chapitre
+def revise_chapter_part(module_number, chapter_number):
+    chapter_key = f"{module_number}_{chapter_number}"
+    module = next((mod for mod in st.session_state.course_structure["modules"] if mod["module_number"] == module_number), None)
+    chapter = next((chap for chap in module["chapters"] if chap["chapter_number"] == chapter_number), None) if module else None
+    chapter_content = st.session_state.chapter_contents.get(chapter_key)
+    if not chapter or not chapter_content:
+        st.error(f"Module {module_number} ou chapitre {chapter_number} non trouvé.")
+        return
+    
+    fragment, section_index = st.session_state[f"revise_part_{chapter_key}"]
+    action = st.session_state[f"revise_action_{chapter_key}"]
+    
+    with st.spinner(f"Réécriture d'une partie du chapitre {chapter_number}..."):
+        revised = revise_chapter_fragment(
+            course_title=st.session_state.course_title,
             module_title=module["module_title"],
             chapter_title=chapter["chapter_title"],
-            chapter_description=chapter["description"],
             key_points=chapter["key_points"],
-            document_text=document_text,
-            document_embeddings=document_embeddings
+            chapter_content=chapter_content,
+            fragment=fragment,
+            section_index=section_index,
+            action=action,
+            instructions=st.session_state.get(f"revise_instructions_{chapter_key}", ""),
+            document_corpus=get_document_context(),
+            api_provider=st.session_state.api_provider,
+            api_key=session_credentials()
         )
-        
-        # Stocker le contenu du chapitre
-        st.session_state.chapter_contents[chapter_key] = chapter_content
+    
+    # En cas d'erreur, le chapitre actuel est conservé
+    if "error" in revised:
+        st.error(f"Erreur: {revised['error']}")
+    else:
+        st.session_state.chapter_contents[chapter_key] = revised
 
 # Fonction pour ajouter une méthode d'apprentissage
 def add_learning_method(method=""):
@@ -239,12 +362,24 @@ def process_uploaded_documents(uploaded_files):
     if not uploaded_files:
         return
     
-    # Vérifier si la clé API OpenAI est disponible
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
+    # Les embeddings utilisent OpenAI, sauf avec le fournisseur local
+    api_provider = "mock" if st.session_state.api_provider == "mock" else "openai"
+    
+    # Vérifier si la clé API OpenAI est disponible (saisie dans la session ou configurée sur le serveur)
+    credentials = session_credentials()
+    if not resolve_api_key(api_provider, credentials):
         st.error("Clé API OpenAI non trouvée. Veuillez configurer la clé API dans la barre latérale.")
         return
     
+    # Les embeddings des documents et des requêtes doivent venir du même fournisseur
+    corpus = st.session_state.document_corpus
+    if corpus.api_provider != api_provider:
+        if len(corpus):
+            st.info("Le fournisseur d'embeddings a changé: les documents déjà traités doivent l'être à nouveau.")
+        st.session_state.document_corpus = corpus = DocumentCorpus(api_provider)
+        st.session_state.uploaded_documents = []
+    
+    files = []
     for uploaded_file in uploaded_files:
         # Vérifier si le fichier a déjà été traité
         if uploaded_file.name in [doc["name"] for doc in st.session_state.uploaded_documents]:
@@ -256,33 +391,51 @@ def process_uploaded_documents(uploaded_files):
             st.warning(f"Type de fichier non pris en charge: {file_extension}. Seuls les fichiers PDF, DOCX, PPTX et TXT sont acceptés.")
             continue
         
-        # Vérifier la taille du fichier (max 10MB)
-        if uploaded_file.size > 10 * 1024 * 1024:  # 10MB en octets
-            st.warning(f"Le fichier {uploaded_file.name} dépasse la taille maximale de 10MB.")
+        # Vérifier la taille du fichier (lu progressivement: seule la limite d'upload compte)
+        if uploaded_file.size > MAX_DOCUMENT_MB * 1024 * 1024:
+            st.warning(f"Le fichier {uploaded_file.name} dépasse la taille maximale de {MAX_DOCUMENT_MB} Mo.")
             continue
         
-        with st.spinner(f"Traitement du document: {uploaded_file.name}..."):
-            try:
-                # Traiter le document et créer des embeddings
-                text, embeddings = process_document(uploaded_file, uploaded_file.name, api_key)
-                
-                # Stocker les informations du document
-                document_info = {
-                    "name": uploaded_file.name,
-                    "type": file_extension,
-                    "size": uploaded_file.size,
-                    "text": text[:1000] + "..." if len(text) > 1000 else text  # Aperçu du texte
-                }
-                
-                # Ajouter le document à la liste des documents uploadés
-                st.session_state.uploaded_documents.append(document_info)
-                
-                # Stocker les embeddings
-                st.session_state.document_embeddings[uploaded_file.name] = embeddings
-                
-                st.success(f"Document traité avec succès: {uploaded_file.name}")
-            except Exception as e:
-                st.error(f"Erreur lors du traitement du document {uploaded_file.name}: {str(e)}")
+        files.append((uploaded_file.name, uploaded_file))
+    
+    if not files:
+        return
+    
+    # Extraction et embeddings de tous les fichiers en parallèle, hors du thread de l'interface
+    pipeline = IngestionPipeline(credentials, api_provider, corpus)
+    pipeline.start(files)
+    progress_bars = {name: st.progress(0.0, text=f"{name}: en attente") for name, _ in files}
+    
+    while True:
+        finished = pipeline.done()
+        
+        for document in pipeline.completed():
+            # Stocker les informations du document
+            # (le texte intégral est déjà indexé dans le corpus, au fil de l'extraction)
+            document_info = {
+                "name": document.name,
+                "type": os.path.splitext(document.name)[1].lower(),
+                "size": document.size,
+                "chunks": document.chunks,
+                "store_key": document.store_key,
+                "text": document.preview + "..." if document.characters > len(document.preview) else document.preview  # Aperçu du texte
+            }
+            
+            # Ajouter le document à la liste des documents uploadés
+            st.session_state.uploaded_documents.append(document_info)
+        
+        for progress in pipeline.progress():
+            progress_bars[progress.name].progress(progress.fraction, text=progress.describe())
+        
+        if finished:
+            break
+        time.sleep(0.2)
+    
+    for progress in pipeline.progress():
+        if progress.stage == "error":
+            st.error(f"Erreur lors du traitement du document {progress.name}: {progress.error}")
+        else:
+            st.success(f"Document traité avec succès: {progress.name}")
 
 # Fonction pour générer un quiz
 def generate_module_quiz(module_number, num_questions, difficulty_level, question_types):
@@ -307,6 +460,12 @@ def generate_module_quiz(module_number, num_questions, difficulty_level, questio
     # Clé unique pour ce quiz
     quiz_key = f"module_{module_number}_quiz"
     
+    # Un quiz préchargé avec d'autres paramètres est régénéré
+    prefetched_settings = st.session_state.prefetched_quiz_settings.pop(quiz_key, None)
+    requested_settings = (num_questions, difficulty_level, tuple(question_types))
+    if prefetched_settings is not None and prefetched_settings != requested_settings:
+        st.session_state.quizzes.pop(quiz_key, None)
+    
     # Vérifier si le quiz a déjà été généré
     if quiz_key in st.session_state.quizzes:
         return
@@ -317,11 +476,15 @@ def generate_module_quiz(module_number, num_questions, difficulty_level, questio
             module_data=module,
             num_questions=num_questions,
             difficulty_level=difficulty_level,
-            question_types=question_types
+            question_types=question_types,
+            course_structure=st.session_state.course_structure,
+            api_provider=st.session_state.api_provider,
+            api_key=session_credentials()
         )
         
         # Stocker le quiz
         st.session_state.quizzes[quiz_key] = quiz
+        record_artifact_inputs(quiz_artifact_id(module_number), [num_questions, difficulty_level, list(question_types)])
 
 # Fonction pour générer un script de podcast
 def generate_podcast_script_content():
@@ -338,6 +501,14 @@ def generate_podcast_script_content():
     podcast_duration = st.session_state.get("podcast_duration", "15-20 minutes")
     target_audience = st.session_state.get("podcast_audience", "Étudiants")
     
+    # Utiliser le brouillon préchargé s'il correspond aux paramètres demandés
+    prefetched = st.session_state.prefetched_podcast
+    st.session_state.prefetched_podcast = None
+    if prefetched and prefetched[0] == (podcast_format, podcast_duration, target_audience):
+        st.session_state.podcast_script = prefetched[1]
+        record_artifact_inputs(PODCAST, list(prefetched[0]))
+        return
+    
     with st.spinner("Génération du script de podcast en cours..."):
         podcast_script = generate_podcast_script(
             course_title=title,
@@ -345,23 +516,311 @@ def generate_podcast_script_content():
             course_structure=st.session_state.course_structure,
             podcast_format=podcast_format,
             podcast_duration=podcast_duration,
-            target_audience=target_audience
+            target_audience=target_audience,
+            api_provider=st.session_state.api_provider,
+            api_key=session_credentials()
         )
         
         # Stocker le script
         st.session_state.podcast_script = podcast_script
+        record_artifact_inputs(PODCAST, [podcast_format, podcast_duration, target_audience])
 
 # Fonction pour générer l'audio du podcast
 def generate_podcast_audio_content(script_text, voice):
     with st.spinner("Génération de l'audio du podcast en cours..."):
         audio_result = generate_podcast_audio(
             script_text=script_text,
-            voice=voice
+            voice=voice,
+            api_provider=st.session_state.api_provider,
+            api_key=session_credentials()
         )
         
         # Stocker l'audio
         st.session_state.podcast_audio = audio_result
 
+# Fonction pour lister les artefacts inclus dans l'export complet du cours
+def course_bundle_sources():
+    return (
+        st.session_state.get("course_title", ""),
+        st.session_state.get("course_description", ""),
+        st.session_state.get("duration", ""),
+        st.session_state.get("difficulty", ""),
+        st.session_state.learning_objectives,
+        st.session_state.prerequisites,
+        st.session_state.learning_methods,
+        st.session_state.course_structure,
+        tuple(st.session_state.chapter_contents.items()),
+        tuple(st.session_state.quizzes.items()),
+        st.session_state.podcast_script,
+        st.session_state.podcast_audio
+    )
+
+# Fonction pour préparer l'archive ZIP du cours complet
+def prepare_course_bundle():
+    sources = course_bundle_sources()
+    title, description, duration, difficulty, objectives, prerequisites, methods, structure, chapters, quizzes, script, audio = sources
+    course = {
+        "title": title,
+        "description": description,
+        "duration": duration,
+        "difficulty": difficulty,
+        "learning_objectives": list(objectives),
+        "prerequisites": list(prerequisites),
+        "learning_methods": list(methods),
+        "course_structure": structure
+    }
+    
+    with st.spinner("Préparation de l'export complet du cours..."):
+        st.session_state.export_cache.get(
+            "course_bundle",
+            sources,
+            lambda: build_course_bundle(course, dict(chapters), dict(quizzes), script, audio)
+        )
+
+# Fonction pour restaurer le brouillon désigné par l'URL (reconnexion, éventuellement sur un autre réplica)
+def restore_draft():
+    draft_store = get_draft_store()
+    if draft_store is None:
+        return
+    
+    draft_id = st.query_params.get("draft")
+    if not draft_id:
+        st.query_params["draft"] = uuid.uuid4().hex
+        return
+    
+    draft = draft_store.load(draft_id)
+    if draft is None:
+        return
+    
+    for key in DRAFT_KEYS:
+        if draft.get(key) is not None:
+            st.session_state[key] = draft[key]
+    
+    # Le corpus est reconstruit à partir des documents déjà traités du stockage partagé
+    corpus = DocumentCorpus(draft.get("corpus_provider", "openai"))
+    document_store = get_document_store()
+    st.session_state.uploaded_documents = [
+        doc for doc in draft.get("uploaded_documents") or []
+        if doc.get("store_key") and load_stored_document(corpus, doc["name"], doc["store_key"], document_store)
+    ]
+    st.session_state.document_corpus = corpus
+
+# Fonction pour enregistrer le brouillon dans le stockage partagé
+def save_draft():
+    draft_store = get_draft_store()
+    draft_id = st.query_params.get("draft")
+    if draft_store is None or not draft_id:
+        return
+    
+    draft = {key: st.session_state.get(key) for key in DRAFT_KEYS}
+    draft["corpus_provider"] = st.session_state.document_corpus.api_provider
+    
+    # Écrit seulement si un élément a changé (les chapitres, quiz et entrées des artefacts sont complétés sur place)
+    sources = tuple(
+        tuple(value.items()) if key in ("chapter_contents", "quizzes", "artifact_inputs", "stale_artifacts") else value
+        for key, value in draft.items()
+    )
+    st.session_state.export_cache.get("draft", sources, lambda: draft_store.save(draft_id, draft))
+
+# Fonction pour obtenir les empreintes des entrées des artefacts dérivés de la structure actuelle
+def current_fingerprints():
+    structure = st.session_state.course_structure
+    return st.session_state.export_cache.get("artifact_fingerprints", structure, lambda: artifact_fingerprints(structure))
+
+# Fonction pour enregistrer les entrées d'un artefact qui vient d'être généré
+def record_artifact_inputs(artifact_id, settings=None):
+    st.session_state.artifact_inputs[artifact_id] = {"fingerprint": current_fingerprints().get(artifact_id), "settings": settings}
+    st.session_state.stale_artifacts.pop(artifact_id, None)
+
+# Fonction pour mettre les chapitres, quiz et podcast en accord avec la structure (après sa régénération)
+def refresh_derived_artifacts():
+    # Une structure en erreur ou vide ne retire rien: la comparaison attend la prochaine structure
+    fingerprints = current_fingerprints()
+    if not fingerprints or st.session_state.get("reconciled_fingerprints") is fingerprints:
+        return
+    st.session_state.reconciled_fingerprints = fingerprints
+    
+    artifacts = {f"chapter:{key}": content for key, content in st.session_state.chapter_contents.items()}
+    artifacts.update({f"quiz:{key}": quiz for key, quiz in st.session_state.quizzes.items()})
+    if st.session_state.podcast_script:
+        artifacts[PODCAST] = st.session_state.podcast_script
+    
+    # Seuls les artefacts dont les entrées ont changé sont retirés; ceux d'un chapitre ou module renuméroté sont déplacés
+    kept, inputs, stale = reconcile_artifacts(artifacts, st.session_state.artifact_inputs, fingerprints)
+    st.session_state.chapter_contents = {artifact_id.split(":", 1)[1]: content for artifact_id, content in kept.items() if artifact_id.startswith("chapter:")}
+    st.session_state.quizzes = {artifact_id.split(":", 1)[1]: quiz for artifact_id, quiz in kept.items() if artifact_id.startswith("quiz:")}
+    st.session_state.prefetched_quiz_settings = {
+        key: settings for key, settings in st.session_state.prefetched_quiz_settings.items() if key in st.session_state.quizzes
+    }
+    if PODCAST not in kept:
+        st.session_state.podcast_script = {}
+        st.session_state.podcast_audio = {}
+        st.session_state.prefetched_podcast = None
+    st.session_state.artifact_inputs = inputs
+    
+    # Les artefacts déjà obsolètes et pas encore régénérés le restent s'ils existent toujours
+    st.session_state.stale_artifacts = {
+        **{artifact_id: settings for artifact_id, settings in st.session_state.stale_artifacts.items() if artifact_id in fingerprints and artifact_id not in kept},
+        **stale
+    }
+
+# Fonction pour régénérer uniquement les artefacts rendus obsolètes par la nouvelle structure
+def regenerate_stale_artifacts():
+    stale = st.session_state.stale_artifacts
+    api_provider = st.session_state.api_provider
+    credentials = session_credentials()
+    title = st.session_state.course_title
+    description = st.session_state.course_description
+    structure = st.session_state.course_structure
+    jobs = {}
+    
+    for module in structure.get("modules", []):
+        for chapter in module["chapters"]:
+            artifact_id = chapter_artifact_id(module["module_number"], chapter["chapter_number"])
+            if artifact_id in stale:
+                chapter_kwargs = chapter_generation_kwargs(module, chapter)
+                jobs[artifact_id] = (None, lambda chapter_kwargs=chapter_kwargs: generate_chapter_content(**chapter_kwargs))
+        
+        artifact_id = quiz_artifact_id(module["module_number"])
+        if artifact_id in stale:
+            num_questions, difficulty_level, question_types = stale[artifact_id] or DEFAULT_QUIZ_SETTINGS
+            settings = [num_questions, difficulty_level, list(question_types)]
+            jobs[artifact_id] = (settings, lambda module=module, settings=settings: generate_quiz(
+                course_title=title,
+                module_data=module,
+                num_questions=settings[0],
+                difficulty_level=settings[1],
+                question_types=settings[2],
+                course_structure=structure,
+                api_provider=api_provider,
+                api_key=credentials
+            ))
+    
+    if PODCAST in stale:
+        settings = list(stale[PODCAST] or DEFAULT_PODCAST_SETTINGS)
+        jobs[PODCAST] = (settings, lambda: generate_podcast_script(
+            course_title=title,
+            course_description=description,
+            course_structure=structure,
+            podcast_format=settings[0],
+            podcast_duration=settings[1],
+            target_audience=settings[2],
+            api_provider=api_provider,
+            api_key=credentials
+        ))
+    
+    with st.spinner(f"Régénération de {len(jobs)} contenu(s) obsolète(s)..."):
+        # Appels en parallèle; les résultats sont écrits dans la session par ce thread uniquement
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {artifact_id: executor.submit(fn) for artifact_id, (settings, fn) in jobs.items()}
+        
+        for artifact_id, future in futures.items():
+            result = future.result()
+            if artifact_id == PODCAST:
+                st.session_state.podcast_script = result
+                st.session_state.podcast_audio = {}
+            elif artifact_id.startswith("chapter:"):
+                st.session_state.chapter_contents[artifact_id.split(":", 1)[1]] = result
+            else:
+                st.session_state.quizzes[artifact_id.split(":", 1)[1]] = result
+                st.session_state.prefetched_quiz_settings.pop(artifact_id.split(":", 1)[1], None)
+            record_artifact_inputs(artifact_id, jobs[artifact_id][0])
+
+# Fonction pour précharger en arrière-plan les prochaines étapes du parcours
+def run_prefetch():
+    prefetcher = st.session_state.prefetcher
+    structure = st.session_state.course_structure
+    title = st.session_state.get("course_title")
+    description = st.session_state.get("course_description")
+    
+    # Une nouvelle structure (ou un autre cours) invalide les préchargements en cours
+    fingerprint = make_request_key(
+        structure, title, description, st.session_state.api_provider, st.session_state.document_corpus.documents()
+    )
+    
+    # Intégrer les résultats terminés pour ces mêmes données (uniquement s'ils n'ont pas été générés entre-temps)
+    collected = prefetcher.collect() if prefetcher.fingerprint == fingerprint else {}
+    for (kind, artifact_key), result in collected.items():
+        if kind == "chapter" and artifact_key not in st.session_state.chapter_contents:
+            st.session_state.chapter_contents[artifact_key] = result
+            record_artifact_inputs(f"chapter:{artifact_key}")
+        elif kind == "quiz" and artifact_key not in st.session_state.quizzes:
+            st.session_state.quizzes[artifact_key] = result
+            st.session_state.prefetched_quiz_settings[artifact_key] = DEFAULT_QUIZ_SETTINGS
+            num_questions, difficulty_level, question_types = DEFAULT_QUIZ_SETTINGS
+            record_artifact_inputs(f"quiz:{artifact_key}", [num_questions, difficulty_level, list(question_types)])
+        elif kind == "podcast" and not st.session_state.podcast_script:
+            st.session_state.prefetched_podcast = (DEFAULT_PODCAST_SETTINGS, result)
+    
+    if not st.session_state.get("prefetch_enabled") or not structure.get("modules") or not title or not description:
+        return
+    
+    module = structure["modules"][0]
+    jobs = []
+    
+    # Contenu du chapitre 1
+    if module["chapters"]:
+        chapter = module["chapters"][0]
+        chapter_key = f"{module['module_number']}_{chapter['chapter_number']}"
+        if chapter_key not in st.session_state.chapter_contents:
+            chapter_kwargs = chapter_generation_kwargs(module, chapter)
+            jobs.append((
+                ("chapter", chapter_key),
+                estimate_tokens(description, max_tokens=4000) + (COURSE_CONTEXT_CHARS + CHAPTER_CONTEXT_CHARS) // 4,
+                lambda: generate_chapter_content(**chapter_kwargs)
+            ))
+    
+    # Quiz du module 1 avec les paramètres par défaut du formulaire
+    quiz_key = f"module_{module['module_number']}_quiz"
+    if quiz_key not in st.session_state.quizzes:
+        num_questions, difficulty_level, question_types = DEFAULT_QUIZ_SETTINGS
+        api_provider = st.session_state.api_provider
+        credentials = session_credentials()
+        jobs.append((
+            ("quiz", quiz_key),
+            estimate_tokens(json.dumps(module, ensure_ascii=False), max_tokens=4000),
+            lambda: generate_quiz(
+                course_title=title,
+                module_data=module,
+                num_questions=num_questions,
+                difficulty_level=difficulty_level,
+                question_types=list(question_types),
+                course_structure=structure,
+                api_provider=api_provider,
+                api_key=credentials
+            )
+        ))
+    
+    # Brouillon du script de podcast avec les paramètres par défaut du formulaire
+    if not st.session_state.podcast_script and not st.session_state.prefetched_podcast:
+        podcast_format, podcast_duration, target_audience = DEFAULT_PODCAST_SETTINGS
+        api_provider = st.session_state.api_provider
+        credentials = session_credentials()
+        jobs.append((
+            ("podcast", None),
+            estimate_tokens(description, json.dumps(structure, ensure_ascii=False), max_tokens=4000),
+            lambda: generate_podcast_script(
+                course_title=title,
+                course_description=description,
+                course_structure=structure,
+                podcast_format=podcast_format,
+                podcast_duration=podcast_duration,
+                target_audience=target_audience,
+                api_provider=api_provider,
+                api_key=credentials
+            )
+        ))
+    
+    prefetcher.schedule(fingerprint, jobs)
+
+# Restauration du brouillon, une fois par session, avant l'affichage des champs
+if 'draft_restored' not in st.session_state:
+    st.session_state.draft_restored = True
+    restore_draft()
+
+refresh_derived_artifacts()
+run_prefetch()
+
 # Onglet 1: Infos cours
 with tabs[0]:
     st.header("Create New Course")
@@ -369,25 +828,37 @@ with tabs[0]:
     # API Provider selection in sidebar
     with st.sidebar:
         st.subheader("AI Settings")
+        provider_options = ["openai", "anthropic", "mock"]
         st.session_state.api_provider = st.radio(
             "Select AI Provider",
-            options=["openai", "anthropic"],
-            index=0 if st.session_state.api_provider == "openai" else 1
+            options=provider_options,
+            index=provider_options.index(st.session_state.api_provider),
+            format_func=lambda provider: {"mock": "mock (local, hors ligne)"}.get(provider, provider)
         )
         
         # API Key inputs
-        if st.session_state.api_provider == "openai":
-            openai_api_key = st.text_input("OpenAI API Key", type="password", 
-                                          value=os.environ.get("OPENAI_API_KEY", ""), 
-                                          key="openai_key")
-            if openai_api_key:
-                os.environ["OPENAI_API_KEY"] = openai_api_key
+        if st.session_state.api_provider == "mock":
+            st.caption("Réponses simulées localement, sans appel réseau.")
         else:
-            anthropic_api_key = st.text_input("Anthropic API Key", type="password", 
-                                             value=os.environ.get("ANTHROPIC_API_KEY", ""), 
-                                             key="anthropic_key")
-            if anthropic_api_key:
-                os.environ["ANTHROPIC_API_KEY"] = anthropic_api_key
+            # Clé propre à la session: la clé éventuellement configurée sur le serveur
+            # n'est jamais renvoyée au navigateur, elle sert seulement par défaut
+            provider = st.session_state.api_provider
+            label = "OpenAI API Key" if provider == "openai" else "Anthropic API Key"
+            st.session_state.api_keys[provider] = st.text_input(label, type="password",
+                                                                value=st.session_state.api_keys.get(provider, ""),
+                                                                key=f"{provider}_key")
+            if not st.session_state.api_keys[provider] and resolve_api_key(provider):
+                st.caption("Clé API du serveur utilisée.")
+        
+        # Préchargement des prochaines étapes (chapitre 1, quiz du module 1, brouillon du podcast)
+        st.checkbox(
+            "Précharger les prochaines étapes",
+            key="prefetch_enabled",
+            help="Génère en arrière-plan, en priorité basse et dans la limite d'un budget de tokens, "
+                 "le contenu du chapitre 1, le quiz du module 1 et un brouillon du script de podcast."
+        )
+        if st.session_state.get("prefetch_enabled") and st.session_state.prefetcher.pending():
+            st.caption(f"Préchargement en cours: {st.session_state.prefetcher.pending()} tâche(s)")
     
     # Course Title
     st.subheader("Course Title")
@@ -447,7 +918,7 @@ with tabs[0]:
         "Upload your documents",
         type=["pdf", "docx", "pptx", "txt"],
         accept_multiple_files=True,
-        help="Supported formats: PDF, Word, PowerPoint, Text (max 10MB)"
+        help=f"Supported formats: PDF, Word, PowerPoint, Text (max {MAX_DOCUMENT_MB}MB)"
     )
     
     # Traiter les documents uploadés
@@ -459,21 +930,39 @@ with tabs[0]:
     if st.session_state.uploaded_documents:
         st.subheader("Documents de référence")
         for doc in st.session_state.uploaded_documents:
-            st.write(f"- {doc['name']}")
+            st.checkbox(
+                f"{doc['name']} ({doc.get('chunks', 0)} extraits indexés)",
+                value=True,
+                key=f"use_document_{doc['name']}",
+                help="Décochez pour ne pas utiliser ce document lors de la génération."
+            )
     
-    st.caption("Supported formats: PDF, Word, PowerPoint, Text (max 10MB)")
+    st.caption(f"Supported formats: PDF, Word, PowerPoint, Text (max {MAX_DOCUMENT_MB}MB)")
     
     # Create Course and Save as Draft buttons
     col1, col2 = st.columns([1, 3])
     with col1:
         st.button("Create Course", type="primary", key="create_course")
     with col2:
-        st.button("Save as Draft", key="save_draft")
+        if st.button("Save as Draft", key="save_draft"):
+            if get_draft_store() is None:
+                st.info("Les brouillons sont enregistrés automatiquement lorsqu'un stockage partagé est configuré (SHARED_STORE_URL).")
+            else:
+                save_draft()
+                st.success("Brouillon enregistré: rouvrez cette adresse pour le retrouver.")
 
 # Onglet 2: Prérequis
 with tabs[1]:
     st.header("Course Setup")
     
+    # Bouton pour générer toute la configuration du cours en un seul appel
+    st.button(
+        "Generate all with AI",
+        key="generate_setup",
+        on_click=generate_setup,
+        help="Génère les objectifs, prérequis et méthodes d'apprentissage en une seule requête"
+    )
+    
     # Section 1: Learning Objectives
     st.subheader("Learning Objectives")
     st.write("What will students learn in this course?")
@@ -605,6 +1094,11 @@ with tabs[2]:
         if "modules" in st.session_state.course_structure and st.session_state.course_structure["modules"]:
             st.subheader("Structure du cours")
             
+            # Contenus générés pour une version précédente de la structure
+            if st.session_state.stale_artifacts:
+                st.warning(f"{len(st.session_state.stale_artifacts)} contenu(s) déjà généré(s) (chapitres, quiz, podcast) ne correspondent plus à la structure.")
+                st.button("Régénérer les contenus obsolètes", key="regenerate_stale_artifacts", on_click=regenerate_stale_artifacts)
+            
             # Créer des onglets pour chaque module
             module_tabs = st.tabs([f"Module {module['module_number']}: {module['module_title']}" 
                                  for module in st.session_state.course_structure["modules"]])
@@ -617,11 +1111,7 @@ with tabs[2]:
                     # Afficher les chapitres du module
                     for chapter in module["chapters"]:
                         with st.expander(f"Chapitre {chapter['chapter_number']}: {chapter['chapter_title']}"):
-                            st.write(f"**Description:** {chapter['description']}")
-                            
-                            st.write("**Points clés:**")
-                            for point in chapter['key_points']:
-                                st.write(f"- {point}")
+                            render_chapter_outline(st, chapter)
                             
                             # Clé unique pour ce chapitre
                             chapter_key = f"{module['module_number']}_{chapter['chapter_number']}"
@@ -630,50 +1120,48 @@ with tabs[2]:
                             if chapter_key in st.session_state.chapter_contents:
                                 # Afficher le contenu détaillé du chapitre
                                 chapter_content = st.session_state.chapter_contents[chapter_key]
+                                render_chapter_content(st, chapter_content)
                                 
-                                # Vérifier s'il y a une erreur
-                                if "error" in chapter_content:
-                                    st.error(f"Erreur: {chapter_content['error']}")
-                                else:
-                                    # Afficher l'introduction
-                                    st.markdown("### Introduction")
-                                    st.write(chapter_content["introduction"])
-                                    
-                                    # Afficher les sections
-                                    for section in chapter_content["sections"]:
-                                        st.markdown(f"### {section['title']}")
-                                        st.write(section["content"])
-                                        
-                                        # Afficher les exemples
-                                        if "examples" in section and section["examples"]:
-                                            st.markdown("**Exemples:**")
-                                            for example in section["examples"]:
-                                                st.markdown(f"- *{example}*")
-                                    
-                                    # Afficher la conclusion
-                                    st.markdown("### Conclusion")
-                                    st.write(chapter_content["conclusion"])
-                                    
-                                    # Afficher les exercices
-                                    if "exercises" in chapter_content and chapter_content["exercises"]:
-                                        st.markdown("### Exercices")
-                                        for j, exercise in enumerate(chapter_content["exercises"]):
-                                            st.markdown(f"**Exercice {j+1}:** {exercise['question']}")
-                                            st.markdown(f"*Réponse/Indice:* {exercise['answer']}")
-                                            st.markdown("---")
+                                # Retoucher une seule partie du chapitre sans le régénérer entièrement
+                                if "error" not in chapter_content:
+                                    st.markdown("**Retoucher une partie du chapitre**")
+                                    part_options = chapter_fragment_options(chapter_content)
+                                    if st.session_state.get(f"revise_part_{chapter_key}") not in part_options:
+                                        st.session_state.pop(f"revise_part_{chapter_key}", None)
+                                    col1, col2 = st.columns([2, 3])
+                                    with col1:
+                                        st.selectbox("Partie", list(part_options), format_func=part_options.get, key=f"revise_part_{chapter_key}")
+                                    with col2:
+                                        st.radio("Action", ["regenerate", "extend", "shorten"], horizontal=True, key=f"revise_action_{chapter_key}",
+                                                 format_func={"regenerate": "Régénérer", "extend": "Développer", "shorten": "Raccourcir"}.get)
+                                    st.text_input("Consignes (optionnel)", key=f"revise_instructions_{chapter_key}")
+                                    st.button("Appliquer à cette partie", key=f"revise_button_{chapter_key}",
+                                              on_click=revise_chapter_part, args=(module['module_number'], chapter['chapter_number']))
                             else:
                                 # Bouton pour générer le contenu détaillé du chapitre
                                 if st.button(f"Générer contenu détaillé", key=f"generate_chapter_{module['module_number']}_{chapter['chapter_number']}"):
                                     generate_chapter_detail(module['module_number'], chapter['chapter_number'])
                                     st.rerun()
             
-            # Bouton pour exporter la structure du cours
+            # Bouton pour exporter la structure du cours (sérialisée une fois par version)
+            structure = st.session_state.course_structure
             st.download_button(
                 label="Exporter la structure du cours (JSON)",
-                data=json.dumps(st.session_state.course_structure, indent=2, ensure_ascii=False),
+                data=st.session_state.export_cache.get("course_structure", structure, lambda: json_payload(structure)),
                 file_name="structure_cours.json",
                 mime="application/json"
             )
+            
+            # Export du cours complet: chapitres, quiz, script et audio du podcast
+            st.button("Préparer l'export complet du cours (ZIP)", key="prepare_course_bundle", on_click=prepare_course_bundle)
+            bundle = st.session_state.export_cache.peek("course_bundle", course_bundle_sources())
+            if bundle:
+                st.download_button(
+                    label="Télécharger le cours complet (ZIP)",
+                    data=bundle,
+                    file_name="cours_complet.zip",
+                    mime="application/zip"
+                )
         
         elif generate_button:
             st.info("La structure du cours est en cours de génération...")
@@ -742,26 +1230,12 @@ with tabs[3]:
                 st.write(f"Niveau de difficulté: {quiz['difficulty_level']}")
                 
                 # Créer un accordéon pour chaque question
-                for question in quiz["questions"]:
-                    with st.expander(f"Question {question['question_number']}: {question['question_text']}"):
-                        st.write(f"**Type de question:** {question['question_type']}")
-                        
-                        # Afficher les options pour les questions à choix multiple
-                        if question['question_type'] == "Choix multiple" and "options" in question:
-                            st.write("**Options:**")
-                            for i, option in enumerate(question["options"]):
-                                st.write(f"{chr(65+i)}. {option}")
-                        
-                        # Afficher la réponse correcte
-                        st.write(f"**Réponse correcte:** {question['correct_answer']}")
-                        
-                        # Afficher l'explication
-                        st.write(f"**Explication:** {question['explanation']}")
+                render_quiz_questions(st, quiz["questions"])
                 
                 # Bouton pour exporter le quiz
                 st.download_button(
                     label="Exporter le quiz (JSON)",
-                    data=json.dumps(quiz, indent=2, ensure_ascii=False),
+                    data=st.session_state.export_cache.get(quiz_key, quiz, lambda: json_payload(quiz)),
                     file_name=f"quiz_module_{selected_module_number}.json",
                     mime="application/json"
                 )
@@ -840,13 +1314,11 @@ with tabs[4]:
                 st.subheader("Script du podcast")
                 
                 # Créer un texte complet pour la synthèse vocale
-                full_script_text = ""
+                podcast_script = st.session_state.podcast_script
+                full_script_text = st.session_state.export_cache.get("podcast_text", podcast_script, lambda: podcast_script_text(podcast_script))
                 
                 # Afficher chaque section du script
-                for section in st.session_state.podcast_script['script_sections']:
-                    with st.expander(f"{section['section_title']}"):
-                        st.write(section['content'])
-                        full_script_text += section['content'] + "\n\n"
+                render_podcast_sections(st, podcast_script['script_sections'])
                 
                 # Bouton pour générer l'audio
                 if st.button("Générer l'audio du podcast"):
@@ -869,10 +1341,11 @@ with tabs[4]:
                         """
                         st.markdown(audio_html, unsafe_allow_html=True)
                         
-                        # Bouton pour télécharger l'audio
+                        # Bouton pour télécharger l'audio (décodé une fois par version)
+                        podcast_audio = st.session_state.podcast_audio
                         st.download_button(
                             label="Télécharger le podcast (MP3)",
-                            data=base64.b64decode(st.session_state.podcast_audio['audio_base64']),
+                            data=st.session_state.export_cache.get("podcast_audio", podcast_audio, lambda: base64.b64decode(podcast_audio['audio_base64'])),
                             file_name=f"{st.session_state.podcast_script['podcast_title'].replace(' ', '_')}.mp3",
                             mime="audio/mp3"
                         )
@@ -880,7 +1353,7 @@ with tabs[4]:
                 # Bouton pour exporter le script
                 st.download_button(
                     label="Exporter le script (JSON)",
-                    data=json.dumps(st.session_state.podcast_script, indent=2, ensure_ascii=False),
+                    data=st.session_state.export_cache.get("podcast_script", podcast_script, lambda: json_payload(podcast_script)),
                     file_name="script_podcast.json",
                     mime="application/json"
                 )
@@ -893,6 +1366,38 @@ with tabs[4]:
                     mime="text/plain"
                 )
 
+# Panneau de métriques dans la barre latérale (affiché en dernier pour inclure les appels de cette exécution)
+with st.sidebar:
+    with st.expander("Métriques IA"):
+        metrics = get_metrics()
+        metrics_rows = metrics.summary_by_task()
+        if metrics_rows:
+            st.dataframe(pd.DataFrame(metrics_rows).set_index("tâche"), use_container_width=True)
+        else:
+            st.caption("Aucun appel enregistré pour le moment.")
+        
+        store_rows = metrics.shared_store_summary()
+        if store_rows:
+            st.write(f"**Stockage partagé (réplica {REPLICA_ID}):**")
+            st.dataframe(pd.DataFrame(store_rows).set_index("espace"), use_container_width=True)
+        
+        # Seulement les nombres: les messages d'erreur des autres sessions restent dans les journaux du serveur
+        error_counts = metrics.error_counts()
+        if error_counts:
+            st.write("**Erreurs par type:**")
+            st.caption(" · ".join(f"{kind}: {count}" for kind, count in error_counts.items()))
+        
+        st.download_button(
+            label="Exporter les métriques (Prometheus)",
+            data=metrics.render_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain",
+            key="export_metrics"
+        )
+
+# Enregistrement du brouillon (seulement s'il a changé pendant cette exécution)
+save_draft()
+
 # Pied de page
 st.markdown("---")
 st.markdown("© 2023 ZEY LMS - Tous droits réservés")
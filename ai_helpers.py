@@ -1,40 +1,243 @@
 import os
-import requests
+import re
 import json
-import anthropic
-import tempfile
+import time
+import codecs
+import zipfile
 import base64
-from typing import Optional, List, Dict, Any, BinaryIO, Tuple
+import posixpath
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+from typing import Optional, List, Dict, Any, BinaryIO, Tuple, Union, Iterator, Iterable, Callable
 import PyPDF2
-import docx
-from pptx import Presentation
 import tiktoken
-import openai
+from llm_scheduler import get_scheduler, estimate_tokens, is_invalid_request_error
+from llm_coalescing import coalesce, make_request_key
+from llm_metrics import record_llm_call, document_stage
+from document_corpus import DocumentCorpus, DocumentSubset, DocumentChunk
+from pdf_ocr import is_low_text_page, ocr_available, ocr_pages
+from shared_store import get_response_cache
+from semantic_cache import get_semantic_cache
+from llm_providers import (
+    ApiKey,
+    Completion,
+    PROVIDERS,
+    EMBEDDING_DIMENSION,
+    get_provider,
+    resolve_model,
+    resolve_api_key,
+    provider_label,
+    missing_api_key_message
+)
 
-# Fonction pour appeler l'API OpenAI
-def enhance_description_openai(title: str, initial_description: str, api_key: Optional[str] = None) -> str:
+# Prompt système commun aux générateurs de descriptions et de listes
+PEDAGOGY_SYSTEM_PROMPT = "Vous êtes un expert en pédagogie et en création de contenu éducatif."
+
+# Taille (en tokens) des morceaux de documents indexés pour la recherche de contexte
+DOCUMENT_CHUNK_TOKENS = 400
+
+# Nombre de morceaux envoyés par requête d'embeddings
+EMBEDDING_BATCH_SIZE = 64
+
+# Budgets (en caractères) du contexte documentaire injecté dans les prompts
+STRUCTURE_CONTEXT_CHARS = 8000
+COURSE_CONTEXT_CHARS = 3000
+CHAPTER_CONTEXT_CHARS = 6000
+FRAGMENT_CONTEXT_CHARS = 2000
+MODULE_CONTEXT_CHARS = 3000
+
+# À partir de ce nombre de modules, la structure est générée en deux phases
+# (plan des modules, puis chapitres de chaque module en parallèle)
+SHARDED_STRUCTURE_MIN_MODULES = int(os.environ.get("SHARDED_STRUCTURE_MIN_MODULES", "6"))
+
+# Nombre maximal d'appels simultanés pour détailler les modules d'une structure
+# (le planificateur applique en plus les limites de débit du fournisseur)
+STRUCTURE_SHARD_CONCURRENCY = int(os.environ.get("STRUCTURE_SHARD_CONCURRENCY", "16"))
+
+# Nombre maximal de chapitres par module (numérotés 1.1 à 1.9)
+MAX_CHAPTERS_PER_MODULE = 9
+
+def _submit(
+    fn,
+    provider: str,
+    model: str,
+    estimated_tokens: int = 0,
+    request_key: Optional[tuple] = None,
+    task: str = "",
+    cacheable: bool = False
+):
     """
-    Améliore la description d'un cours en utilisant l'API OpenAI.
+    Soumet un appel API à l'ordonnanceur, en fusionnant les requêtes identiques en cours,
+    et enregistre ses métriques (durée, attente, tokens, relances, cache, erreurs).
+    Avec un stockage partagé, une requête déterministe (cacheable) déjà servie,
+    dans n'importe quelle session ou sur n'importe quel réplica, est lue dans
+    le cache des réponses. Les complétions, échantillonnées, ne sont jamais
+    mises en cache: générer à nouveau doit produire une nouvelle réponse.
     
     Args:
-        title: Le titre du cours
-        initial_description: La description initiale fournie par l'utilisateur
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        fn: La fonction qui effectue l'appel à l'API
+        provider: Le fournisseur appelé
+        model: Le modèle appelé
+        estimated_tokens: Estimation des tokens consommés
+        request_key: Les paramètres qui déterminent la réponse (None pour ne pas fusionner)
+        task: La tâche, pour les métriques
+        cacheable: Si True, la réponse ne dépend que de la requête (embeddings)
+            et peut être lue et enregistrée dans le cache partagé des réponses
     
     Returns:
-        La description améliorée
+        La réponse brute de l'API
+    """
+    stats = {"estimated_tokens": estimated_tokens}
+    
+    def scheduled_call():
+        return get_scheduler().submit(fn, provider=provider, model=model, estimated_tokens=estimated_tokens, stats=stats)
+    
+    start = time.perf_counter()
+    try:
+        if request_key is None:
+            result = scheduled_call()
+        else:
+            key = make_request_key(provider, model, *request_key)
+            response_cache = get_response_cache() if cacheable else None
+            result = response_cache.get(key) if response_cache is not None else None
+            if result is not None:
+                stats["cache"] = "shared"
+            else:
+                def cached_call():
+                    response = scheduled_call()
+                    if response_cache is not None:
+                        response_cache.put(key, response)
+                    return response
+                
+                result = coalesce(key, cached_call, stats)
+    except Exception as e:
+        record_llm_call(task, provider, model, time.perf_counter() - start, stats, error=e)
+        raise
+    
+    record_llm_call(task, provider, model, time.perf_counter() - start, stats, result=result)
+    return result
+
+def _complete(
+    task: str,
+    system: str,
+    prompt: str,
+    max_tokens: int,
+    api_provider: str,
+    api_key: ApiKey,
+    json_mode: bool = False,
+    prefix: str = ""
+) -> Completion:
+    """
+    Envoie un prompt au modèle routé pour la tâche chez le fournisseur choisi.
+    
+    Args:
+        task: La tâche ('description', 'objectives', 'structure', 'chapter', ...)
+        system: Le prompt système
+        prompt: Le prompt utilisateur (partie variable)
+        max_tokens: Le nombre maximum de tokens en sortie
+        api_provider: Le fournisseur d'API ('openai', 'anthropic' ou 'mock')
+        api_key: La clé API du fournisseur (ou les identifiants de la session)
+        json_mode: Si True, la réponse doit être un objet JSON
+        prefix: La partie stable du prompt, placée en tête et mise en cache par le fournisseur
+    
+    Returns:
+        La réponse du modèle
+    """
+    # La clé concrète fait partie de la clé de requête: les identifiants d'une
+    # session (Credentials) ne sont pas sérialisables et ne doivent pas être
+    # confondus avec ceux d'une autre session
+    api_key = resolve_api_key(api_provider, api_key)
+    provider = get_provider(api_provider, api_key)
+    model = resolve_model(provider.name, task)
+    
+    return _submit(
+        lambda: provider.complete(task, system, prompt, model, max_tokens, json_mode=json_mode, prefix=prefix),
+        provider=provider.name,
+        model=model,
+        estimated_tokens=estimate_tokens(system, prefix, prompt, max_tokens=max_tokens),
+        request_key=(api_key, task, system, prefix, prompt, max_tokens, json_mode),
+        task=task
+    )
+
+def _parse_list(text: str) -> List[str]:
+    """
+    Extrait les éléments d'une liste numérotée ou à puces.
+    
+    Args:
+        text: Le texte renvoyé par le modèle
+    
+    Returns:
+        La liste des éléments, ou le texte brut si aucun élément n'a été extrait
+    """
+    items = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if line and (line[0].isdigit() or line.startswith('- ')):
+            # Supprimer les numéros ou puces au début
+            cleaned_line = line.lstrip('0123456789.- ')
+            items.append(cleaned_line)
+    
+    # Si aucun élément n'a été extrait, retourner le texte brut
+    if not items:
+        items = [text]
+    
+    return items
+
+def _semantic_complete(
+    task: str,
+    inputs: Tuple[str, ...],
+    system: str,
+    prompt: str,
+    max_tokens: int,
+    api_provider: str,
+    api_key: ApiKey
+) -> str:
+    """
+    Comme _complete, mais si le cache sémantique est activé, une réponse déjà
+    servie pour des entrées quasi identiques (faute de frappe corrigée,
+    espaces en plus) est réutilisée sans appel au modèle.
+    
+    Args:
+        task: La tâche ('description', 'objectives', 'prerequisites', 'methods')
+        inputs: Les entrées de l'auteur dont dépend la réponse (titre, description)
+        system: Le prompt système
+        prompt: Le prompt utilisateur, construit à partir des entrées
+        max_tokens: Le nombre maximum de tokens en sortie
+        api_provider: Le fournisseur d'API ('openai', 'anthropic' ou 'mock')
+        api_key: La clé API du fournisseur (ou les identifiants de la session)
+    
+    Returns:
+        Le texte de la réponse
+    """
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None:
+        return _complete(task, system, prompt, max_tokens, api_provider, api_key).text
+    
+    # Espace de noms propre à la clé concrète (voir _complete)
+    api_key = resolve_api_key(api_provider, api_key)
+    provider = get_provider(api_provider, api_key)
+    model = resolve_model(provider.name, task)
+    namespace = make_request_key(provider.name, model, api_key, task, system, max_tokens)
+    start = time.perf_counter()
+    text = semantic_cache.lookup(namespace, inputs)
+    if text is not None:
+        record_llm_call(task, provider.name, model, time.perf_counter() - start, {"cache": "semantic"})
+        return text
+    
+    text = _complete(task, system, prompt, max_tokens, api_provider, api_key).text
+    semantic_cache.add(namespace, inputs, text)
+    return text
+
+def _enhance_description(title: str, initial_description: str, api_provider: str, api_key: ApiKey = None) -> str:
+    """
+    Améliore la description d'un cours avec le fournisseur indiqué.
     """
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return "Erreur: Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."
-    
-    # Préparer la requête pour l'API OpenAI
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+        return f"Erreur: {missing_api_key_message(api_provider)}"
     
     # Construire le prompt pour l'API
     prompt = f"""
@@ -52,39 +255,30 @@ def enhance_description_openai(title: str, initial_description: str, api_key: Op
     5. Fait environ 150-200 mots
     """
     
-    # Données pour l'API
-    data = {
-        "model": "gpt-4o",
-        "messages": [
-            {"role": "system", "content": "Vous êtes un expert en pédagogie et en création de contenu éducatif."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 5000
-    }
-    
     try:
-        # Appel à l'API
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
-        # Vérifier si la requête a réussi
-        response.raise_for_status()
-        
-        # Extraire la réponse
-        result = response.json()
-        enhanced_description = result["choices"][0]["message"]["content"].strip()
-        
-        return enhanced_description
+        text = _semantic_complete("description", (title, initial_description), PEDAGOGY_SYSTEM_PROMPT, prompt, 1000, api_provider, api_key)
+        return text.strip()
     
     except Exception as e:
-        return f"Erreur lors de l'appel à l'API OpenAI: {str(e)}"
+        return f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"
+
+# Fonction pour appeler l'API OpenAI
+def enhance_description_openai(title: str, initial_description: str, api_key: ApiKey = None) -> str:
+    """
+    Améliore la description d'un cours en utilisant l'API OpenAI.
+    
+    Args:
+        title: Le titre du cours
+        initial_description: La description initiale fournie par l'utilisateur
+        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+    
+    Returns:
+        La description améliorée
+    """
+    return _enhance_description(title, initial_description, "openai", api_key)
 
 # Fonction pour appeler l'API Anthropic
-def enhance_description_anthropic(title: str, initial_description: str, api_key: Optional[str] = None) -> str:
+def enhance_description_anthropic(title: str, initial_description: str, api_key: ApiKey = None) -> str:
     """
     Améliore la description d'un cours en utilisant l'API Anthropic Claude.
     
@@ -96,57 +290,18 @@ def enhance_description_anthropic(title: str, initial_description: str, api_key:
     Returns:
         La description améliorée
     """
-    # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
-    
-    if not api_key:
-        return "Erreur: Clé API Anthropic non trouvée. Veuillez configurer la variable d'environnement ANTHROPIC_API_KEY."
-    
-    try:
-        # Créer le client Anthropic avec la bibliothèque officielle
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        # Construire le message utilisateur
-        user_prompt = f"""En tant qu'expert en pédagogie, améliore cette description de cours:
-        
-Titre du cours: {title}
-
-Description initiale: {initial_description}
-
-Veuillez fournir une description améliorée qui:
-1. Est professionnelle et engageante
-2. Inclut les objectifs d'apprentissage clairs
-3. Mentionne les bénéfices pour l'apprenant
-4. Est structurée en paragraphes concis
-5. Fait environ 150-200 mots"""
-        
-        # Appel à l'API avec la bibliothèque officielle
-        message = client.messages.create(
-            model="claude-3-7-sonnet-20250219",
-            max_tokens=4000,
-            system="Vous êtes un expert en pédagogie et en création de contenu éducatif.",
-            messages=[
-                {"role": "user", "content": user_prompt}
-            ]
-        )
-        
-        # Extraire la réponse
-        enhanced_description = message.content[0].text
-        
-        return enhanced_description
-    
-    except Exception as e:
-        return f"Erreur lors de l'appel à l'API Anthropic: {str(e)}"
+    return _enhance_description(title, initial_description, "anthropic", api_key)
 
 # Fonction principale qui choisit l'API à utiliser
-def enhance_course_description(title: str, initial_description: str, api_provider: str = "openai") -> str:
+def enhance_course_description(title: str, initial_description: str, api_provider: str = "openai", api_key: ApiKey = None) -> str:
     """
     Améliore la description d'un cours en utilisant l'API spécifiée.
     
     Args:
         title: Le titre du cours
         initial_description: La description initiale fournie par l'utilisateur
-        api_provider: Le fournisseur d'API à utiliser ('openai' ou 'anthropic')
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
     
     Returns:
         La description améliorée
@@ -154,35 +309,36 @@ def enhance_course_description(title: str, initial_description: str, api_provide
     if not title or not initial_description:
         return "Veuillez fournir un titre et une description initiale."
     
-    if api_provider.lower() == "openai":
-        return enhance_description_openai(title, initial_description)
-    elif api_provider.lower() == "anthropic":
-        return enhance_description_anthropic(title, initial_description)
-    else:
-        return f"Fournisseur d'API non pris en charge: {api_provider}. Utilisez 'openai' ou 'anthropic'."
+    if api_provider.lower() not in PROVIDERS:
+        return f"Fournisseur d'API non pris en charge: {api_provider}. Utilisez 'openai', 'anthropic' ou 'mock'."
+    
+    return _enhance_description(title, initial_description, api_provider.lower(), api_key)
 
-# Nouvelles fonctions pour générer du contenu avec OpenAI
+# Fonctions pour générer du contenu avec le fournisseur choisi
 
-def generate_learning_objectives(course_title: str, course_description: str, api_key: Optional[str] = None) -> List[str]:
+def generate_learning_objectives(
+    course_title: str,
+    course_description: str,
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
+) -> List[str]:
     """
-    Génère des objectifs d'apprentissage pour un cours en utilisant l'API OpenAI.
+    Génère des objectifs d'apprentissage pour un cours.
     
     Args:
         course_title: Le titre du cours
         course_description: La description du cours
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
     
     Returns:
         Liste d'objectifs d'apprentissage
     """
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return ["Erreur: Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."]
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        return [f"Erreur: {missing_api_key_message(api_provider)}"]
     
     # Construire le prompt
     prompt = f"""
@@ -203,58 +359,37 @@ def generate_learning_objectives(course_title: str, course_description: str, api
     """
     
     try:
-        # Appel à l'API
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Vous êtes un expert en pédagogie et en création de contenu éducatif."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        
-        # Extraire la réponse
-        objectives_text = response.choices[0].message.content.strip()
+        text = _semantic_complete("objectives", (course_title, course_description), PEDAGOGY_SYSTEM_PROMPT, prompt, 1000, api_provider, api_key)
         
         # Traiter la réponse pour extraire les objectifs
-        objectives = []
-        for line in objectives_text.split('\n'):
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('- ')):
-                # Supprimer les numéros ou puces au début
-                cleaned_line = line.lstrip('0123456789.- ')
-                objectives.append(cleaned_line)
-        
-        # Si aucun objectif n'a été extrait, retourner le texte brut
-        if not objectives:
-            objectives = [objectives_text]
-        
-        return objectives
+        return _parse_list(text.strip())
     
     except Exception as e:
-        return [f"Erreur lors de l'appel à l'API OpenAI: {str(e)}"]
+        return [f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"]
 
-def generate_prerequisites(course_title: str, course_description: str, api_key: Optional[str] = None) -> List[str]:
+def generate_prerequisites(
+    course_title: str,
+    course_description: str,
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
+) -> List[str]:
     """
-    Génère des prérequis pour un cours en utilisant l'API OpenAI.
+    Génère des prérequis pour un cours.
     
     Args:
         course_title: Le titre du cours
         course_description: La description du cours
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
     
     Returns:
         Liste de prérequis
     """
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return ["Erreur: Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."]
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        return [f"Erreur: {missing_api_key_message(api_provider)}"]
     
     # Construire le prompt
     prompt = f"""
@@ -275,58 +410,37 @@ def generate_prerequisites(course_title: str, course_description: str, api_key:
     """
     
     try:
-        # Appel à l'API
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Vous êtes un expert en pédagogie et en création de contenu éducatif."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        
-        # Extraire la réponse
-        prerequisites_text = response.choices[0].message.content.strip()
+        text = _semantic_complete("prerequisites", (course_title, course_description), PEDAGOGY_SYSTEM_PROMPT, prompt, 1000, api_provider, api_key)
         
         # Traiter la réponse pour extraire les prérequis
-        prerequisites = []
-        for line in prerequisites_text.split('\n'):
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('- ')):
-                # Supprimer les numéros ou puces au début
-                cleaned_line = line.lstrip('0123456789.- ')
-                prerequisites.append(cleaned_line)
-        
-        # Si aucun prérequis n'a été extrait, retourner le texte brut
-        if not prerequisites:
-            prerequisites = [prerequisites_text]
-        
-        return prerequisites
+        return _parse_list(text.strip())
     
     except Exception as e:
-        return [f"Erreur lors de l'appel à l'API OpenAI: {str(e)}"]
+        return [f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"]
 
-def generate_learning_methods(course_title: str, course_description: str, api_key: Optional[str] = None) -> List[str]:
+def generate_learning_methods(
+    course_title: str,
+    course_description: str,
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
+) -> List[str]:
     """
-    Génère des méthodes d'apprentissage pour un cours en utilisant l'API OpenAI.
+    Génère des méthodes d'apprentissage pour un cours.
     
     Args:
         course_title: Le titre du cours
         course_description: La description du cours
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
     
     Returns:
         Liste de méthodes d'apprentissage
     """
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return ["Erreur: Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."]
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        return [f"Erreur: {missing_api_key_message(api_provider)}"]
     
     # Construire le prompt
     prompt = f"""
@@ -346,43 +460,235 @@ def generate_learning_methods(course_title: str, course_description: str, api_ke
     """
     
     try:
-        # Appel à l'API
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Vous êtes un expert en pédagogie et en création de contenu éducatif."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        
-        # Extraire la réponse
-        methods_text = response.choices[0].message.content.strip()
+        text = _semantic_complete("methods", (course_title, course_description), PEDAGOGY_SYSTEM_PROMPT, prompt, 1000, api_provider, api_key)
         
         # Traiter la réponse pour extraire les méthodes
-        methods = []
-        for line in methods_text.split('\n'):
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('- ')):
-                # Supprimer les numéros ou puces au début
-                cleaned_line = line.lstrip('0123456789.- ')
-                methods.append(cleaned_line)
-        
-        # Si aucune méthode n'a été extraite, retourner le texte brut
-        if not methods:
-            methods = [methods_text]
+        return _parse_list(text.strip())
+    
+    except Exception as e:
+        return [f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"]
+
+def generate_course_setup(
+    course_title: str,
+    course_description: str,
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
+) -> Dict[str, Any]:
+    """
+    Génère en un seul appel les objectifs d'apprentissage, les prérequis et
+    les méthodes d'apprentissage d'un cours, sous forme de JSON structuré.
+    
+    Args:
+        course_title: Le titre du cours
+        course_description: La description du cours
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
+    
+    Returns:
+        Un dictionnaire avec les listes 'learning_objectives', 'prerequisites' et 'learning_methods'
+    """
+    # Utiliser la clé API fournie ou celle de l'environnement
+    api_key = resolve_api_key(api_provider, api_key)
+    
+    if not api_key:
+        return {"error": missing_api_key_message(api_provider)}
+    
+    # Construire le prompt
+    prompt = f"""
+    En tant qu'expert en pédagogie, prépare la mise en place de ce cours:
+    
+    Titre du cours: {course_title}
+    
+    Description du cours: {course_description}
+    
+    Génère:
+    1. 5 objectifs d'apprentissage clairs et mesurables, commençant par des verbes d'action,
+       couvrant différents niveaux de la taxonomie de Bloom et formulés du point de vue de l'apprenant
+    2. 4 à 6 prérequis clairs et réalistes: connaissances et compétences nécessaires,
+       outils ou logiciels requis le cas échéant, niveau d'expérience préalable recommandé
+    3. 3 à 5 méthodes d'apprentissage variées, modernes et clairement nommées
+       (ex: "Vidéos interactives", "Ateliers pratiques", "Études de cas")
+    
+    Retourne le résultat sous forme d'un objet JSON structuré comme suit:
+    {{
+        "learning_objectives": ["Objectif 1", "Objectif 2", ...],
+        "prerequisites": ["Prérequis 1", "Prérequis 2", ...],
+        "learning_methods": ["Méthode 1", "Méthode 2", ...]
+    }}
+    """
+    
+    try:
+        # Appel au modèle en mode JSON
+        completion = _complete("setup", PEDAGOGY_SYSTEM_PROMPT, prompt, 1500, api_provider, api_key, json_mode=True)
+        setup = json.loads(completion.text)
         
-        return methods
+        # Ne garder que des listes de chaînes non vides
+        return {
+            key: [str(item).strip() for item in setup.get(key) or [] if str(item).strip()]
+            for key in ("learning_objectives", "prerequisites", "learning_methods")
+        }
     
     except Exception as e:
-        return [f"Erreur lors de l'appel à l'API OpenAI: {str(e)}"]
+        return {"error": f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"}
 
 # Fonctions pour traiter différents types de documents
 
+# Taille des blocs lus dans les fichiers texte
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Longueur maximale d'un paragraphe: une ligne plus longue est coupée
+MAX_PARAGRAPH_CHARS = 64 * 1024
+
+# Nombre de pages de PDF extraites avant l'OCR des pages sans texte du lot
+PDF_PAGE_WINDOW = 16
+
+# Espaces de noms XML des documents Office
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DRAWING_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_PRESENTATION_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_RELATIONSHIPS_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+def iter_pdf_pages(file: BinaryIO) -> Iterator[str]:
+    """
+    Extrait le texte d'un fichier PDF page par page, sans charger tout le
+    fichier. Les pages sans texte exploitable (numérisées, exports de
+    diapositives) passent par l'OCR local s'il est installé, par lots de
+    PDF_PAGE_WINDOW pages.
+    
+    Args:
+        file: Le fichier PDF en mode binaire
+    
+    Yields:
+        Le texte de chaque page
+    """
+    pdf_reader = PyPDF2.PdfReader(file)
+    page_count = len(pdf_reader.pages)
+    unreadable_pages = 0
+    for start in range(0, page_count, PDF_PAGE_WINDOW):
+        page_texts = {
+            number: pdf_reader.pages[number].extract_text() or ""
+            for number in range(start, min(page_count, start + PDF_PAGE_WINDOW))
+        }
+        # Les objets déjà lus (flux de contenu des pages) sont relus au besoin:
+        # vider ce cache borne la mémoire sur les gros documents
+        pdf_reader.resolved_objects.clear()
+        
+        # Pages numérisées ou illisibles: OCR local de ces seules pages, si disponible
+        low_text_pages = [number for number, text in page_texts.items() if is_low_text_page(text)]
+        if low_text_pages and ocr_available():
+            for number, text in ocr_pages(file, low_text_pages).items():
+                if len(text.strip()) > len(page_texts[number].strip()):
+                    page_texts[number] = text
+        else:
+            unreadable_pages += len(low_text_pages)
+        yield from page_texts.values()
+    
+    if unreadable_pages:
+        print(f"{unreadable_pages} page(s) du PDF sans texte exploitable (OCR indisponible).")
+
+def iter_docx_paragraphs(file: BinaryIO) -> Iterator[str]:
+    """
+    Extrait le texte d'un fichier Word (DOCX) paragraphe par paragraphe, en
+    lisant le XML du document au fil de l'eau (tableaux compris).
+    
+    Args:
+        file: Le fichier DOCX en mode binaire
+    
+    Yields:
+        Le texte de chaque paragraphe
+    """
+    with zipfile.ZipFile(file) as archive, archive.open("word/document.xml") as xml:
+        body = None
+        for event, element in ElementTree.iterparse(xml, events=("start", "end")):
+            if event == "start":
+                if element.tag == _WORD_NS + "body":
+                    body = element
+            elif element.tag == _WORD_NS + "p":
+                yield "".join(node.text or "" for node in element.iter(_WORD_NS + "t"))
+                element.clear()
+                # Retirer les éléments déjà lus (sauf celui en cours, un tableau par exemple)
+                if body is not None and len(body) > 256:
+                    del body[:-1]
+
+def _pptx_slide_paths(archive: zipfile.ZipFile) -> List[str]:
+    """
+    Retourne le chemin des diapositives dans l'ordre de la présentation.
+    """
+    try:
+        relationships = ElementTree.fromstring(archive.read("ppt/_rels/presentation.xml.rels"))
+        targets = {relationship.get("Id"): relationship.get("Target") for relationship in relationships}
+        presentation = ElementTree.fromstring(archive.read("ppt/presentation.xml"))
+        paths = []
+        for slide in presentation.iter(_PRESENTATION_NS + "sldId"):
+            target = targets[slide.get(_RELATIONSHIPS_NS + "id")]
+            paths.append(target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("ppt", target)))
+        return paths
+    except (KeyError, ElementTree.ParseError):
+        # Présentation atypique: ordre des numéros de fichiers
+        names = [name for name in archive.namelist() if re.fullmatch(r"ppt/slides/slide\d+\.xml", name)]
+        return sorted(names, key=lambda name: int(re.search(r"(\d+)\.xml$", name).group(1)))
+
+def iter_pptx_paragraphs(file: BinaryIO) -> Iterator[str]:
+    """
+    Extrait le texte d'un fichier PowerPoint (PPTX) diapositive par diapositive.
+    
+    Args:
+        file: Le fichier PPTX en mode binaire
+    
+    Yields:
+        Le texte de chaque paragraphe, et une ligne vide après chaque diapositive
+    """
+    with zipfile.ZipFile(file) as archive:
+        for path in _pptx_slide_paths(archive):
+            with archive.open(path) as xml:
+                for _, element in ElementTree.iterparse(xml):
+                    if element.tag == _DRAWING_NS + "p":
+                        yield "".join(node.text or "" for node in element.iter(_DRAWING_NS + "t"))
+                        element.clear()
+            yield ""
+
+def _detect_text_encoding(file: BinaryIO) -> str:
+    # Un fichier qui n'est pas de l'UTF-8 valide est lu en latin-1 (qui décode tout octet)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        while True:
+            block = file.read(READ_BLOCK_SIZE)
+            decoder.decode(block, final=not block)
+            if not block:
+                return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
+    finally:
+        file.seek(0)
+
+def iter_txt_lines(file: BinaryIO) -> Iterator[str]:
+    """
+    Extrait le texte d'un fichier texte (TXT) ligne par ligne, par blocs de READ_BLOCK_SIZE octets.
+    
+    Args:
+        file: Le fichier TXT en mode binaire
+    
+    Yields:
+        Chaque ligne (les lignes de plus de MAX_PARAGRAPH_CHARS caractères sont coupées)
+    """
+    decoder = codecs.getincrementaldecoder(_detect_text_encoding(file))(errors="ignore")
+    pending = ""
+    while True:
+        block = file.read(READ_BLOCK_SIZE)
+        lines = (pending + decoder.decode(block, final=not block)).split("\n")
+        pending = lines.pop()
+        yield from lines
+        while len(pending) > MAX_PARAGRAPH_CHARS:
+            yield pending[:MAX_PARAGRAPH_CHARS]
+            pending = pending[MAX_PARAGRAPH_CHARS:]
+        if not block:
+            break
+    if pending:
+        yield pending
+
 def extract_text_from_pdf(file: BinaryIO) -> str:
     """
-    Extrait le texte d'un fichier PDF.
+    Extrait le texte d'un fichier PDF (voir iter_pdf_pages).
     
     Args:
         file: Le fichier PDF en mode binaire
@@ -391,12 +697,7 @@ def extract_text_from_pdf(file: BinaryIO) -> str:
         Le texte extrait du PDF
     """
     try:
-        pdf_reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            text += page.extract_text() + "\n\n"
-        return text
+        return "".join(text + "\n\n" for text in iter_pdf_pages(file))
     except Exception as e:
         return f"Erreur lors de l'extraction du texte du PDF: {str(e)}"
 
@@ -411,19 +712,7 @@ def extract_text_from_docx(file: BinaryIO) -> str:
         Le texte extrait du document Word
     """
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-            temp_file.write(file.read())
-            temp_file_path = temp_file.name
-        
-        doc = docx.Document(temp_file_path)
-        text = ""
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        
-        # Supprimer le fichier temporaire
-        os.unlink(temp_file_path)
-        
-        return text
+        return "".join(paragraph + "\n" for paragraph in iter_docx_paragraphs(file))
     except Exception as e:
         return f"Erreur lors de l'extraction du texte du document Word: {str(e)}"
 
@@ -438,23 +727,7 @@ def extract_text_from_pptx(file: BinaryIO) -> str:
         Le texte extrait de la présentation PowerPoint
     """
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pptx') as temp_file:
-            temp_file.write(file.read())
-            temp_file_path = temp_file.name
-        
-        prs = Presentation(temp_file_path)
-        text = ""
-        
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text += shape.text + "\n"
-            text += "\n"
-        
-        # Supprimer le fichier temporaire
-        os.unlink(temp_file_path)
-        
-        return text
+        return "".join(paragraph + "\n" for paragraph in iter_pptx_paragraphs(file))
     except Exception as e:
         return f"Erreur lors de l'extraction du texte de la présentation PowerPoint: {str(e)}"
 
@@ -469,49 +742,124 @@ def extract_text_from_txt(file: BinaryIO) -> str:
         Le texte extrait du fichier texte
     """
     try:
-        content = file.read()
-        # Essayer de décoder avec différents encodages
-        for encoding in ['utf-8', 'latin-1', 'cp1252']:
-            try:
-                return content.decode(encoding)
-            except UnicodeDecodeError:
-                continue
-        
-        # Si aucun encodage ne fonctionne, utiliser utf-8 avec des erreurs ignorées
-        return content.decode('utf-8', errors='ignore')
+        return "\n".join(iter_txt_lines(file))
     except Exception as e:
         return f"Erreur lors de l'extraction du texte du fichier texte: {str(e)}"
 
-def split_text_into_chunks(text: str, max_tokens: int = 8000) -> List[str]:
+# Fonction d'extraction par extension de fichier
+DOCUMENT_EXTRACTORS = {
+    '.pdf': extract_text_from_pdf,
+    '.docx': extract_text_from_docx,
+    '.pptx': extract_text_from_pptx,
+    '.txt': extract_text_from_txt,
+}
+
+# Extraction progressive (pages, paragraphes ou lignes) par extension de fichier
+DOCUMENT_READERS = {
+    '.pdf': iter_pdf_pages,
+    '.docx': iter_docx_paragraphs,
+    '.pptx': iter_pptx_paragraphs,
+    '.txt': iter_txt_lines,
+}
+
+def extract_document_text(file: BinaryIO, filename: str) -> str:
     """
-    Divise un texte en morceaux plus petits pour respecter les limites de tokens.
+    Extrait le texte d'un document selon l'extension de son nom.
     
     Args:
-        text: Le texte à diviser
-        max_tokens: Le nombre maximum de tokens par morceau
+        file: Le fichier en mode binaire
+        filename: Le nom du fichier
     
     Returns:
-        Une liste de morceaux de texte
+        Le texte extrait
+    
+    Raises:
+        ValueError: Si le type de fichier n'est pas pris en charge
+    """
+    file_extension = os.path.splitext(filename)[1].lower()
+    extractor = DOCUMENT_EXTRACTORS.get(file_extension)
+    if extractor is None:
+        raise ValueError(f"Type de fichier non pris en charge: {file_extension}")
+    return extractor(file)
+
+def iter_document_text(file: BinaryIO, filename: str) -> Iterator[str]:
+    """
+    Extrait le texte d'un document au fur et à mesure de sa lecture: la
+    mémoire utilisée ne dépend pas de la taille du fichier.
+    
+    Args:
+        file: Le fichier en mode binaire (de préférence un fichier sur disque)
+        filename: Le nom du fichier
+    
+    Yields:
+        Les pages, paragraphes ou lignes du document
+    
+    Raises:
+        ValueError: Si le type de fichier n'est pas pris en charge
+    """
+    file_extension = os.path.splitext(filename)[1].lower()
+    reader = DOCUMENT_READERS.get(file_extension)
+    if reader is None:
+        raise ValueError(f"Type de fichier non pris en charge: {file_extension}")
+    return reader(file)
+
+def _token_tools() -> Tuple[Callable[[str], int], Callable[[str, int], List[str]]]:
+    """
+    Retourne une fonction qui compte les tokens d'un texte et une fonction
+    qui coupe un texte en tranches d'au plus n tokens.
     """
     try:
         # Initialiser l'encodeur de tokens pour GPT-4
         enc = tiktoken.encoding_for_model("gpt-4")
         
-        # Diviser le texte en paragraphes
-        paragraphs = text.split("\n")
+        def split_tokens(text: str, max_tokens: int) -> List[str]:
+            tokens = enc.encode(text)
+            return [enc.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
         
-        chunks = []
-        current_chunk = ""
-        current_token_count = 0
-        
-        for paragraph in paragraphs:
+        return lambda text: len(enc.encode(text)), split_tokens
+    except Exception as e:
+        print(f"Erreur lors de l'initialisation de l'encodeur de tokens: {str(e)}")
+        # Approximation grossière: environ 4 caractères par token
+        return (
+            lambda text: len(text) // 4,
+            lambda text, max_tokens: [text[i:i + 4 * max_tokens] for i in range(0, len(text), 4 * max_tokens)]
+        )
+
+def iter_text_chunks(segments: Iterable[str], max_tokens: int = 8000) -> Iterator[str]:
+    """
+    Regroupe des paragraphes en morceaux d'au plus `max_tokens` tokens, au
+    fur et à mesure qu'ils arrivent. Un paragraphe plus long que la limite
+    est coupé en tranches de `max_tokens` tokens.
+    
+    Args:
+        segments: Les textes à découper (pages, paragraphes ou lignes), dans l'ordre du document
+        max_tokens: Le nombre maximum de tokens par morceau
+    
+    Yields:
+        Les morceaux de texte
+    """
+    count_tokens, split_tokens = _token_tools()
+    current_chunk = ""
+    current_token_count = 0
+    
+    for segment in segments:
+        for paragraph in segment.split("\n"):
             # Compter les tokens dans ce paragraphe
-            paragraph_tokens = len(enc.encode(paragraph))
+            paragraph_tokens = count_tokens(paragraph)
+            
+            # Un paragraphe trop long pour un morceau (et pour le modèle d'embeddings) est coupé
+            if paragraph_tokens > max_tokens:
+                if current_chunk:
+                    yield current_chunk
+                yield from split_tokens(paragraph, max_tokens)
+                current_chunk = ""
+                current_token_count = 0
+                continue
             
             # Si ajouter ce paragraphe dépasse la limite, commencer un nouveau morceau
             if current_token_count + paragraph_tokens > max_tokens:
                 if current_chunk:  # Éviter d'ajouter des morceaux vides
-                    chunks.append(current_chunk)
+                    yield current_chunk
                 current_chunk = paragraph
                 current_token_count = paragraph_tokens
             else:
@@ -521,92 +869,202 @@ def split_text_into_chunks(text: str, max_tokens: int = 8000) -> List[str]:
                 else:
                     current_chunk = paragraph
                 current_token_count += paragraph_tokens
-        
-        # Ajouter le dernier morceau s'il n'est pas vide
-        if current_chunk:
-            chunks.append(current_chunk)
-        
-        return chunks
-    except Exception as e:
-        print(f"Erreur lors de la division du texte: {str(e)}")
-        # En cas d'erreur, diviser simplement par caractères
-        chunks = []
-        chunk_size = 4000  # Approximation grossière
-        for i in range(0, len(text), chunk_size):
-            chunks.append(text[i:i + chunk_size])
-        return chunks
+    
+    # Le dernier morceau s'il n'est pas vide
+    if current_chunk:
+        yield current_chunk
 
-def create_embeddings(text_chunks: List[str], api_key: Optional[str] = None) -> List[List[float]]:
+def split_text_into_chunks(text: str, max_tokens: int = 8000) -> List[str]:
     """
-    Crée des embeddings pour une liste de morceaux de texte en utilisant l'API OpenAI.
+    Divise un texte en morceaux plus petits pour respecter les limites de tokens.
     
     Args:
-        text_chunks: Liste de morceaux de texte
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        text: Le texte à diviser
+        max_tokens: Le nombre maximum de tokens par morceau
     
     Returns:
-        Liste d'embeddings (vecteurs)
+        Une liste de morceaux de texte
+    """
+    return list(iter_text_chunks([text], max_tokens))
+
+def _provider_supporting(api_provider: str, capability: str) -> str:
+    """
+    Retourne le fournisseur à utiliser pour une capacité ('supports_embeddings',
+    'supports_speech'): celui choisi s'il la prend en charge, sinon OpenAI.
+    """
+    provider_class = PROVIDERS.get(api_provider.lower())
+    if provider_class and getattr(provider_class, capability):
+        return api_provider.lower()
+    return "openai"
+
+def embed_text_batch(
+    text_chunks: List[str],
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
+) -> List[List[float]]:
     """
+    Crée les embeddings d'un lot de morceaux de texte en une seule requête.
+    
+    Args:
+        text_chunks: Le lot de morceaux de texte (au plus EMBEDDING_BATCH_SIZE de préférence)
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API choisi (OpenAI est utilisé s'il ne fournit pas d'embeddings)
+    
+    Returns:
+        Liste d'embeddings (vecteurs), des vecteurs nuls pour les morceaux en échec
+    """
+    api_provider = _provider_supporting(api_provider, "supports_embeddings")
+    
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        raise ValueError("Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY.")
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        raise ValueError(missing_api_key_message(api_provider))
     
-    embeddings = []
+    provider = get_provider(api_provider, api_key)
+    model = resolve_model(provider.name, "embedding")
     
-    for chunk in text_chunks:
-        try:
-            response = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=chunk
+    try:
+        return _submit(
+            lambda: provider.embed(text_chunks, model),
+            provider=provider.name,
+            model=model,
+            estimated_tokens=estimate_tokens(*text_chunks),
+            request_key=(api_key, tuple(text_chunks)),
+            cacheable=True,
+            task="embedding"
+        )
+    except Exception as e:
+        # Requête refusée pour son contenu: le lot est coupé en deux pour que
+        # seul le morceau en cause reste sans embedding
+        if len(text_chunks) > 1 and is_invalid_request_error(e):
+            middle = len(text_chunks) // 2
+            return (
+                embed_text_batch(text_chunks[:middle], api_key, api_provider)
+                + embed_text_batch(text_chunks[middle:], api_key, api_provider)
             )
-            embedding = response.data[0].embedding
-            embeddings.append(embedding)
-        except Exception as e:
-            print(f"Erreur lors de la création de l'embedding: {str(e)}")
-            # En cas d'erreur, ajouter un embedding vide
-            embeddings.append([0.0] * 1536)  # Dimension standard pour les embeddings OpenAI
+        if len(text_chunks) == 1:
+            print(f"Erreur lors de la création de l'embedding du morceau « {text_chunks[0][:80]}… »: {str(e)}")
+        else:
+            print(f"Erreur lors de la création des embeddings ({len(text_chunks)} morceaux): {str(e)}")
+        # En cas d'erreur, des embeddings vides (exclus des recherches)
+        return [[0.0] * EMBEDDING_DIMENSION for _ in text_chunks]  # Dimension standard pour les embeddings OpenAI
+
+def create_embeddings(
+    text_chunks: List[str],
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
+) -> List[List[float]]:
+    """
+    Crée des embeddings pour une liste de morceaux de texte, par lots de EMBEDDING_BATCH_SIZE.
+    
+    Args:
+        text_chunks: Liste de morceaux de texte
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API choisi (OpenAI est utilisé s'il ne fournit pas d'embeddings)
     
+    Returns:
+        Liste d'embeddings (vecteurs)
+    """
+    embeddings = []
+    for start in range(0, len(text_chunks), EMBEDDING_BATCH_SIZE):
+        embeddings.extend(embed_text_batch(text_chunks[start:start + EMBEDDING_BATCH_SIZE], api_key, api_provider))
     return embeddings
 
-def process_document(file: BinaryIO, filename: str, api_key: Optional[str] = None) -> Tuple[str, List[List[float]]]:
+def process_document(
+    file: BinaryIO,
+    filename: str,
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
+) -> Tuple[str, List[str], List[List[float]]]:
     """
-    Traite un document, extrait son texte et crée des embeddings.
+    Traite un document, extrait son texte, le découpe et crée les embeddings de chaque morceau.
     
     Args:
         file: Le fichier en mode binaire
         filename: Le nom du fichier
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        api_key: Clé API pour les embeddings (optionnelle, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API choisi
     
     Returns:
-        Un tuple contenant le texte extrait et les embeddings
+        Un tuple contenant le texte extrait, les morceaux de texte et leurs embeddings
     """
     # Déterminer le type de fichier
     file_extension = os.path.splitext(filename)[1].lower()
+    if file_extension not in DOCUMENT_EXTRACTORS:
+        return f"Type de fichier non pris en charge: {file_extension}", [], []
     
     # Extraire le texte en fonction du type de fichier
-    if file_extension == '.pdf':
-        text = extract_text_from_pdf(file)
-    elif file_extension == '.docx':
-        text = extract_text_from_docx(file)
-    elif file_extension == '.pptx':
-        text = extract_text_from_pptx(file)
-    elif file_extension == '.txt':
-        text = extract_text_from_txt(file)
-    else:
-        return f"Type de fichier non pris en charge: {file_extension}", []
+    with document_stage("extraction", file_extension):
+        text = extract_document_text(file, filename)
     
     # Diviser le texte en morceaux
-    text_chunks = split_text_into_chunks(text)
+    with document_stage("chunking", file_extension):
+        text_chunks = split_text_into_chunks(text, max_tokens=DOCUMENT_CHUNK_TOKENS)
     
     # Créer des embeddings
-    embeddings = create_embeddings(text_chunks, api_key)
+    with document_stage("embedding", file_extension):
+        embeddings = create_embeddings(text_chunks, api_key, api_provider)
+    
+    return text, text_chunks, embeddings
+
+def _query_embedding(corpus: DocumentCorpus, query: str, api_key: ApiKey = None) -> List[float]:
+    embedding = corpus.cached_query_embedding(query)
+    if embedding is None:
+        # La requête est encodée par le même fournisseur que les documents
+        embedding = create_embeddings([query], api_key, corpus.api_provider)[0]
+        corpus.cache_query_embedding(query, embedding)
+    return embedding
+
+def select_document_chunks(
+    corpus: Union[DocumentCorpus, DocumentSubset],
+    query: str,
+    max_chars: int,
+    exclude: Optional[List[DocumentChunk]] = None,
+    api_key: ApiKey = None
+) -> List[DocumentChunk]:
+    """
+    Sélectionne dans le corpus les morceaux les plus pertinents pour une requête.
+    
+    Args:
+        corpus: Le corpus des documents de référence (ou une vue limitée à certains documents)
+        query: Le texte de la requête (titre et description du cours, du chapitre...)
+        max_chars: Le nombre maximum de caractères sélectionnés
+        exclude: Des morceaux déjà présents dans le prompt
+        api_key: Clé API ou identifiants de la session pour encoder la requête
     
-    return text, embeddings
+    Returns:
+        Les morceaux sélectionnés, dans l'ordre des documents
+    """
+    try:
+        # Assez de candidats pour remplir le budget, même si certains sont exclus ou trop longs
+        top_k = max(16, max_chars // 100)
+        ranked = [chunk for _, chunk in corpus.search(_query_embedding(corpus, query, api_key), top_k=top_k)]
+    except Exception as e:
+        print(f"Erreur lors de la recherche dans les documents: {str(e)}")
+        ranked = []
+    
+    # Sans embeddings exploitables, utiliser le début des documents
+    if not ranked:
+        ranked = corpus.leading_chunks()
+    
+    excluded = {(chunk.document, chunk.position) for chunk in exclude or []}
+    documents = corpus.documents()
+    selected = []
+    total = 0
+    for chunk in ranked:
+        if (chunk.document, chunk.position) in excluded or total + len(chunk.text) > max_chars:
+            continue
+        selected.append(chunk)
+        total += len(chunk.text)
+    
+    return sorted(selected, key=lambda chunk: (documents.index(chunk.document), chunk.position))
+
+def format_document_chunks(chunks: List[DocumentChunk]) -> str:
+    """
+    Met en forme des morceaux de documents pour un prompt, avec leur source.
+    """
+    return "\n\n".join(f"[{chunk.document}, extrait {chunk.position + 1}]\n{chunk.text}" for chunk in chunks)
 
 def generate_course_structure(
     course_title: str, 
@@ -615,11 +1073,18 @@ def generate_course_structure(
     difficulty: str, 
     num_modules: int,
     document_text: str = "",
-    document_embeddings: List[List[float]] = [],
-    api_key: Optional[str] = None
+    document_corpus: Optional[DocumentCorpus] = None,
+    api_key: ApiKey = None,
+    api_provider: str = "openai",
+    sharded: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
-    Génère une structure hiérarchique de modules et chapitres pour un cours en utilisant l'API OpenAI.
+    Génère une structure hiérarchique de modules et chapitres pour un cours.
+    
+    Au-delà de SHARDED_STRUCTURE_MIN_MODULES modules, un seul appel serait
+    lent ou tronqué: le plan des modules est d'abord généré par un appel
+    court, puis les chapitres de chaque module en parallèle, et les parties
+    sont réunies en une structure cohérente (_merge_sharded_structure).
     
     Args:
         course_title: Le titre du cours
@@ -627,21 +1092,23 @@ def generate_course_structure(
         duration: La durée du cours
         difficulty: Le niveau de difficulté du cours
         num_modules: Le nombre de modules souhaité
-        document_text: Le texte des documents uploadés (optionnel)
-        document_embeddings: Les embeddings des documents uploadés (optionnel)
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        document_text: Le texte des documents de référence (optionnel, ignoré si un corpus est fourni)
+        document_corpus: Le corpus indexé des documents de référence (optionnel)
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
+        sharded: Génération en deux phases (None: selon le nombre de modules)
     
     Returns:
         Un dictionnaire contenant la structure du cours avec modules et chapitres
     """
+    # Les embeddings de la recherche dans les documents peuvent venir d'un autre fournisseur
+    credentials = api_key
+    
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return {"error": "Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."}
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        return {"error": missing_api_key_message(api_provider)}
     
     # Construire le contexte pour l'IA
     context = f"""
@@ -652,9 +1119,21 @@ def generate_course_structure(
     Nombre de modules souhaité: {num_modules}
     """
     
-    # Ajouter le contenu des documents si disponible
-    if document_text:
-        context += f"\nContenu des documents de référence: {document_text[:2000]}..."
+    # Ajouter les extraits des documents les plus pertinents pour le cours
+    document_context = ""
+    if document_corpus:
+        extracts = select_document_chunks(document_corpus, f"{course_title}\n{course_description}", STRUCTURE_CONTEXT_CHARS, api_key=credentials)
+        document_context = f"\nExtraits des documents de référence:\n{format_document_chunks(extracts)}"
+    elif document_text:
+        document_context = f"\nContenu des documents de référence: {document_text[:2000]}..."
+    
+    if sharded is None:
+        sharded = num_modules >= SHARDED_STRUCTURE_MIN_MODULES
+    if sharded:
+        return _generate_sharded_structure(
+            context, document_context, num_modules, document_corpus, document_text, credentials, api_provider, api_key
+        )
+    context += document_context
     
     # Construire le prompt pour l'API
     prompt = f"""
@@ -693,26 +1172,235 @@ def generate_course_structure(
     """
     
     try:
-        # Appel à l'API OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": "Tu es un expert en pédagogie et en conception de cours. Tu dois créer une structure de cours détaillée et cohérente."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000,
-            response_format={"type": "json_object"}
+        # Appel au modèle en mode JSON
+        completion = _complete(
+            "structure",
+            "Tu es un expert en pédagogie et en conception de cours. Tu dois créer une structure de cours détaillée et cohérente.",
+            prompt,
+            4000,
+            api_provider,
+            api_key,
+            json_mode=True
         )
         
         # Extraire et parser la réponse JSON
-        course_structure_text = response.choices[0].message.content
+        course_structure_text = completion.text
         course_structure = json.loads(course_structure_text)
         
         return course_structure
     
     except Exception as e:
-        return {"error": f"Erreur lors de l'appel à l'API OpenAI: {str(e)}"}
+        return {"error": f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"}
+
+def _generate_structure_outline(context: str, num_modules: int, api_provider: str, api_key: str) -> List[Dict[str, Any]]:
+    """
+    Première phase de la génération en deux phases: le plan des modules
+    (titres et descriptions), sans les chapitres.
+    
+    Returns:
+        Les modules du plan, dans l'ordre
+    """
+    prompt = f"""
+    En tant qu'expert en pédagogie et en conception de cours, crée le plan des modules d'un cours avec le contexte suivant:
+    
+    {context}
+    
+    Génère exactement {num_modules} modules numérotés, chacun avec un titre et une description de 2 phrases
+    (contenu et objectif du module). Ne détaille pas les chapitres.
+    Les modules doivent être progressifs, adaptés au niveau de difficulté indiqué, sans chevauchement,
+    et couvrir ensemble l'ensemble du sujet.
+    
+    Retourne le plan sous forme d'un objet JSON structuré comme suit:
+    {{
+        "modules": [
+            {{"module_number": 1, "module_title": "Titre du module 1", "module_description": "Description du module 1"}},
+            ...
+        ]
+    }}
+    """
+    completion = _complete(
+        "structure_outline",
+        "Tu es un expert en pédagogie et en conception de cours. Tu dois créer un plan de cours cohérent.",
+        prompt,
+        200 + 100 * num_modules,
+        api_provider,
+        api_key,
+        json_mode=True
+    )
+    modules = [module for module in json.loads(completion.text).get("modules", []) if module.get("module_title")]
+    if len(modules) < num_modules:
+        raise ValueError(f"plan des modules incomplet: {len(modules)} modules sur {num_modules}")
+    return modules[:num_modules]
+
+def _generate_module_chapters(
+    prefix: str,
+    module_number: int,
+    module: Dict[str, Any],
+    document_corpus: Optional[DocumentCorpus],
+    document_text: str,
+    credentials: ApiKey,
+    api_provider: str,
+    api_key: str
+) -> List[Dict[str, Any]]:
+    """
+    Seconde phase: les chapitres d'un module du plan (descriptions et points clés).
+    Les extraits des documents propres au module sont recherchés ici, dans le
+    même travail parallèle que l'appel au modèle.
+    
+    Returns:
+        Les chapitres du module
+    """
+    # Extraits des documents propres au module (ou le début des documents)
+    module_context = ""
+    if document_corpus:
+        extracts = select_document_chunks(
+            document_corpus, f"{module['module_title']}\n{module.get('module_description', '')}", MODULE_CONTEXT_CHARS, api_key=credentials
+        )
+        if extracts:
+            module_context = f"Extraits des documents de référence pour ce module:\n{format_document_chunks(extracts)}"
+    elif document_text:
+        module_context = f"Contenu des documents de référence: {document_text[:2000]}..."
+    
+    # Partie variable: le module à détailler (le préfixe, commun à tous les modules, est mis en cache)
+    prompt = f"""
+    Module à détailler: {module_number}: {module['module_title']}
+    Description du module: {module.get('module_description', '')}
+    {module_context}
+    """
+    completion = _complete(
+        "structure_module",
+        "Tu es un expert en pédagogie et en conception de cours. Tu dois détailler un module d'une structure de cours.",
+        prompt,
+        1500,
+        api_provider,
+        api_key,
+        json_mode=True,
+        prefix=prefix
+    )
+    chapters = json.loads(completion.text).get("chapters", [])
+    if not chapters:
+        raise ValueError(f"aucun chapitre pour le module {module_number}")
+    return chapters
+
+def _merge_sharded_structure(outline: List[Dict[str, Any]], chapters_by_module: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Réunit le plan et les chapitres de chaque module en une structure
+    cohérente: numérotation continue des modules et chapitres, champs
+    attendus présents, chapitres en double (même titre dans un module
+    précédent) retirés tant que le module garde au moins un chapitre.
+    """
+    seen_titles = set()
+    modules = []
+    for module_number, (module, chapters) in enumerate(zip(outline, chapters_by_module), 1):
+        titled = [
+            (" ".join(str(chapter.get("chapter_title", "")).split()), chapter)
+            for chapter in chapters[:MAX_CHAPTERS_PER_MODULE]
+        ]
+        titled = [(title, chapter) for title, chapter in titled if title]
+        unique = [(title, chapter) for title, chapter in titled if title.casefold() not in seen_titles]
+        merged_chapters = []
+        for title, chapter in unique or titled:
+            seen_titles.add(title.casefold())
+            key_points = chapter.get("key_points") or []
+            merged_chapters.append({
+                "chapter_number": float(f"{module_number}.{len(merged_chapters) + 1}"),
+                "chapter_title": title,
+                "description": str(chapter.get("description", "")),
+                "key_points": [str(point) for point in key_points] if isinstance(key_points, list) else [str(key_points)]
+            })
+        modules.append({
+            "module_number": module_number,
+            "module_title": module["module_title"],
+            "module_description": module.get("module_description", ""),
+            "chapters": merged_chapters
+        })
+    return {"modules": modules}
+
+def _generate_sharded_structure(
+    context: str,
+    document_context: str,
+    num_modules: int,
+    document_corpus: Optional[DocumentCorpus],
+    document_text: str,
+    credentials: ApiKey,
+    api_provider: str,
+    api_key: str
+) -> Dict[str, Any]:
+    """
+    Génère la structure d'un cours en deux phases: plan des modules, puis
+    chapitres de chaque module en parallèle, réunis par _merge_sharded_structure.
+    La durée dépend peu du nombre de modules.
+    """
+    try:
+        outline = _generate_structure_outline(context + document_context, num_modules, api_provider, api_key)
+        outline_text = "\n".join(
+            f"Module {number}: {module['module_title']} — {module.get('module_description', '')}"
+            for number, module in enumerate(outline, 1)
+        )
+        
+        # Préfixe stable, identique pour tous les modules: il est mis en cache par le fournisseur
+        prefix = f"""
+    En tant qu'expert en pédagogie et en conception de cours, détaille un module d'un cours avec le contexte suivant:
+    
+    {context}
+    
+    Plan complet du cours:
+    {outline_text}
+    
+    Pour le module demandé, génère:
+    1. 3 à 5 chapitres numérotés et titrés, propres à ce module (sans reprendre le contenu des autres modules du plan)
+    2. Pour chaque chapitre, une brève description du contenu (2-3 phrases)
+    3. Pour chaque chapitre, 3 à 5 points clés qui seront abordés
+    
+    Les chapitres doivent s'enchaîner logiquement et être adaptés au niveau de difficulté indiqué.
+    
+    Retourne les chapitres sous forme d'un objet JSON structuré comme suit:
+    {{
+        "chapters": [
+            {{
+                "chapter_number": 1.1,
+                "chapter_title": "Titre du chapitre 1.1",
+                "description": "Description du chapitre 1.1",
+                "key_points": ["Point clé 1", "Point clé 2", "Point clé 3"]
+            }},
+            ...
+        ]
+    }}
+    """
+        
+        # Un travail par module (recherche des extraits et appel), en parallèle,
+        # avec la priorité de l'appelant (contextvars)
+        with ThreadPoolExecutor(max_workers=min(STRUCTURE_SHARD_CONCURRENCY, len(outline)), thread_name_prefix="structure") as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, _generate_module_chapters,
+                    prefix, number, module, document_corpus, document_text, credentials, api_provider, api_key
+                )
+                for number, module in enumerate(outline, 1)
+            ]
+            chapters_by_module = [future.result() for future in futures]
+        
+        return _merge_sharded_structure(outline, chapters_by_module)
+    
+    except Exception as e:
+        return {"error": f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"}
+
+def _course_outline(course_structure: Dict[str, Any]) -> str:
+    """
+    Résume la structure d'un cours en un plan textuel (modules et chapitres).
+    
+    Args:
+        course_structure: La structure du cours générée par generate_course_structure
+    
+    Returns:
+        Le plan du cours, une ligne par module et par chapitre
+    """
+    lines = []
+    for module in course_structure.get("modules", []):
+        lines.append(f"Module {module['module_number']}: {module['module_title']}")
+        for chapter in module.get("chapters", []):
+            lines.append(f"  - Chapitre {chapter['chapter_number']}: {chapter['chapter_title']}")
+    return "\n".join(lines)
 
 def generate_chapter_content(
     course_title: str,
@@ -722,11 +1410,13 @@ def generate_chapter_content(
     chapter_description: str,
     key_points: List[str],
     document_text: str = "",
-    document_embeddings: List[List[float]] = [],
-    api_key: Optional[str] = None
+    document_corpus: Optional[DocumentCorpus] = None,
+    course_structure: Optional[Dict[str, Any]] = None,
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
 ) -> Dict[str, Any]:
     """
-    Génère le contenu détaillé d'un chapitre de cours en utilisant l'API OpenAI.
+    Génère le contenu détaillé d'un chapitre de cours.
     
     Args:
         course_title: Le titre du cours
@@ -735,42 +1425,54 @@ def generate_chapter_content(
         chapter_title: Le titre du chapitre
         chapter_description: La description du chapitre
         key_points: Les points clés du chapitre
-        document_text: Le texte des documents uploadés (optionnel)
-        document_embeddings: Les embeddings des documents uploadés (optionnel)
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        document_text: Le texte des documents de référence (optionnel, ignoré si un corpus est fourni)
+        document_corpus: Le corpus indexé des documents de référence (optionnel)
+        course_structure: La structure complète du cours (optionnel), pour situer le chapitre dans le plan
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
     
     Returns:
         Un dictionnaire contenant le contenu détaillé du chapitre
     """
+    # Les embeddings de la recherche dans les documents peuvent venir d'un autre fournisseur
+    credentials = api_key
+    
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return {"error": "Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."}
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        return {"error": missing_api_key_message(api_provider)}
     
-    # Construire le contexte pour l'IA
-    context = f"""
+    # Contexte commun à tous les chapitres du cours
+    course_context = f"""
     Titre du cours: {course_title}
     Description du cours: {course_description}
-    Titre du module: {module_title}
-    Titre du chapitre: {chapter_title}
-    Description du chapitre: {chapter_description}
-    Points clés à aborder:
-    {', '.join(key_points)}
     """
     
-    # Ajouter le contenu des documents si disponible
-    if document_text:
-        context += f"\nContenu des documents de référence: {document_text[:2000]}..."
+    # Ajouter le plan du cours si disponible
+    if course_structure:
+        course_context += f"\nPlan du cours:\n{_course_outline(course_structure)}"
     
-    # Construire le prompt pour l'API
-    prompt = f"""
-    En tant qu'expert en pédagogie et en conception de cours, crée un contenu détaillé pour un chapitre de cours avec le contexte suivant:
+    # Ajouter le contenu des documents si disponible: une vue d'ensemble commune
+    # à tous les chapitres, puis des extraits propres au chapitre (partie variable)
+    chapter_extracts = ""
+    if document_corpus:
+        overview = select_document_chunks(document_corpus, f"{course_title}\n{course_description}", COURSE_CONTEXT_CHARS, api_key=credentials)
+        course_context += f"\nExtraits généraux des documents de référence:\n{format_document_chunks(overview)}"
+        
+        chapter_query = f"{chapter_title}\n{chapter_description}\n{', '.join(key_points)}"
+        extracts = select_document_chunks(document_corpus, chapter_query, CHAPTER_CONTEXT_CHARS, exclude=overview, api_key=credentials)
+        if extracts:
+            chapter_extracts = f"Extraits des documents de référence pour ce chapitre:\n{format_document_chunks(extracts)}"
+    elif document_text:
+        course_context += f"\nContenu des documents de référence: {document_text[:2000]}..."
     
-    {context}
+    # Préfixe stable (contexte du cours, consignes et format de réponse), identique
+    # pour tous les chapitres: il est mis en cache par le fournisseur entre les appels
+    prefix = f"""
+    En tant qu'expert en pédagogie et en conception de cours, crée un contenu détaillé pour un chapitre du cours suivant:
+    
+    {course_context}
     
     Génère un contenu de chapitre complet qui inclut:
     1. Une introduction engageante qui présente le sujet du chapitre
@@ -804,27 +1506,213 @@ def generate_chapter_content(
     }}
     """
     
+    # Partie variable: le chapitre à rédiger
+    prompt = f"""
+    Chapitre à rédiger:
+    Titre du module: {module_title}
+    Titre du chapitre: {chapter_title}
+    Description du chapitre: {chapter_description}
+    Points clés à aborder:
+    {', '.join(key_points)}
+    
+    {chapter_extracts}
+    """
+    
     try:
-        # Appel à l'API OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": "Tu es un expert en pédagogie et en conception de cours. Tu dois créer un contenu de chapitre détaillé, informatif et pédagogiquement solide."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000,
-            response_format={"type": "json_object"}
+        # Appel au modèle en mode JSON
+        completion = _complete(
+            "chapter",
+            "Tu es un expert en pédagogie et en conception de cours. Tu dois créer un contenu de chapitre détaillé, informatif et pédagogiquement solide.",
+            prompt,
+            4000,
+            api_provider,
+            api_key,
+            json_mode=True,
+            prefix=prefix
         )
         
         # Extraire et parser la réponse JSON
-        chapter_content_text = response.choices[0].message.content
+        chapter_content_text = completion.text
         chapter_content = json.loads(chapter_content_text)
         
         return chapter_content
     
     except Exception as e:
-        return {"error": f"Erreur lors de l'appel à l'API OpenAI: {str(e)}"}
+        return {"error": f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"}
+
+# Parties d'un chapitre qui peuvent être réécrites séparément
+CHAPTER_FRAGMENTS = ("introduction", "section", "conclusion", "exercises")
+
+# Consigne de réécriture pour chaque action
+FRAGMENT_ACTIONS = {
+    "regenerate": "Réécris entièrement cette partie, avec une longueur comparable et le même rôle dans le chapitre.",
+    "extend": "Développe cette partie: davantage d'explications, de détails et d'exemples, pour environ le double de longueur.",
+    "shorten": "Condense cette partie à environ la moitié de sa longueur, en gardant l'essentiel.",
+}
+
+# Tokens de réponse pour chaque partie (doublés pour la développer)
+_FRAGMENT_MAX_TOKENS = {"introduction": 600, "section": 1200, "conclusion": 600, "exercises": 1000}
+
+def _excerpt(text: str, chars: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= chars else text[:chars].rsplit(" ", 1)[0] + "…"
+
+def _chapter_digest(chapter_content: Dict[str, Any], fragment: str, section_index: Optional[int]) -> str:
+    """
+    Résume le reste d'un chapitre en quelques lignes (début de chaque partie),
+    comme contexte de la réécriture d'une de ses parties.
+    """
+    lines = []
+    if fragment != "introduction":
+        lines.append(f"Introduction: {_excerpt(chapter_content.get('introduction', ''), 300)}")
+    for index, section in enumerate(chapter_content.get("sections", [])):
+        if fragment == "section" and index == section_index:
+            lines.append(f"Section {index + 1}: {section.get('title', '')} (partie à réécrire)")
+        else:
+            lines.append(f"Section {index + 1}: {section.get('title', '')} — {_excerpt(section.get('content', ''), 200)}")
+    if fragment != "conclusion":
+        lines.append(f"Conclusion: {_excerpt(chapter_content.get('conclusion', ''), 200)}")
+    if fragment != "exercises" and chapter_content.get("exercises"):
+        questions = "; ".join(_excerpt(exercise.get("question", ""), 100) for exercise in chapter_content["exercises"])
+        lines.append(f"Exercices: {questions}")
+    return "\n".join(lines)
+
+def revise_chapter_fragment(
+    course_title: str,
+    module_title: str,
+    chapter_title: str,
+    key_points: List[str],
+    chapter_content: Dict[str, Any],
+    fragment: str,
+    section_index: Optional[int] = None,
+    action: str = "regenerate",
+    instructions: str = "",
+    document_corpus: Optional[DocumentCorpus] = None,
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
+) -> Dict[str, Any]:
+    """
+    Régénère, développe ou raccourcit une seule partie d'un chapitre déjà
+    généré (introduction, une section, conclusion ou exercices). Le reste du
+    chapitre n'est envoyé que sous forme de résumé: l'appel coûte une fraction
+    des tokens et de la durée de generate_chapter_content.
+    
+    Args:
+        course_title: Le titre du cours
+        module_title: Le titre du module
+        chapter_title: Le titre du chapitre
+        key_points: Les points clés du chapitre
+        chapter_content: Le contenu actuel du chapitre
+        fragment: La partie à réécrire ('introduction', 'section', 'conclusion' ou 'exercises')
+        section_index: L'indice de la section à réécrire (pour fragment='section')
+        action: 'regenerate', 'extend' ou 'shorten'
+        instructions: Des consignes supplémentaires de l'auteur (optionnel)
+        document_corpus: Le corpus indexé des documents de référence (optionnel)
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
+    
+    Returns:
+        Un nouveau contenu de chapitre où seule la partie demandée a été remplacée, ou {'error': ...}
+    """
+    if "error" in chapter_content:
+        return {"error": "Le chapitre doit d'abord être généré sans erreur."}
+    if fragment not in CHAPTER_FRAGMENTS or action not in FRAGMENT_ACTIONS:
+        return {"error": f"Partie ou action inconnue: {fragment}, {action}."}
+    sections = chapter_content.get("sections", [])
+    if fragment == "section" and not (isinstance(section_index, int) and 0 <= section_index < len(sections)):
+        return {"error": f"Section inexistante: {section_index}."}
+    
+    # Les embeddings de la recherche dans les documents peuvent venir d'un autre fournisseur
+    credentials = api_key
+    
+    # Utiliser la clé API fournie ou celle de l'environnement
+    api_key = resolve_api_key(api_provider, api_key)
+    
+    if not api_key:
+        return {"error": missing_api_key_message(api_provider)}
+    
+    # Partie actuelle et format de la réponse attendue
+    if fragment == "section":
+        current = json.dumps(sections[section_index], ensure_ascii=False)
+        response_format = '{"section": {"title": "Titre de la section", "content": "Contenu détaillé", "examples": ["Exemple 1", "Exemple 2"]}}'
+    elif fragment == "exercises":
+        current = json.dumps(chapter_content.get("exercises", []), ensure_ascii=False)
+        response_format = '{"exercises": [{"question": "Question 1", "answer": "Réponse ou indice pour la question 1"}, ...]}'
+    else:
+        current = chapter_content.get(fragment, "")
+        response_format = f'{{"{fragment}": "Texte"}}'
+    
+    # Extraits des documents de référence proches de la partie réécrite
+    extracts = ""
+    if document_corpus:
+        query = f"{chapter_title}\n{sections[section_index].get('title', '') if fragment == 'section' else ', '.join(key_points)}"
+        chunks = select_document_chunks(document_corpus, query, FRAGMENT_CONTEXT_CHARS, api_key=credentials)
+        if chunks:
+            extracts = f"Extraits des documents de référence:\n{format_document_chunks(chunks)}"
+    
+    prompt = f"""
+    En tant qu'expert en pédagogie, retravaille une partie d'un chapitre de cours.
+    
+    Titre du cours: {course_title}
+    Titre du module: {module_title}
+    Titre du chapitre: {chapter_title}
+    Points clés du chapitre: {', '.join(key_points)}
+    
+    Reste du chapitre (résumé, à ne pas réécrire):
+    {_chapter_digest(chapter_content, fragment, section_index)}
+    
+    Partie à réécrire: {fragment}
+    Contenu actuel:
+    {current}
+    
+    Consigne: {FRAGMENT_ACTIONS[action]}
+    {f"Consignes de l'auteur: {instructions}" if instructions else ""}
+    
+    La partie doit rester cohérente avec le reste du chapitre, sans le répéter.
+    {extracts}
+    
+    Retourne uniquement la partie réécrite sous forme d'un objet JSON structuré comme suit:
+    {response_format}
+    """
+    
+    max_tokens = _FRAGMENT_MAX_TOKENS[fragment] * (2 if action == "extend" else 1)
+    
+    try:
+        # Appel au modèle en mode JSON
+        completion = _complete(
+            "chapter_fragment",
+            "Tu es un expert en pédagogie et en conception de cours. Tu dois améliorer une partie d'un chapitre existant.",
+            prompt,
+            max_tokens,
+            api_provider,
+            api_key,
+            json_mode=True
+        )
+        result = json.loads(completion.text)
+        
+        # Remplacer uniquement la partie demandée, dans un nouveau contenu de chapitre
+        revised = dict(chapter_content)
+        if fragment == "section":
+            section = result.get("section")
+            if not isinstance(section, dict) or not section.get("content"):
+                raise ValueError("section absente de la réponse")
+            revised["sections"] = list(sections)
+            revised["sections"][section_index] = section
+        elif fragment == "exercises":
+            exercises = result.get("exercises")
+            if not isinstance(exercises, list) or not exercises:
+                raise ValueError("exercices absents de la réponse")
+            revised["exercises"] = exercises
+        else:
+            text = result.get(fragment)
+            if not isinstance(text, str) or not text.strip():
+                raise ValueError(f"{fragment} absent de la réponse")
+            revised[fragment] = text.strip()
+        
+        return revised
+    
+    except Exception as e:
+        return {"error": f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"}
 
 def generate_quiz(
     course_title: str,
@@ -832,10 +1720,12 @@ def generate_quiz(
     num_questions: int = 10,
     difficulty_level: str = "Moyen",
     question_types: List[str] = ["Choix multiple", "Vrai/Faux", "Questions directes"],
-    api_key: Optional[str] = None
+    course_structure: Optional[Dict[str, Any]] = None,
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
 ) -> Dict[str, Any]:
     """
-    Génère un quiz basé sur le contenu d'un module en utilisant l'API OpenAI.
+    Génère un quiz basé sur le contenu d'un module.
     
     Args:
         course_title: Le titre du cours
@@ -843,19 +1733,18 @@ def generate_quiz(
         num_questions: Le nombre de questions à générer
         difficulty_level: Le niveau de difficulté du quiz
         question_types: Les types de questions à inclure
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        course_structure: La structure complète du cours (optionnel), pour situer le module dans le plan
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
     
     Returns:
         Un dictionnaire contenant le quiz généré
     """
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return {"error": "Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."}
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        return {"error": missing_api_key_message(api_provider)}
     
     # Extraire les informations du module
     module_title = module_data["module_title"]
@@ -873,17 +1762,16 @@ def generate_quiz(
             module_content += f"- {point}\n"
         module_content += "\n"
     
-    # Construire le prompt pour l'API
-    prompt = f"""
-    En tant qu'expert en pédagogie, crée un quiz pour évaluer les connaissances sur le module suivant:
+    # Plan du cours, si disponible
+    course_outline = f"Plan du cours:\n{_course_outline(course_structure)}" if course_structure else ""
     
-    Cours: {course_title}
-    {module_content}
+    # Préfixe stable (cours, consignes et format de réponse), identique pour
+    # tous les quiz du cours: il est mis en cache par le fournisseur entre les appels
+    prefix = f"""
+    En tant qu'expert en pédagogie, crée un quiz pour évaluer les connaissances sur un module du cours suivant:
     
-    Génère un quiz avec les caractéristiques suivantes:
-    - Nombre de questions: {num_questions}
-    - Niveau de difficulté: {difficulty_level}
-    - Types de questions à inclure: {', '.join(question_types)}
+    Cours: {course_title}
+    {course_outline}
     
     Pour chaque question, inclus:
     1. L'énoncé de la question
@@ -893,6 +1781,7 @@ def generate_quiz(
     5. Une explication de la réponse
     
     Le quiz doit couvrir équitablement l'ensemble du contenu du module et être adapté au niveau de difficulté demandé.
+    Utilise uniquement les types de questions demandés.
     
     Retourne le quiz sous forme d'un objet JSON structuré comme suit:
     {{
@@ -914,27 +1803,38 @@ def generate_quiz(
     }}
     """
     
+    # Partie variable: le module évalué et les caractéristiques du quiz
+    prompt = f"""
+    Module à évaluer:
+    {module_content}
+    
+    Génère un quiz avec les caractéristiques suivantes:
+    - Nombre de questions: {num_questions}
+    - Niveau de difficulté: {difficulty_level}
+    - Types de questions à inclure: {', '.join(question_types)}
+    """
+    
     try:
-        # Appel à l'API OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": "Tu es un expert en pédagogie et en création de quiz. Tu dois créer un quiz pertinent et adapté au contenu fourni."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000,
-            response_format={"type": "json_object"}
+        # Appel au modèle en mode JSON
+        completion = _complete(
+            "quiz",
+            "Tu es un expert en pédagogie et en création de quiz. Tu dois créer un quiz pertinent et adapté au contenu fourni.",
+            prompt,
+            4000,
+            api_provider,
+            api_key,
+            json_mode=True,
+            prefix=prefix
         )
         
         # Extraire et parser la réponse JSON
-        quiz_text = response.choices[0].message.content
+        quiz_text = completion.text
         quiz = json.loads(quiz_text)
         
         return quiz
     
     except Exception as e:
-        return {"error": f"Erreur lors de l'appel à l'API OpenAI: {str(e)}"}
+        return {"error": f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"}
 
 def generate_podcast_script(
     course_title: str,
@@ -943,10 +1843,11 @@ def generate_podcast_script(
     podcast_format: str = "Interview",
     podcast_duration: str = "15-20 minutes",
     target_audience: str = "Étudiants",
-    api_key: Optional[str] = None
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
 ) -> Dict[str, Any]:
     """
-    Génère un script de podcast basé sur le contenu du cours en utilisant l'API OpenAI.
+    Génère un script de podcast basé sur le contenu du cours.
     
     Args:
         course_title: Le titre du cours
@@ -955,19 +1856,17 @@ def generate_podcast_script(
         podcast_format: Le format du podcast (Interview, Monologue, Discussion, etc.)
         podcast_duration: La durée cible du podcast
         target_audience: Le public cible du podcast
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API à utiliser ('openai', 'anthropic' ou 'mock')
     
     Returns:
         Un dictionnaire contenant le script du podcast
     """
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return {"error": "Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."}
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        return {"error": missing_api_key_message(api_provider)}
     
     # Construire un résumé du contenu du cours
     course_content = f"Titre du cours: {course_title}\n"
@@ -1037,68 +1936,71 @@ def generate_podcast_script(
     """
     
     try:
-        # Appel à l'API OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": "Tu es un expert en création de contenu audio pédagogique. Tu dois créer un script de podcast informatif, engageant et adapté au format audio."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000,
-            response_format={"type": "json_object"}
+        # Appel au modèle en mode JSON
+        completion = _complete(
+            "podcast",
+            "Tu es un expert en création de contenu audio pédagogique. Tu dois créer un script de podcast informatif, engageant et adapté au format audio.",
+            prompt,
+            4000,
+            api_provider,
+            api_key,
+            json_mode=True
         )
         
         # Extraire et parser la réponse JSON
-        podcast_script_text = response.choices[0].message.content
+        podcast_script_text = completion.text
         podcast_script = json.loads(podcast_script_text)
         
         return podcast_script
     
     except Exception as e:
-        return {"error": f"Erreur lors de l'appel à l'API OpenAI: {str(e)}"}
+        return {"error": f"Erreur lors de l'appel à l'API {provider_label(api_provider)}: {str(e)}"}
 
 def generate_podcast_audio(
     script_text: str,
     voice: str = "alloy",
-    api_key: Optional[str] = None
+    api_key: ApiKey = None,
+    api_provider: str = "openai"
 ) -> Dict[str, Any]:
     """
-    Convertit un script de podcast en audio en utilisant l'API OpenAI TTS (Text-to-Speech).
+    Convertit un script de podcast en audio par synthèse vocale (TTS).
     
     Args:
         script_text: Le texte du script à convertir en audio
         voice: La voix à utiliser pour la synthèse vocale (alloy, echo, fable, onyx, nova, shimmer)
-        api_key: Clé API OpenAI (optionnelle, sinon utilise la variable d'environnement)
+        api_key: Clé API ou identifiants de la session (optionnels, sinon utilise la variable d'environnement)
+        api_provider: Le fournisseur d'API choisi (OpenAI est utilisé s'il ne fournit pas de synthèse vocale)
     
     Returns:
         Un dictionnaire contenant l'URL du fichier audio et d'autres métadonnées
     """
+    api_provider = _provider_supporting(api_provider, "supports_speech")
+    
     # Utiliser la clé API fournie ou celle de l'environnement
-    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    api_key = resolve_api_key(api_provider, api_key)
     
     if not api_key:
-        return {"error": "Clé API OpenAI non trouvée. Veuillez configurer la variable d'environnement OPENAI_API_KEY."}
-    
-    # Initialiser le client OpenAI
-    client = openai.OpenAI(api_key=api_key)
+        return {"error": missing_api_key_message(api_provider)}
     
     try:
+        provider = get_provider(api_provider, api_key)
+        model = resolve_model(provider.name, "speech")
+        
         # Limiter la longueur du texte si nécessaire (l'API TTS a des limites)
         max_length = 4096  # Limite approximative pour l'API TTS
         if len(script_text) > max_length:
             script_text = script_text[:max_length]
         
-        # Appel à l'API OpenAI TTS
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=script_text
+        # Appel à l'API de synthèse vocale
+        audio_data = _submit(
+            lambda: provider.speech(script_text, voice, model),
+            provider=provider.name,
+            model=model,
+            estimated_tokens=estimate_tokens(script_text),
+            request_key=(api_key, voice, script_text),
+            task="speech"
         )
         
-        # Obtenir directement les données binaires de la réponse
-        audio_data = response.content
-        
         # Encoder en base64 pour pouvoir l'utiliser dans Streamlit
         audio_base64 = base64.b64encode(audio_data).decode("utf-8")
         
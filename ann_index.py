@@ -0,0 +1,230 @@
+import os
+import json
+from typing import Optional, Tuple
+import numpy as np
+
+from quantization import VectorCodec, Float32Codec, Codes, iter_blocks, save_codes, load_codes
+
+# Nombre de vecteurs à partir duquel le corpus passe de la recherche exacte à l'index approximatif
+ANN_MIN_VECTORS = int(os.environ.get("ANN_MIN_VECTORS", "20000"))
+
+# Fichiers d'un index sauvegardé (en plus des vecteurs encodés)
+_INDEX_FILES = ("centroids", "ids", "offsets")
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 16384) -> np.ndarray:
+    """
+    Retourne, pour chaque vecteur, l'indice du centroïde le plus proche (produit scalaire).
+    """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        block = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _assign_codes(codes: Codes, codec: VectorCodec, centroids: np.ndarray, batch_size: int = 16384) -> np.ndarray:
+    """
+    Comme _assign, pour des vecteurs encodés décodés bloc par bloc.
+    """
+    assignments = np.empty(len(codes[0]), dtype=np.int32)
+    for start, block in iter_blocks(codes, batch_size):
+        assignments[start:start + len(block[0])] = np.argmax(codec.decode(block) @ centroids.T, axis=1)
+    return assignments
+
+
+def _kmeans(sample: np.ndarray, n_lists: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    K-moyennes sphériques: les centroïdes restent normalisés, comme les vecteurs indexés.
+    """
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+
+        # Les listes vides repartent d'un vecteur tiré au hasard
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids[filled] = sums / norms
+    return centroids
+
+
+class IVFIndex:
+    """
+    Index approximatif IVF pour des vecteurs normalisés (similarité cosinus).
+
+    Les vecteurs sont répartis en listes autour de centroïdes appris par
+    k-moyennes, puis rangés liste par liste dans des tableaux contigus, sous
+    la forme encodée de leur format de stockage (voir quantization). Une
+    recherche ne parcourt que les `n_probe` listes dont le centroïde est le
+    plus proche de la requête. Sauvegardé au format .npy, l'index se recharge
+    en mémoire projetée (mmap): seules les listes parcourues sont lues.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codes: Codes,
+        ids: np.ndarray,
+        offsets: np.ndarray,
+        n_probe: int,
+        codec: Optional[VectorCodec] = None
+    ):
+        self.centroids = centroids
+        # Vecteurs encodés rangés par liste; ids donne leur ligne dans la matrice d'origine
+        self.codes = codes
+        self.codec = codec or Float32Codec()
+        self.ids = ids
+        # La liste i occupe les lignes offsets[i]:offsets[i + 1]
+        self.offsets = offsets
+        self.n_probe = n_probe
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: Optional[int] = None,
+        iterations: int = 10,
+        sample_size: int = 256,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """
+        Construit l'index à partir d'une matrice de vecteurs normalisés.
+
+        Args:
+            vectors: La matrice (n, dimension) des vecteurs à indexer, en float32
+            n_lists: Le nombre de listes (par défaut environ la racine carrée de n)
+            n_probe: Le nombre de listes parcourues par recherche
+            iterations: Le nombre d'itérations des k-moyennes
+            sample_size: Le nombre de vecteurs d'apprentissage par liste
+            seed: La graine du tirage de l'échantillon et des centroïdes initiaux
+
+        Returns:
+            L'index construit
+        """
+        codec = Float32Codec()
+        return cls.build_from_codes(codec.encode(vectors), codec, n_lists, n_probe, iterations, sample_size, seed)
+
+    @classmethod
+    def build_from_codes(
+        cls,
+        codes: Codes,
+        codec: VectorCodec,
+        n_lists: Optional[int] = None,
+        n_probe: Optional[int] = None,
+        iterations: int = 10,
+        sample_size: int = 256,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """
+        Construit l'index à partir de vecteurs déjà encodés: les centroïdes
+        sont appris sur un échantillon décodé et les codes sont rangés tels quels.
+        Mêmes paramètres que build.
+        """
+        count = len(codes[0])
+        if n_lists is None:
+            n_lists = max(1, int(round(np.sqrt(count))))
+        n_lists = min(n_lists, count)
+        if n_probe is None:
+            n_probe = max(8, n_lists // 8)
+
+        rng = np.random.default_rng(seed)
+        sample_count = min(count, n_lists * sample_size)
+        rows = np.sort(rng.choice(count, sample_count, replace=False))
+        sample = np.ascontiguousarray(codec.decode(tuple(array[rows] for array in codes)), dtype=np.float32)
+        centroids = _kmeans(sample, n_lists, iterations, rng)
+
+        assignments = _assign_codes(codes, codec, centroids)
+        ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=n_lists)))).astype(np.int64)
+        ordered = tuple(np.ascontiguousarray(array[ids]) for array in codes)
+        return cls(centroids, ordered, ids, offsets, min(n_probe, n_lists), codec)
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        n_probe: Optional[int] = None,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Recherche approximative des vecteurs les plus proches d'une requête normalisée.
+
+        Args:
+            query: Le vecteur de requête, normalisé
+            top_k: Le nombre maximum de résultats
+            n_probe: Le nombre de listes parcourues (par défaut celui de l'index)
+            mask: Masque booléen sur les lignes d'origine autorisées (toutes par défaut)
+
+        Returns:
+            Les scores et les lignes d'origine des résultats, du plus au moins proche
+        """
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        probed = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in probed])
+        ids = self.ids[rows]
+        if mask is not None:
+            keep = mask[ids]
+            rows, ids = rows[keep], ids[keep]
+        if not len(rows):
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        # Les listes sondées ne sont pas contiguës entre elles: on lit chaque bloc
+        scores = np.concatenate([
+            self.codec.scores(tuple(array[self.offsets[i]:self.offsets[i + 1]] for array in self.codes), query)
+            for i in probed
+        ])
+        if mask is not None:
+            scores = scores[keep]
+
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return scores[best], ids[best]
+
+    def save(self, directory: str) -> None:
+        """
+        Sauvegarde l'index dans un dossier (un fichier .npy par tableau).
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in _INDEX_FILES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        save_codes(directory, "codes", self.codec, self.codes)
+        with open(os.path.join(directory, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "type": f"ivf-{self.codec.name}",
+                "codec": self.codec.name,
+                "code_arrays": len(self.codes),
+                "n_probe": self.n_probe,
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "IVFIndex":
+        """
+        Recharge un index sauvegardé, en mémoire projetée par défaut.
+        """
+        with open(os.path.join(directory, "index.json"), encoding="utf-8") as f:
+            settings = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in _INDEX_FILES}
+        # Les petits tableaux consultés à chaque recherche sont chargés en mémoire
+        arrays["centroids"] = np.asarray(arrays["centroids"])
+        arrays["offsets"] = np.asarray(arrays["offsets"])
+        codec, codes = load_codes(directory, "codes", settings["codec"], settings["code_arrays"], mmap=mmap)
+        return cls(codes=codes, n_probe=settings["n_probe"], codec=codec, **arrays)
@@ -0,0 +1,108 @@
+from typing import List, Dict, Any, Tuple, Optional
+
+from llm_coalescing import make_request_key
+
+# Graphe de dépendances des artefacts dérivés de la structure du cours:
+#   chapitre   <- module (titre) et chapitre (titre, description, points clés)
+#   quiz       <- module (titre, description, chapitres)
+#   podcast    <- structure complète <- audio du podcast
+# Chaque artefact généré garde l'empreinte des entrées qui l'ont produit. Les
+# numéros ne font pas partie des empreintes: un chapitre ou un module qui
+# change seulement de place est déplacé, pas régénéré. Le titre, la
+# description et le plan du cours ne sont qu'un contexte des prompts: les
+# modifier ne rend aucun artefact obsolète.
+
+PODCAST = "podcast"
+
+
+def chapter_artifact_id(module_number: Any, chapter_number: Any) -> str:
+    return f"chapter:{module_number}_{chapter_number}"
+
+
+def quiz_artifact_id(module_number: Any) -> str:
+    return f"quiz:module_{module_number}_quiz"
+
+
+def _chapter_inputs(chapter: Dict[str, Any]) -> Tuple[Any, ...]:
+    return chapter.get("chapter_title"), chapter.get("description"), chapter.get("key_points")
+
+
+def artifact_fingerprints(course_structure: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Calcule l'empreinte des entrées de chaque artefact dérivé d'une structure de cours.
+
+    Args:
+        course_structure: La structure du cours (modules et chapitres)
+
+    Returns:
+        L'empreinte de chaque artefact, par identifiant ('chapter:1_1.1', 'quiz:module_1_quiz', 'podcast')
+    """
+    fingerprints = {}
+    modules = course_structure.get("modules") or []
+    for module in modules:
+        chapters = [_chapter_inputs(chapter) for chapter in module.get("chapters", [])]
+        for chapter, inputs in zip(module.get("chapters", []), chapters):
+            fingerprints[chapter_artifact_id(module["module_number"], chapter["chapter_number"])] = make_request_key(
+                "chapter", module.get("module_title"), *inputs
+            )
+        fingerprints[quiz_artifact_id(module["module_number"])] = make_request_key(
+            "quiz", module.get("module_title"), module.get("module_description"), chapters
+        )
+    if modules:
+        outline = [
+            (module.get("module_title"), module.get("module_description"), [_chapter_inputs(chapter) for chapter in module.get("chapters", [])])
+            for module in modules
+        ]
+        fingerprints[PODCAST] = make_request_key("podcast", outline)
+    return fingerprints
+
+
+def reconcile_artifacts(
+    artifacts: Dict[str, Any],
+    inputs: Dict[str, Dict[str, Any]],
+    fingerprints: Dict[str, str]
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]], Dict[str, Optional[Any]]]:
+    """
+    Met les artefacts générés en accord avec une nouvelle structure: ceux dont
+    les entrées n'ont pas changé sont gardés (et déplacés si leur chapitre ou
+    module a changé de numéro), les autres sont retirés.
+
+    Args:
+        artifacts: Les artefacts générés, par identifiant
+        inputs: Pour chaque artefact, l'empreinte de ses entrées à la génération
+            ('fingerprint') et ses paramètres ('settings': nombre de questions, format...)
+        fingerprints: Les empreintes attendues pour la nouvelle structure (artifact_fingerprints)
+
+    Returns:
+        Les artefacts gardés, leurs entrées, et les artefacts obsolètes à
+        régénérer (identifiant de la nouvelle structure -> paramètres utilisés)
+    """
+    # Artefacts générés avant le suivi des entrées: adoptés tels quels
+    recorded = {
+        artifact_id: inputs[artifact_id]["fingerprint"] if artifact_id in inputs else fingerprints.get(artifact_id)
+        for artifact_id in artifacts
+    }
+    by_fingerprint: Dict[Tuple[str, str], List[str]] = {}
+    for artifact_id, fingerprint in recorded.items():
+        by_fingerprint.setdefault((artifact_id.split(":", 1)[0], fingerprint), []).append(artifact_id)
+
+    kept: Dict[str, Any] = {}
+    kept_inputs: Dict[str, Dict[str, Any]] = {}
+    used = set()
+    for artifact_id, fingerprint in fingerprints.items():
+        candidates = by_fingerprint.get((artifact_id.split(":", 1)[0], fingerprint), [])
+        if candidates:
+            # Même identifiant de préférence, sinon l'artefact d'un chapitre ou module déplacé
+            source = artifact_id if artifact_id in candidates else candidates[0]
+            candidates.remove(source)
+            used.add(source)
+            kept[artifact_id] = artifacts[source]
+            kept_inputs[artifact_id] = dict(inputs.get(source, {}), fingerprint=fingerprint)
+
+    # Obsolètes: les artefacts dont l'emplacement existe encore mais dont les entrées ont changé
+    stale = {
+        artifact_id: inputs.get(artifact_id, {}).get("settings")
+        for artifact_id in fingerprints
+        if artifact_id in artifacts and artifact_id not in kept and artifact_id not in used
+    }
+    return kept, kept_inputs, stale
@@ -0,0 +1,312 @@
+"""
+Génération de cours en masse, sans interface Streamlit.
+
+Lit un catalogue de cours (CSV ou JSONL), génère pour chaque cours la
+structure, le contenu de chaque chapitre, un quiz par module et le script
+du podcast, et écrit les résultats sur disque. Chaque artefact est un
+point de reprise: relancer la commande ne régénère que ce qui manque.
+
+Usage:
+    python batch_cli.py catalogue.csv --output courses/ --workers 32 --provider openai
+
+Colonnes reconnues (seule `title` est obligatoire): id, title, description,
+duration, difficulty, modules, quiz_questions, quiz_difficulty,
+question_types (séparées par '|'), podcast_format, podcast_duration,
+target_audience.
+"""
+import os
+import re
+import csv
+import sys
+import json
+import base64
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+from llm_scheduler import use_priority, PRIORITY_BATCH
+from ai_helpers import (
+    generate_course_structure,
+    generate_chapter_content,
+    generate_quiz,
+    generate_podcast_script,
+    generate_podcast_audio
+)
+
+DEFAULT_QUESTION_TYPES = ["Choix multiple", "Vrai/Faux", "Questions directes"]
+
+# Une tâche du pipeline: (description, fonction sans argument qui retourne les tâches suivantes)
+Task = Tuple[str, Callable[[], List["Task"]]]
+
+
+def load_specs(path: str) -> List[Dict[str, Any]]:
+    """
+    Charge un catalogue de cours au format CSV ou JSONL.
+
+    Args:
+        path: Le chemin du catalogue (.csv, .jsonl ou .json avec une liste)
+
+    Returns:
+        La liste des spécifications de cours
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8") as f:
+        if extension == ".csv":
+            specs = [dict(row) for row in csv.DictReader(f)]
+        elif extension == ".json":
+            specs = json.load(f)
+        else:
+            specs = [json.loads(line) for line in f if line.strip()]
+
+    for spec in specs:
+        if not spec.get("title"):
+            raise ValueError(f"Spécification de cours sans titre: {spec}")
+        if isinstance(spec.get("question_types"), str):
+            spec["question_types"] = [t.strip() for t in spec["question_types"].split("|") if t.strip()]
+    return specs
+
+
+def course_id(spec: Dict[str, Any]) -> str:
+    """
+    Identifiant stable d'un cours, utilisé comme nom de dossier.
+    """
+    if spec.get("id"):
+        return str(spec["id"])
+    slug = re.sub(r"[^a-z0-9]+", "-", spec["title"].lower()).strip("-")[:60]
+    digest = hashlib.sha1(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}"
+
+
+def _read_artifact(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Retourne un artefact déjà généré, ou None s'il est absent ou en erreur.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return None if "error" in artifact else artifact
+
+
+def _write_artifact(path: str, artifact: Dict[str, Any]) -> None:
+    # Écriture atomique: un artefact à moitié écrit ne doit jamais servir de point de reprise
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+class BatchRunner:
+    """
+    Pipeline concurrent de génération: dès que la structure d'un cours est
+    prête, ses chapitres, quiz et podcast sont mis en file. Toutes les tâches
+    partagent le même pool; le débit est régulé par l'ordonnanceur LLM.
+    """
+
+    def __init__(self, output_dir: str, api_provider: str = "openai", audio: bool = False, voice: str = "alloy"):
+        self.output_dir = output_dir
+        self.api_provider = api_provider
+        self.audio = audio
+        self.voice = voice
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.skipped = 0
+        self.failures: List[Dict[str, str]] = []
+
+    def _produce(self, path: str, label: str, generate: Callable[[], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Retourne l'artefact existant ou le génère, l'écrit et le retourne (None en cas d'erreur).
+        """
+        artifact = _read_artifact(path)
+        if artifact is not None:
+            with self._lock:
+                self.skipped += 1
+            return artifact
+
+        with use_priority(PRIORITY_BATCH):
+            artifact = generate()
+
+        if "error" in artifact:
+            with self._lock:
+                self.failures.append({"artifact": label, "error": artifact["error"]})
+            print(f"[erreur] {label}: {artifact['error']}", file=sys.stderr)
+            return None
+
+        _write_artifact(path, artifact)
+        with self._lock:
+            self.generated += 1
+        print(f"[ok] {label}")
+        return artifact
+
+    def course_tasks(self, spec: Dict[str, Any]) -> List[Task]:
+        cid = course_id(spec)
+        course_dir = os.path.join(self.output_dir, cid)
+        return [(f"{cid}/structure", lambda: self._structure(spec, course_dir, cid))]
+
+    def _structure(self, spec: Dict[str, Any], course_dir: str, cid: str) -> List[Task]:
+        _write_artifact(os.path.join(course_dir, "spec.json"), spec)
+        structure = self._produce(
+            os.path.join(course_dir, "structure.json"),
+            f"{cid}/structure",
+            lambda: generate_course_structure(
+                course_title=spec["title"],
+                course_description=spec.get("description", ""),
+                duration=spec.get("duration", ""),
+                difficulty=spec.get("difficulty", "Beginner"),
+                num_modules=int(spec.get("modules") or 3),
+                api_provider=self.api_provider
+            )
+        )
+        if structure is None:
+            return []
+
+        tasks: List[Task] = []
+        for module in structure.get("modules", []):
+            for chapter in module["chapters"]:
+                tasks.append((
+                    f"{cid}/chapitre {chapter['chapter_number']}",
+                    lambda m=module, c=chapter: self._chapter(spec, course_dir, cid, structure, m, c)
+                ))
+            tasks.append((
+                f"{cid}/quiz module {module['module_number']}",
+                lambda m=module: self._quiz(spec, course_dir, cid, structure, m)
+            ))
+        tasks.append((f"{cid}/podcast", lambda: self._podcast(spec, course_dir, cid, structure)))
+        return tasks
+
+    def _chapter(self, spec, course_dir, cid, structure, module, chapter) -> List[Task]:
+        key = f"{module['module_number']}_{chapter['chapter_number']}"
+        self._produce(
+            os.path.join(course_dir, "chapters", f"{key}.json"),
+            f"{cid}/chapitre {chapter['chapter_number']}",
+            lambda: generate_chapter_content(
+                course_title=spec["title"],
+                course_description=spec.get("description", ""),
+                module_title=module["module_title"],
+                chapter_title=chapter["chapter_title"],
+                chapter_description=chapter["description"],
+                key_points=chapter["key_points"],
+                course_structure=structure,
+                api_provider=self.api_provider
+            )
+        )
+        return []
+
+    def _quiz(self, spec, course_dir, cid, structure, module) -> List[Task]:
+        self._produce(
+            os.path.join(course_dir, "quizzes", f"module_{module['module_number']}_quiz.json"),
+            f"{cid}/quiz module {module['module_number']}",
+            lambda: generate_quiz(
+                course_title=spec["title"],
+                module_data=module,
+                num_questions=int(spec.get("quiz_questions") or 10),
+                difficulty_level=spec.get("quiz_difficulty", "Moyen"),
+                question_types=spec.get("question_types") or DEFAULT_QUESTION_TYPES,
+                course_structure=structure,
+                api_provider=self.api_provider
+            )
+        )
+        return []
+
+    def _podcast(self, spec, course_dir, cid, structure) -> List[Task]:
+        script = self._produce(
+            os.path.join(course_dir, "podcast.json"),
+            f"{cid}/podcast",
+            lambda: generate_podcast_script(
+                course_title=spec["title"],
+                course_description=spec.get("description", ""),
+                course_structure=structure,
+                podcast_format=spec.get("podcast_format", "Interview"),
+                podcast_duration=spec.get("podcast_duration", "15-20 minutes"),
+                target_audience=spec.get("target_audience", "Étudiants"),
+                api_provider=self.api_provider
+            )
+        )
+        if script is None or not self.audio:
+            return []
+        return [(f"{cid}/audio", lambda: self._audio(course_dir, cid, script))]
+
+    def _audio(self, course_dir, cid, script) -> List[Task]:
+        audio_path = os.path.join(course_dir, "podcast.mp3")
+        if os.path.exists(audio_path):
+            with self._lock:
+                self.skipped += 1
+            return []
+
+        script_text = "\n\n".join(section["content"] for section in script.get("script_sections", []))
+        with use_priority(PRIORITY_BATCH):
+            audio = generate_podcast_audio(script_text, voice=self.voice, api_provider=self.api_provider)
+
+        if "error" in audio:
+            with self._lock:
+                self.failures.append({"artifact": f"{cid}/audio", "error": audio["error"]})
+            print(f"[erreur] {cid}/audio: {audio['error']}", file=sys.stderr)
+            return []
+
+        temp_path = f"{audio_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(base64.b64decode(audio["audio_base64"]))
+        os.replace(temp_path, audio_path)
+        with self._lock:
+            self.generated += 1
+        print(f"[ok] {cid}/audio")
+        return []
+
+    def run(self, specs: List[Dict[str, Any]], workers: int = 16) -> None:
+        """
+        Exécute le pipeline complet pour tous les cours du catalogue.
+
+        Args:
+            specs: Les spécifications de cours
+            workers: Le nombre de tâches exécutées simultanément
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            for spec in specs:
+                for label, task in self.course_tasks(spec):
+                    pending[executor.submit(task)] = label
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    label = pending.pop(future)
+                    try:
+                        follow_ups = future.result()
+                    except Exception as e:
+                        with self._lock:
+                            self.failures.append({"artifact": label, "error": str(e)})
+                        print(f"[erreur] {label}: {e}", file=sys.stderr)
+                        continue
+                    for next_label, task in follow_ups:
+                        pending[executor.submit(task)] = next_label
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Génération de cours en masse à partir d'un catalogue CSV/JSONL.")
+    parser.add_argument("catalog", help="Catalogue des cours (.csv, .jsonl ou .json)")
+    parser.add_argument("--output", default="courses", help="Dossier de sortie (sert aussi de point de reprise)")
+    parser.add_argument("--provider", default="openai", choices=["openai", "anthropic", "mock"], help="Fournisseur d'API")
+    parser.add_argument("--workers", type=int, default=16, help="Nombre de tâches simultanées")
+    parser.add_argument("--audio", action="store_true", help="Générer aussi l'audio des podcasts")
+    parser.add_argument("--voice", default="alloy", help="Voix de synthèse vocale")
+    args = parser.parse_args(argv)
+
+    specs = load_specs(args.catalog)
+    runner = BatchRunner(args.output, api_provider=args.provider, audio=args.audio, voice=args.voice)
+    runner.run(specs, workers=args.workers)
+
+    print(f"{len(specs)} cours: {runner.generated} artefacts générés, {runner.skipped} repris, {len(runner.failures)} en erreur.")
+    failures_path = os.path.join(args.output, "failures.json")
+    if runner.failures:
+        _write_artifact(failures_path, {"failures": runner.failures})
+    elif os.path.exists(failures_path):
+        os.remove(failures_path)
+    return 1 if runner.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
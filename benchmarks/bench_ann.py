@@ -0,0 +1,140 @@
+"""
+Benchmark de l'index approximatif IVF (ann_index) face à la recherche exacte:
+rappel@k, latence par requête, temps de construction et de rechargement
+en mémoire projetée, sur des vecteurs synthétiques regroupés en thèmes.
+
+Usage:
+    python -m benchmarks.bench_ann --sizes 10000 100000 1000000 --dimension 256
+
+La dimension par défaut (256) garde le cas à un million de morceaux sous
+1 Go; --dimension 1536 reproduit text-embedding-3-small (6 Go à 1M).
+"""
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+from ann_index import IVFIndex
+from benchmarks.common import percentile, print_table, write_json
+
+
+def make_vectors(count: int, dimension: int, noise: float = 1.2, seed: int = 0, block_size: int = 100000) -> np.ndarray:
+    """
+    Génère des vecteurs normalisés regroupés autour de thèmes, comme des
+    morceaux de manuels: environ 100 morceaux par thème. Avec `noise` = 1.2,
+    deux morceaux d'un même thème ont une similarité cosinus d'environ 0.4.
+    """
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(1, count // 100), dimension)).astype(np.float32)
+    vectors = np.empty((count, dimension), dtype=np.float32)
+    for start in range(0, count, block_size):
+        end = min(count, start + block_size)
+        block = topics[rng.integers(0, len(topics), end - start)]
+        block += noise * rng.standard_normal(block.shape).astype(np.float32)
+        vectors[start:end] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """
+    Requêtes proches de morceaux existants (un titre de chapitre proche d'un passage du manuel).
+    """
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)] + 0.05 * rng.standard_normal((count, vectors.shape[1])).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_search(vectors: np.ndarray, query: np.ndarray, top_k: int) -> np.ndarray:
+    scores = vectors @ query
+    best = np.argpartition(-scores, top_k - 1)[:top_k]
+    return best[np.argsort(-scores[best])]
+
+
+def run_size(
+    count: int,
+    dimension: int,
+    queries: int,
+    top_k: int,
+    n_probes: List[Optional[int]],
+    noise: float = 1.2
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Mesure recherche exacte et index IVF (pour chaque n_probe) sur `count` vecteurs.
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    label = f"{count // 1000}k" if count < 1000000 else f"{count // 1000000}M"
+
+    vectors = make_vectors(count, dimension, noise)
+    query_vectors = make_queries(vectors, queries)
+
+    exact_latencies = []
+    truth = []
+    for query in query_vectors:
+        start = time.perf_counter()
+        truth.append(exact_search(vectors, query, top_k))
+        exact_latencies.append(time.perf_counter() - start)
+    rows[f"{label} exact"] = {
+        "p50_ms": percentile(exact_latencies, 50) * 1000,
+        "p95_ms": percentile(exact_latencies, 95) * 1000,
+        f"recall@{top_k}": 1.0,
+    }
+
+    start = time.perf_counter()
+    index = IVFIndex.build(vectors)
+    build_seconds = time.perf_counter() - start
+
+    # Sauvegarde puis rechargement en mémoire projetée, comme au démarrage de l'application
+    directory = tempfile.mkdtemp(prefix="bench_ann_")
+    try:
+        index.save(directory)
+        del index
+        start = time.perf_counter()
+        index = IVFIndex.load(directory, mmap=True)
+        load_seconds = time.perf_counter() - start
+
+        for n_probe in n_probes:
+            latencies = []
+            hits = 0
+            for query, expected in zip(query_vectors, truth):
+                start = time.perf_counter()
+                _, found = index.search(query, top_k, n_probe=n_probe)
+                latencies.append(time.perf_counter() - start)
+                hits += len(np.intersect1d(found, expected))
+            rows[f"{label} ivf n_probe={n_probe or index.n_probe}/{index.n_lists}"] = {
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                f"recall@{top_k}": hits / (len(truth) * top_k),
+                "build_s": build_seconds,
+                "load_ms": load_seconds * 1000,
+            }
+    finally:
+        del index
+        shutil.rmtree(directory, ignore_errors=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rappel et latence de l'index IVF face à la recherche exacte.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="Nombres de morceaux indexés")
+    parser.add_argument("--dimension", type=int, default=256, help="Dimension des vecteurs")
+    parser.add_argument("--queries", type=int, default=100, help="Nombre de requêtes par taille")
+    parser.add_argument("--top-k", type=int, default=10, help="Nombre de résultats par requête")
+    parser.add_argument("--n-probe", type=int, nargs="*", default=[], help="Listes parcourues (défaut de l'index si absent)")
+    parser.add_argument("--noise", type=float, default=1.2, help="Dispersion des morceaux autour de leur thème")
+    parser.add_argument("--json", help="Chemin d'un fichier où écrire les résultats")
+    args = parser.parse_args()
+
+    n_probes: List[Optional[int]] = args.n_probe or [None]
+    report: Dict[str, Dict[str, Any]] = {}
+    for count in args.sizes:
+        report.update(run_size(count, args.dimension, args.queries, args.top_k, n_probes, args.noise))
+    print_table(report, ["p50_ms", "p95_ms", f"recall@{args.top_k}", "build_s", "load_ms"])
+
+    if args.json:
+        write_json(args.json, {"settings": vars(args), "results": report})
+
+
+if __name__ == "__main__":
+    main()
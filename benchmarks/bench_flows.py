@@ -0,0 +1,175 @@
+"""
+Benchmark de bout en bout des parcours cours, quiz et podcast sur le
+fournisseur local simulé (aucun appel réseau, aucun coût).
+
+Usage:
+    python -m benchmarks.bench_flows --courses 20 --concurrency 8 --latency 0.5 --tokens-per-second 80
+"""
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Any
+
+from llm_providers import configure_mock
+from llm_metrics import get_metrics
+from benchmarks.common import measure, summarize, print_table, write_json
+from ai_helpers import (
+    enhance_course_description,
+    generate_learning_objectives,
+    generate_prerequisites,
+    generate_learning_methods,
+    generate_course_setup,
+    generate_course_structure,
+    generate_chapter_content,
+    generate_quiz,
+    generate_podcast_script,
+    generate_podcast_audio
+)
+
+PROVIDER = "mock"
+
+
+def _is_error(result: Any) -> bool:
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, list):
+        return bool(result) and str(result[0]).startswith("Erreur")
+    return isinstance(result, str) and result.startswith("Erreur")
+
+
+def run_stage(name: str, calls: List[Callable[[], Any]], concurrency: int, report: Dict[str, Dict[str, Any]]) -> List[Any]:
+    """
+    Exécute les appels d'une étape en parallèle et enregistre ses métriques.
+
+    Args:
+        name: Le nom de l'étape
+        calls: Les appels à effectuer
+        concurrency: Le nombre d'appels simultanés
+        report: Le rapport à compléter
+
+    Returns:
+        Les résultats des appels, dans l'ordre
+    """
+    latencies: List[float] = []
+    metrics = get_metrics()
+    prompt_before = metrics.counter_value("llm_tokens_total", kind="prompt")
+    cached_before = metrics.counter_value("llm_tokens_total", kind="cached")
+
+    def timed(call):
+        start = time.perf_counter()
+        result = call()
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    with measure() as stage:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, calls))
+
+    errors = sum(1 for result in results if _is_error(result))
+    report[name] = summarize(latencies, stage["seconds"], stage["peak_bytes"], errors)
+
+    # Part des tokens de prompt relus depuis le cache de préfixe du fournisseur
+    prompt_tokens = metrics.counter_value("llm_tokens_total", kind="prompt") - prompt_before
+    cached_tokens = metrics.counter_value("llm_tokens_total", kind="cached") - cached_before
+    report[name]["prompt_cached_pct"] = 100.0 * cached_tokens / prompt_tokens if prompt_tokens else 0.0
+    return results
+
+
+def run_flows(courses: int, concurrency: int, num_modules: int, document_chars: int = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    Exécute les parcours complets pour `courses` cours distincts.
+
+    Args:
+        courses: Le nombre de cours générés
+        concurrency: Le nombre d'appels simultanés
+        num_modules: Le nombre de modules par cours
+        document_chars: La taille du document de référence simulé fourni aux chapitres (0 pour aucun)
+    """
+    report: Dict[str, Dict[str, Any]] = {}
+    # Des titres distincts évitent que des requêtes identiques soient fusionnées
+    titles = [f"Cours de benchmark {i}" for i in range(courses)]
+    description = "Un cours d'introduction aux bases de données relationnelles et au langage SQL."
+    sentence = "Une table relationnelle regroupe des lignes partageant les mêmes colonnes. "
+    document_text = (sentence * (document_chars // len(sentence) + 1))[:document_chars]
+
+    descriptions = run_stage("description", [
+        lambda t=t: enhance_course_description(t, description, PROVIDER) for t in titles
+    ], concurrency, report)
+
+    run_stage("objectifs/prérequis/méthodes", [
+        lambda t=t, d=d, f=f: f(t, d, api_provider=PROVIDER)
+        for t, d in zip(titles, descriptions)
+        for f in (generate_learning_objectives, generate_prerequisites, generate_learning_methods)
+    ], concurrency, report)
+
+    run_stage("setup (1 appel)", [
+        lambda t=t, d=d: generate_course_setup(t, d, api_provider=PROVIDER)
+        for t, d in zip(titles, descriptions)
+    ], concurrency, report)
+
+    structures = run_stage("structure", [
+        lambda t=t, d=d: generate_course_structure(t, d, "8 semaines", "Beginner", num_modules, api_provider=PROVIDER)
+        for t, d in zip(titles, descriptions)
+    ], concurrency, report)
+
+    run_stage("chapitres", [
+        lambda t=t, d=d, m=m, c=c: generate_chapter_content(
+            t, d, m["module_title"], c["chapter_title"], c["description"], c["key_points"],
+            document_text=document_text, course_structure=s, api_provider=PROVIDER
+        )
+        for t, d, s in zip(titles, descriptions, structures)
+        for m in s.get("modules", [])
+        for c in m["chapters"]
+    ], concurrency, report)
+
+    run_stage("quiz", [
+        lambda t=t, m=m: generate_quiz(t, m, 10, course_structure=s, api_provider=PROVIDER)
+        for t, s in zip(titles, structures)
+        for m in s.get("modules", [])
+    ], concurrency, report)
+
+    scripts = run_stage("script podcast", [
+        lambda t=t, d=d, s=s: generate_podcast_script(t, d, s, api_provider=PROVIDER)
+        for t, d, s in zip(titles, descriptions, structures)
+    ], concurrency, report)
+
+    run_stage("audio podcast", [
+        lambda s=s: generate_podcast_audio(
+            "\n\n".join(section["content"] for section in s.get("script_sections", [])),
+            api_provider=PROVIDER
+        )
+        for s in scripts
+    ], concurrency, report)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout sur le fournisseur local simulé.")
+    parser.add_argument("--courses", type=int, default=20, help="Nombre de cours générés")
+    parser.add_argument("--concurrency", type=int, default=8, help="Nombre d'appels simultanés")
+    parser.add_argument("--modules", type=int, default=3, help="Nombre de modules par cours")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latence simulée avant le premier token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Débit simulé (0 = instantané)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Taux d'erreurs simulées (429/500)")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du tirage des erreurs")
+    parser.add_argument("--document-chars", type=int, default=0, help="Taille du document de référence simulé pour les chapitres")
+    parser.add_argument("--json", help="Chemin d'un fichier où écrire les résultats")
+    args = parser.parse_args()
+
+    configure_mock(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+
+    report = run_flows(args.courses, args.concurrency, args.modules, args.document_chars)
+    print_table(report)
+
+    if args.json:
+        write_json(args.json, {"settings": vars(args), "stages": report})
+
+
+if __name__ == "__main__":
+    main()
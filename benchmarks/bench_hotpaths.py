@@ -0,0 +1,395 @@
+"""
+Micro-benchmarks des traitements locaux (hors appels réseau): extraction du
+texte des PDF, DOCX, PPTX et TXT, découpage en extraits, lecture des listes
+renvoyées par le modèle, décodage JSON des grosses réponses et boucles
+d'affichage des onglets cours, quiz et podcast.
+
+Les fichiers de test sont construits à chaque exécution, toujours identiques
+(mêmes tailles, même contenu): gros PDF, DOCX et PPTX, cours de 100 chapitres,
+quiz de 50 questions. Pour chaque fonction: durée médiane et minimale sur
+plusieurs répétitions, et pic d'allocation mémoire Python (tracemalloc, sur
+une exécution séparée pour ne pas fausser les durées).
+
+Une référence enregistrée avec --save-baseline sert ensuite à repérer les
+régressions avec --baseline (code de sortie 1 au-delà de la tolérance).
+La référence livrée (benchmarks/baselines/bench_hotpaths.json) décrit la
+machine sur laquelle elle a été mesurée; les durées dépendent de la
+machine: sur une autre, enregistrer d'abord sa propre référence.
+
+Usage:
+    python -m benchmarks.bench_hotpaths --save-baseline
+    python -m benchmarks.bench_hotpaths --baseline --tolerance 0.25
+"""
+import io
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import platform
+import statistics
+from typing import List, Dict, Any, Callable, Tuple
+from xml.sax.saxutils import escape
+
+from ai_helpers import (
+    extract_text_from_pdf,
+    extract_text_from_docx,
+    extract_text_from_pptx,
+    extract_text_from_txt,
+    split_text_into_chunks,
+    _parse_list
+)
+from course_views import render_chapter_outline, render_chapter_content, render_quiz_questions, render_podcast_sections
+from benchmarks.common import measure, print_table, write_json
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "bench_hotpaths.json")
+
+SENTENCE = "Les bases de données relationnelles organisent les informations en tables reliées par des clés"
+
+
+def _paragraph(i: int) -> str:
+    return f"{i}. {SENTENCE}, avec des exemples, des exercices corrigés et des remarques ({i % 97})."
+
+
+def make_pdf(pages: int, lines_per_page: int) -> bytes:
+    """
+    PDF texte de `pages` pages (police standard, un flux de contenu par page).
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        lines = "".join(
+            f"({_paragraph(page * lines_per_page + line)}) Tj 0 -14 Td\n" for line in range(lines_per_page)
+        ).encode("latin-1", "replace")
+        stream = b"BT /F1 9 Tf 40 800 Td\n" + lines + b"ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % i for i in page_ids), pages)
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    output.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return output.getvalue()
+
+
+def make_docx(paragraphs: int) -> bytes:
+    """
+    Document Word de `paragraphs` paragraphes (seules les parties lues par l'extraction).
+    """
+    body = "".join(f"<w:p><w:r><w:t>{escape(_paragraph(i))}</w:t></w:r></w:p>" for i in range(paragraphs))
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f"<w:body>{body}</w:body></w:document>"
+        ))
+    return output.getvalue()
+
+
+def make_pptx(slides: int, paragraphs_per_slide: int) -> bytes:
+    """
+    Présentation de `slides` diapositives (ordre donné par presentation.xml).
+    """
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("ppt/presentation.xml", (
+            '<p:presentation xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><p:sldIdLst>'
+            + "".join(f'<p:sldId id="{256 + i}" r:id="rId{i + 1}"/>' for i in range(slides))
+            + "</p:sldIdLst></p:presentation>"
+        ))
+        archive.writestr("ppt/_rels/presentation.xml.rels", (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(f'<Relationship Id="rId{i + 1}" Target="slides/slide{i + 1}.xml"/>' for i in range(slides))
+            + "</Relationships>"
+        ))
+        for i in range(slides):
+            paragraphs = "".join(
+                f"<a:p><a:r><a:t>{escape(_paragraph(i * paragraphs_per_slide + j))}</a:t></a:r></a:p>"
+                for j in range(paragraphs_per_slide)
+            )
+            archive.writestr(f"ppt/slides/slide{i + 1}.xml", (
+                '<p:sld xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+                'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+                f"<p:cSld><p:spTree><p:sp><p:txBody>{paragraphs}</p:txBody></p:sp></p:spTree></p:cSld></p:sld>"
+            ))
+    return output.getvalue()
+
+
+def make_txt(kilobytes: int) -> bytes:
+    lines, size, i = [], 0, 0
+    while size < kilobytes * 1024:
+        lines.append(_paragraph(i))
+        size += len(lines[-1]) + 1
+        i += 1
+    return "\n".join(lines).encode("utf-8")
+
+
+def make_course_structure(modules: int, chapters_per_module: int) -> Dict[str, Any]:
+    return {
+        "course_title": "Bases de données relationnelles",
+        "modules": [
+            {
+                "module_number": m + 1,
+                "module_title": f"Module {m + 1}: tables, requêtes et modélisation",
+                "module_description": SENTENCE + ".",
+                "chapters": [
+                    {
+                        "chapter_number": float(f"{m + 1}.{c + 1}"),
+                        "chapter_title": f"Chapitre {m + 1}.{c + 1}: jointures et index",
+                        "description": _paragraph(c),
+                        "key_points": [_paragraph(c * 5 + k) for k in range(5)]
+                    }
+                    for c in range(chapters_per_module)
+                ]
+            }
+            for m in range(modules)
+        ]
+    }
+
+
+def make_chapter_content(sections: int, exercises: int) -> Dict[str, Any]:
+    return {
+        "chapter_title": "Jointures et index",
+        "introduction": " ".join(_paragraph(i) for i in range(8)),
+        "sections": [
+            {
+                "title": f"Section {s + 1}",
+                "content": " ".join(_paragraph(s * 20 + i) for i in range(20)),
+                "examples": [_paragraph(s * 3 + e) for e in range(3)]
+            }
+            for s in range(sections)
+        ],
+        "conclusion": " ".join(_paragraph(i) for i in range(5)),
+        "exercises": [{"question": _paragraph(e), "answer": _paragraph(e + 1)} for e in range(exercises)]
+    }
+
+
+def make_quiz(questions: int) -> Dict[str, Any]:
+    types = ["Choix multiple", "Vrai/Faux", "Questions directes"]
+    return {
+        "quiz_title": "Quiz du module 1",
+        "module_title": "Module 1",
+        "difficulty_level": "Moyen",
+        "questions": [
+            {
+                "question_number": q + 1,
+                "question_type": types[q % 3],
+                "question_text": _paragraph(q),
+                "options": [_paragraph(q * 4 + o) for o in range(4)],
+                "correct_answer": _paragraph(q * 4),
+                "explanation": " ".join(_paragraph(q + i) for i in range(3))
+            }
+            for q in range(questions)
+        ]
+    }
+
+
+def make_podcast_script(sections: int) -> Dict[str, Any]:
+    return {
+        "podcast_title": "Les bases de données en 20 minutes",
+        "script_sections": [
+            {"section_title": f"Partie {s + 1}", "content": "\n".join(f"Animateur: {_paragraph(s * 30 + i)}" for i in range(30))}
+            for s in range(sections)
+        ]
+    }
+
+
+class RecordingUI:
+    """
+    Remplace le module Streamlit dans les boucles d'affichage: compte les
+    éléments sans les afficher, pour ne mesurer que le travail de la boucle.
+    """
+
+    def __init__(self):
+        self.elements = 0
+
+    def write(self, *args: Any, **kwargs: Any) -> None:
+        self.elements += 1
+
+    markdown = error = write
+
+    def expander(self, label: str, expanded: bool = False) -> "RecordingUI":
+        self.elements += 1
+        return self
+
+    def __enter__(self) -> "RecordingUI":
+        return self
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+
+def render_course(structure: Dict[str, Any], chapter_content: Dict[str, Any]) -> int:
+    # Onglet cours avec tous les chapitres générés
+    ui = RecordingUI()
+    for module in structure["modules"]:
+        for chapter in module["chapters"]:
+            with ui.expander(f"Chapitre {chapter['chapter_number']}: {chapter['chapter_title']}"):
+                render_chapter_outline(ui, chapter)
+                render_chapter_content(ui, chapter_content)
+    return ui.elements
+
+
+def build_cases(scale: float) -> List[Tuple[str, Callable[[], Any]]]:
+    """
+    Construit les fichiers de test et la liste des fonctions mesurées.
+
+    Args:
+        scale: Facteur appliqué à la taille des fichiers (1 = tailles de référence)
+    """
+    pdf = make_pdf(int(200 * scale), 40)
+    docx = make_docx(int(20000 * scale))
+    pptx = make_pptx(int(300 * scale), 12)
+    txt = make_txt(int(4096 * scale))
+    text = txt.decode("utf-8")[:int(1024 * 1024 * scale)]
+    list_completion = "\n".join(f"{i + 1}. {_paragraph(i)}" if i % 3 else f"- {_paragraph(i)}" for i in range(2000))
+
+    structure = make_course_structure(10, 10)
+    chapter_content = make_chapter_content(8, 10)
+    quiz = make_quiz(50)
+    podcast_script = make_podcast_script(12)
+    structure_json = json.dumps(structure, ensure_ascii=False)
+    chapter_json = json.dumps(chapter_content, ensure_ascii=False)
+    quiz_json = json.dumps(quiz, ensure_ascii=False)
+
+    return [
+        ("extract_text_from_pdf", lambda: extract_text_from_pdf(io.BytesIO(pdf))),
+        ("extract_text_from_docx", lambda: extract_text_from_docx(io.BytesIO(docx))),
+        ("extract_text_from_pptx", lambda: extract_text_from_pptx(io.BytesIO(pptx))),
+        ("extract_text_from_txt", lambda: extract_text_from_txt(io.BytesIO(txt))),
+        ("split_text_into_chunks", lambda: split_text_into_chunks(text, max_tokens=1000)),
+        ("_parse_list", lambda: _parse_list(list_completion)),
+        ("json.loads structure", lambda: json.loads(structure_json)),
+        ("json.loads chapitre", lambda: json.loads(chapter_json)),
+        ("json.loads quiz", lambda: json.loads(quiz_json)),
+        ("affichage cours", lambda: render_course(structure, chapter_content)),
+        ("affichage quiz", lambda: render_quiz_questions(RecordingUI(), quiz["questions"])),
+        ("affichage podcast", lambda: render_podcast_sections(RecordingUI(), podcast_script["script_sections"])),
+    ]
+
+
+def run_case(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Mesure une fonction: durées sur `repeat` exécutions (après une exécution
+    de chauffe), puis pic d'allocation sur une exécution suivie par tracemalloc.
+    """
+    fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    with measure() as traced:
+        fn()
+    return {
+        "median_ms": statistics.median(durations) * 1000,
+        "min_ms": min(durations) * 1000,
+        "peak_kb": traced["peak_bytes"] / 1024,
+    }
+
+
+def compare(report: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """
+    Ajoute aux résultats l'écart à la référence et renvoie les fonctions en régression.
+
+    Args:
+        report: Les résultats de cette exécution (complétés sur place)
+        baseline: Les résultats de référence
+        tolerance: L'écart relatif toléré (0.25 = +25 %)
+
+    Returns:
+        Les noms des fonctions plus lentes ou plus gourmandes que la référence au-delà de la tolérance
+    """
+    regressions = []
+    for name, row in report.items():
+        reference = baseline.get(name)
+        if not reference:
+            row["statut"] = "nouveau"
+            continue
+        row["Δtemps_%"] = 100.0 * (row["median_ms"] / reference["median_ms"] - 1) if reference["median_ms"] else 0.0
+        row["Δmémoire_%"] = 100.0 * (row["peak_kb"] / reference["peak_kb"] - 1) if reference["peak_kb"] else 0.0
+        regressed = row["Δtemps_%"] > 100 * tolerance or row["Δmémoire_%"] > 100 * tolerance
+        row["statut"] = "RÉGRESSION" if regressed else "ok"
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def machine_notes() -> Dict[str, Any]:
+    """
+    Description de la machine et de l'environnement de mesure, enregistrée avec la référence.
+    """
+    try:
+        import tiktoken
+        tiktoken.encoding_for_model("gpt-4")
+        token_counter = "tiktoken"
+    except Exception:
+        # Sans encodeur (paquet absent ou fichier d'encodage inaccessible), le découpage utilise l'approximation
+        token_counter = "approximation (4 caractères par token)"
+    return {
+        "system": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "token_counter": token_counter,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks des traitements locaux, avec comparaison à une référence.")
+    parser.add_argument("--repeat", type=int, default=5, help="Nombre d'exécutions mesurées par fonction")
+    parser.add_argument("--scale", type=float, default=1.0, help="Facteur de taille des fichiers de test")
+    parser.add_argument("--only", nargs="+", help="Ne mesurer que les fonctions dont le nom contient l'un de ces mots")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="Enregistrer les résultats comme référence")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE, help="Comparer les résultats à une référence enregistrée")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Écart relatif toléré avant de signaler une régression")
+    parser.add_argument("--json", help="Chemin d'un fichier où écrire les résultats")
+    args = parser.parse_args()
+
+    report: Dict[str, Dict[str, Any]] = {}
+    for name, fn in build_cases(args.scale):
+        if args.only and not any(word in name for word in args.only):
+            continue
+        report[name] = run_case(fn, args.repeat)
+
+    columns = ["median_ms", "min_ms", "peak_kb"]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["settings"]["scale"] != args.scale:
+            print(f"Attention: référence mesurée avec --scale {baseline['settings']['scale']}.")
+        reference_machine = baseline["settings"].get("machine_notes", {})
+        for key, value in machine_notes().items():
+            if key in reference_machine and reference_machine[key] != value:
+                print(f"Attention: référence mesurée sur une autre machine ({key}: {reference_machine[key]}, ici {value}).")
+        regressions = compare(report, baseline["results"], args.tolerance)
+        columns += ["Δtemps_%", "Δmémoire_%", "statut"]
+    print_table(report, columns)
+
+    settings = {"repeat": args.repeat, "scale": args.scale, "python": sys.version.split()[0], "machine_notes": machine_notes()}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        write_json(args.save_baseline, {"settings": settings, "results": report})
+        print(f"Référence enregistrée: {args.save_baseline}")
+    if args.json:
+        write_json(args.json, {"settings": settings, "results": report})
+    if regressions:
+        print(f"Régressions (tolérance {args.tolerance:.0%}): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark de l'import de documents: traitement fichier par fichier
+(process_document) face au pipeline parallèle (document_ingestion), sur
+des fichiers texte générés et le fournisseur local simulé. Avec
+--large-mb, mesure aussi l'import en flux d'un gros fichier (pic mémoire
+Python du processus principal, hors processus d'extraction).
+
+Usage:
+    python -m benchmarks.bench_ingestion --files 5 --paragraphs 2000 --latency 0.3 --large-mb 50
+"""
+import io
+import os
+import time
+import argparse
+import tempfile
+from typing import List, Dict, Any, Tuple
+
+from ai_helpers import process_document
+from document_corpus import DocumentCorpus
+from document_ingestion import IngestionPipeline
+from llm_providers import configure_mock
+from benchmarks.common import measure, print_table, write_json
+
+PROVIDER = "mock"
+
+
+def make_files(count: int, paragraphs: int) -> List[Tuple[str, bytes]]:
+    """
+    Fichiers texte de tailles croissantes: le dernier est le plus long.
+    """
+    files = []
+    for i in range(count):
+        lines = (f"Paragraphe {j} du document {i}: notions, exemples et exercices du chapitre." for j in range(paragraphs * (i + 1) // count))
+        files.append((f"document-{i}.txt", "\n".join(lines).encode("utf-8")))
+    return files
+
+
+def run_sequential(files: List[Tuple[str, bytes]]) -> Tuple[float, Dict[str, float]]:
+    per_file = {}
+    start = time.perf_counter()
+    for name, data in files:
+        file_start = time.perf_counter()
+        process_document(io.BytesIO(data), name, PROVIDER, PROVIDER)
+        per_file[name] = time.perf_counter() - file_start
+    return time.perf_counter() - start, per_file
+
+
+def run_pipeline(files: List[Tuple[str, bytes]]) -> float:
+    pipeline = IngestionPipeline(PROVIDER, PROVIDER, DocumentCorpus(PROVIDER))
+    start = time.perf_counter()
+    pipeline.start([(name, io.BytesIO(data)) for name, data in files])
+    pipeline.wait()
+    return time.perf_counter() - start
+
+
+def run_large_file(megabytes: int) -> Dict[str, Any]:
+    """
+    Importe en flux un fichier texte de `megabytes` Mo écrit sur disque.
+    """
+    line = "Paragraphe du manuel de référence: notions, exemples, exercices et corrigés du chapitre.\n"
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".txt", delete=False) as f:
+        written, i = 0, 0
+        while written < megabytes * 1024 * 1024:
+            written += f.write(f"{i} {line}")
+            i += 1
+    corpus = DocumentCorpus(PROVIDER)
+    try:
+        with measure() as result, open(f.name, "rb") as file:
+            pipeline = IngestionPipeline(PROVIDER, PROVIDER, corpus)
+            pipeline.start([("large.txt", file)])
+            pipeline.wait()
+    finally:
+        os.unlink(f.name)
+    stats = corpus.stats()
+    return {
+        "seconds": result["seconds"],
+        "chunks": stats["chunks"],
+        "corpus_mb": (stats["characters"] + stats["vector_bytes"]) / 2 ** 20,
+        "peak_mb": result["peak_bytes"] / 2 ** 20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durée d'import de plusieurs documents, séquentiel ou en pipeline.")
+    parser.add_argument("--files", type=int, default=5, help="Nombre de fichiers importés ensemble")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="Nombre de paragraphes du plus long fichier")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latence simulée d'une requête d'embeddings (s)")
+    parser.add_argument("--large-mb", type=int, default=0, help="Taille du gros fichier importé en flux (0 pour ne pas le mesurer)")
+    parser.add_argument("--json", help="Chemin d'un fichier où écrire les résultats")
+    args = parser.parse_args()
+
+    configure_mock(latency=args.latency)
+    files = make_files(args.files, args.paragraphs)
+
+    # Démarrage du pool de processus hors mesure, comme dans l'application déjà lancée
+    run_pipeline(files[:1])
+
+    sequential_seconds, per_file = run_sequential(files)
+    pipeline_seconds = run_pipeline(files)
+    report: Dict[str, Dict[str, Any]] = {
+        "plus long fichier seul": {"seconds": max(per_file.values())},
+        "séquentiel": {"seconds": sequential_seconds},
+        "pipeline": {"seconds": pipeline_seconds},
+    }
+    if args.large_mb:
+        configure_mock(latency=0)
+        report[f"fichier de {args.large_mb} Mo en flux"] = run_large_file(args.large_mb)
+    print_table(report, ["seconds", "chunks", "corpus_mb", "peak_mb"])
+    if args.json:
+        write_json(args.json, {"settings": vars(args), "results": report})
+
+
+if __name__ == "__main__":
+    main()
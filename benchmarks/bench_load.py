@@ -0,0 +1,220 @@
+"""
+Test de charge: N auteurs simulés utilisent en même temps un même serveur
+(un seul processus, comme App.py), chacun dans sa propre session: import
+d'un document, structure du cours, chapitres, quiz et script de podcast,
+avec le fournisseur local simulé et des latences réalistes.
+
+Les parcours appellent les mêmes fonctions que l'interface, avec les mêmes
+objets de session (corpus de documents, identifiants). Pour chaque nombre
+d'auteurs: débit, latences p50/p95/p99 par étape et par parcours complet,
+utilisation CPU du processus et mémoire résidente par session (état des
+sessions gardé en mémoire jusqu'à la mesure, comme st.session_state).
+
+Usage:
+    python -m benchmarks.bench_load --sessions 1 5 10 20 --latency 0.8 --tokens-per-second 150
+"""
+import io
+import os
+import time
+import random
+import resource
+import argparse
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+from ai_helpers import generate_course_structure, generate_chapter_content, generate_quiz, generate_podcast_script
+from document_corpus import DocumentCorpus
+from document_ingestion import IngestionPipeline
+from llm_providers import Credentials, configure_mock
+from shared_store import open_store, set_shared_store
+from benchmarks.bench_flows import _is_error
+from benchmarks.common import percentile, print_table, write_json
+
+PROVIDER = "mock"
+STEPS = ("upload", "structure", "chapters", "quiz", "podcast")
+
+
+def _rss_bytes() -> int:
+    # Mémoire résidente actuelle (Linux), sinon le pic depuis le démarrage
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _cpu_seconds() -> float:
+    # Processus serveur et processus d'extraction encore actifs (/proc, Linux)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    total = usage.ru_utime + usage.ru_stime
+    for child in multiprocessing.active_children():
+        try:
+            with open(f"/proc/{child.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            pass
+    return total
+
+
+def make_document(index: int, kilobytes: int) -> bytes:
+    """
+    Document de référence propre à un auteur (contenus distincts: pas de cache commun).
+    """
+    line = f"Notes de cours de l'auteur {index}: définitions, exemples, exercices et corrigés du chapitre.\n"
+    return (line * (kilobytes * 1024 // len(line) + 1)).encode("utf-8")
+
+
+def simulate_author(index: int, args: argparse.Namespace, latencies: Dict[str, List[float]], errors: Counter) -> Dict[str, Any]:
+    """
+    Parcours complet d'un auteur simulé, étape après étape (comme les clics
+    dans l'interface), avec un temps de réflexion entre les étapes.
+
+    Returns:
+        L'état de la session (corpus et artefacts générés)
+    """
+    rng = random.Random(index)
+    credentials = Credentials.from_keys({PROVIDER: f"session-{index}"})
+    title = f"Cours de charge {index}"
+    description = f"Un cours d'introduction aux bases de données relationnelles, session {index}."
+    session: Dict[str, Any] = {"document_corpus": DocumentCorpus(PROVIDER)}
+
+    def step(name: str, fn) -> Any:
+        if args.think_time:
+            time.sleep(rng.uniform(0, 2 * args.think_time))
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            print(f"Erreur de l'étape {name} (session {index}): {str(e)}")
+            result = {"error": str(e)}
+        latencies[name].append(time.perf_counter() - start)
+        if _is_error(result):
+            errors[name] += 1
+        return result
+
+    def upload():
+        pipeline = IngestionPipeline(credentials, PROVIDER, session["document_corpus"])
+        pipeline.start([(f"notes-{index}.txt", io.BytesIO(make_document(index, args.document_kb)))])
+        pipeline.wait()
+        failed = [progress.error for progress in pipeline.progress() if progress.stage == "error"]
+        return {"error": failed[0]} if failed else pipeline.completed()
+
+    start = time.perf_counter()
+    step("upload", upload)
+    structure = step("structure", lambda: generate_course_structure(
+        title, description, "8 semaines", "Beginner", args.modules,
+        document_corpus=session["document_corpus"], api_provider=PROVIDER, api_key=credentials
+    ))
+    session["course_structure"] = structure
+    modules = structure.get("modules", []) if isinstance(structure, dict) else []
+
+    chapters = [(module, chapter) for module in modules for chapter in module["chapters"]][:args.chapters]
+    session["chapter_contents"] = {}
+    for module, chapter in chapters:
+        session["chapter_contents"][f"{module['module_number']}_{chapter['chapter_number']}"] = step(
+            "chapters", lambda: generate_chapter_content(
+                title, description, module["module_title"], chapter["chapter_title"], chapter["description"],
+                chapter["key_points"], document_corpus=session["document_corpus"], course_structure=structure,
+                api_provider=PROVIDER, api_key=credentials
+            )
+        )
+
+    if modules:
+        session["quiz"] = step("quiz", lambda: generate_quiz(
+            title, modules[0], 10, course_structure=structure, api_provider=PROVIDER, api_key=credentials
+        ))
+    session["podcast_script"] = step("podcast", lambda: generate_podcast_script(
+        title, description, structure, api_provider=PROVIDER, api_key=credentials
+    ))
+    latencies["session"].append(time.perf_counter() - start)
+    return session
+
+
+def run_load(sessions: int, args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """
+    Lance `sessions` auteurs simultanés (démarrages étalés sur args.ramp_up secondes).
+
+    Returns:
+        Une ligne de synthèse et une ligne par étape
+    """
+    latencies: Dict[str, List[float]] = {name: [] for name in STEPS + ("session",)}
+    errors: Counter = Counter()
+    rss_before = _rss_bytes()
+    cpu_before = _cpu_seconds()
+    lock = threading.Lock()
+    states: List[Dict[str, Any]] = []
+
+    def author(index: int) -> None:
+        time.sleep(args.ramp_up * index / max(1, sessions))
+        state = simulate_author(index, args, latencies, errors)
+        with lock:
+            states.append(state)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="author") as executor:
+        list(executor.map(author, range(sessions)))
+    wall = time.perf_counter() - start
+    cpu = _cpu_seconds() - cpu_before
+    # États des sessions encore en mémoire, comme dans un serveur Streamlit
+    rss_per_session = max(0, _rss_bytes() - rss_before) / sessions
+
+    steps_done = sum(len(latencies[name]) for name in STEPS)
+    rows: Dict[str, Dict[str, Any]] = {
+        f"{sessions} auteurs": {
+            "sessions/min": 60.0 * len(states) / wall,
+            "steps/s": steps_done / wall,
+            "p50_ms": percentile(latencies["session"], 50) * 1000,
+            "p95_ms": percentile(latencies["session"], 95) * 1000,
+            "p99_ms": percentile(latencies["session"], 99) * 1000,
+            "errors": sum(errors.values()),
+            "cpu_%": 100.0 * cpu / wall,
+            "rss_mb/session": rss_per_session / 2 ** 20,
+        }
+    }
+    for name in STEPS:
+        rows[f"{sessions} auteurs · {name}"] = {
+            "steps/s": len(latencies[name]) / wall,
+            "p50_ms": percentile(latencies[name], 50) * 1000,
+            "p95_ms": percentile(latencies[name], 95) * 1000,
+            "p99_ms": percentile(latencies[name], 99) * 1000,
+            "errors": errors[name],
+        }
+    del states
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge: auteurs simultanés sur un même serveur, fournisseur local simulé.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10], help="Nombres d'auteurs simultanés testés, dans l'ordre")
+    parser.add_argument("--modules", type=int, default=3, help="Nombre de modules par cours")
+    parser.add_argument("--chapters", type=int, default=3, help="Nombre de chapitres générés par auteur")
+    parser.add_argument("--document-kb", type=int, default=200, help="Taille du document importé par chaque auteur (Ko)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Temps de réflexion moyen entre deux étapes (s)")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="Durée sur laquelle les démarrages sont étalés (s)")
+    parser.add_argument("--latency", type=float, default=0.8, help="Latence simulée avant le premier token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=150, help="Débit simulé (0 = instantané)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Taux d'erreurs simulées (429/500)")
+    parser.add_argument("--shared-store", default="", help="Stockage partagé (sqlite:///..., memory://), vide pour aucun")
+    parser.add_argument("--json", help="Chemin d'un fichier où écrire les résultats")
+    args = parser.parse_args()
+
+    configure_mock(latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate, seed=0)
+    set_shared_store(open_store(args.shared_store))
+
+    report: Dict[str, Dict[str, Any]] = {}
+    for sessions in args.sessions:
+        report.update(run_load(sessions, args))
+    print_table(report, ["sessions/min", "steps/s", "p50_ms", "p95_ms", "p99_ms", "errors", "cpu_%", "rss_mb/session"])
+    if args.json:
+        write_json(args.json, {"settings": vars(args), "results": report})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark des formats de stockage des embeddings (quantization): mémoire par
+morceau, latence de recherche et perte de qualité (rappel@k face au float32)
+sur deux corpus de référence:
+
+- "texte": un corpus de cours généré de façon déterministe (thèmes, vocabulaire
+  de cours) et encodé par les embeddings du fournisseur mock, interrogé avec
+  des titres de chapitres;
+- "synthétique": des vecteurs denses regroupés en thèmes (voir bench_ann),
+  plus proches des embeddings réels text-embedding-3-small.
+
+Usage:
+    python -m benchmarks.bench_quantization --chunks 20000 --dimension 1536
+"""
+import time
+import random
+import argparse
+from typing import List, Dict, Any, Tuple
+import numpy as np
+
+from document_corpus import DocumentCorpus
+from llm_providers import get_provider, resolve_model
+from quantization import CODECS
+from benchmarks.bench_ann import make_vectors, make_queries
+from benchmarks.common import percentile, print_table, write_json
+
+# Vocabulaire des thèmes du corpus texte
+TOPICS = {
+    "sql": "requête table jointure index clé primaire étrangère select where group order transaction schéma vue agrégat",
+    "python": "fonction variable boucle liste dictionnaire module classe objet exception itérateur générateur import décorateur",
+    "réseaux": "paquet routeur adresse protocole couche transport tcp udp commutateur latence bande passante pare-feu",
+    "statistiques": "moyenne variance écart type échantillon distribution loi normale test hypothèse régression corrélation",
+    "gestion": "projet planning budget risque jalon équipe livrable priorité client réunion indicateur suivi",
+    "marketing": "marché segment cible marque prix promotion canal campagne positionnement concurrence fidélisation",
+    "droit": "contrat clause responsabilité obligation juridique litige tribunal preuve article loi jurisprudence",
+    "biologie": "cellule protéine gène membrane enzyme métabolisme organisme tissu mutation évolution adn",
+    "chimie": "molécule atome liaison réaction solution acide base équilibre oxydation catalyseur concentration",
+    "histoire": "siècle empire révolution guerre traité royaume dynastie colonie république armée frontière",
+    "physique": "force énergie masse vitesse accélération champ onde fréquence charge tension pression",
+    "finance": "bilan actif passif trésorerie capital dette amortissement rentabilité taux investissement flux",
+}
+COMMON_WORDS = ("le la les un une des et de du dans pour avec sur par est sont cette ces chapitre "
+                "exemple méthode notion principe cas étude définition résultat analyse").split()
+
+
+def make_text_corpus(chunks: int, seed: int = 0) -> Tuple[List[str], List[str]]:
+    """
+    Génère des morceaux de cours (environ 60 mots, dont deux tiers du
+    vocabulaire d'un thème) et des titres de chapitres pour les interroger.
+    """
+    rng = random.Random(seed)
+    topics = [words.split() for words in TOPICS.values()]
+    texts = []
+    for _ in range(chunks):
+        words = rng.choice(topics)
+        texts.append(" ".join(rng.choice(words) if rng.random() < 0.66 else rng.choice(COMMON_WORDS) for _ in range(60)))
+    queries = [" ".join(rng.sample(words, 4)) for words in topics for _ in range(10)]
+    return texts, queries
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    provider = get_provider("mock", "mock")
+    return np.asarray(provider.embed(texts, resolve_model("mock", "embedding")), dtype=np.float32)
+
+
+def build_corpus(vectors: np.ndarray, storage: str, documents: int = 20) -> DocumentCorpus:
+    # Recherche exacte: on mesure le format de stockage seul, sans l'index approximatif
+    corpus = DocumentCorpus("mock", storage=storage, ann_min_vectors=len(vectors) + 1)
+    for d, part in enumerate(np.array_split(vectors, documents)):
+        corpus.add_document(f"document-{d}", [""] * len(part), part)
+    return corpus
+
+
+def run_corpus(label: str, vectors: np.ndarray, queries: np.ndarray, top_k: int, storages: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare chaque format au float32 sur un corpus et ses requêtes.
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    # Représentation d'origine: liste Python de floats (pointeurs + objets float)
+    list_bytes = vectors.shape[1] * (8 + 24) + 56
+    truth: List[set] = []
+    float32_bytes = 0
+    for storage in ["float32"] + [s for s in storages if s != "float32"]:
+        start = time.perf_counter()
+        corpus = build_corpus(vectors, storage)
+        build_seconds = time.perf_counter() - start
+
+        latencies, hits = [], 0
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            found = {(chunk.document, chunk.position) for _, chunk in corpus.search(query, top_k)}
+            latencies.append(time.perf_counter() - start)
+            if storage == "float32":
+                truth.append(found)
+            hits += len(found & truth[i])
+
+        bytes_per_chunk = corpus.stats()["vector_bytes"] / len(corpus)
+        float32_bytes = float32_bytes or bytes_per_chunk
+        rows[f"{label} {storage}"] = {
+            "bytes/chunk": int(bytes_per_chunk),
+            "vs float32": float32_bytes / bytes_per_chunk,
+            "vs list": list_bytes / bytes_per_chunk,
+            f"recall@{top_k}": hits / sum(len(t) for t in truth),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "build_s": build_seconds,
+        }
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire et qualité de recherche des formats de stockage des embeddings.")
+    parser.add_argument("--chunks", type=int, default=20000, help="Nombre de morceaux de chaque corpus")
+    parser.add_argument("--dimension", type=int, default=1536, help="Dimension du corpus synthétique")
+    parser.add_argument("--queries", type=int, default=100, help="Nombre de requêtes du corpus synthétique")
+    parser.add_argument("--top-k", type=int, default=10, help="Nombre de résultats par requête")
+    parser.add_argument("--storage", nargs="+", default=list(CODECS), help="Formats de stockage comparés")
+    parser.add_argument("--json", help="Chemin d'un fichier où écrire les résultats")
+    args = parser.parse_args()
+
+    report: Dict[str, Dict[str, Any]] = {}
+    texts, titles = make_text_corpus(args.chunks)
+    report.update(run_corpus("texte", embed_texts(texts), embed_texts(titles), args.top_k, args.storage))
+
+    vectors = make_vectors(args.chunks, args.dimension)
+    report.update(run_corpus("synthétique", vectors, make_queries(vectors, args.queries), args.top_k, args.storage))
+
+    print_table(report, ["bytes/chunk", "vs float32", "vs list", f"recall@{args.top_k}", "p50_ms", "build_s"])
+    if args.json:
+        write_json(args.json, {"settings": vars(args), "results": report})
+
+
+if __name__ == "__main__":
+    main()
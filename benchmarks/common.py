@@ -0,0 +1,89 @@
+import math
+import time
+import json
+import tracemalloc
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Calcule un percentile par la méthode du rang le plus proche.
+
+    Args:
+        values: Les mesures
+        p: Le percentile souhaité (entre 0 et 100)
+
+    Returns:
+        La valeur du percentile (0 si aucune mesure)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(p / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+@contextmanager
+def measure():
+    """
+    Mesure la durée et le pic d'allocation mémoire Python d'un bloc.
+
+    Yields:
+        Un dictionnaire rempli en sortie de bloc avec 'seconds' et 'peak_bytes'
+    """
+    result: Dict[str, float] = {}
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        result["peak_bytes"] = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def summarize(latencies: List[float], wall_seconds: float, peak_bytes: float = 0, errors: int = 0) -> Dict[str, Any]:
+    """
+    Résume une série de mesures de latence d'une étape.
+    """
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "throughput_per_s": len(latencies) / wall_seconds if wall_seconds > 0 else 0.0,
+        "peak_mb": peak_bytes / (1024 * 1024),
+    }
+
+
+def print_table(rows: Dict[str, Dict[str, Any]], columns: Optional[List[str]] = None) -> None:
+    """
+    Affiche un tableau texte: une ligne par étape, une colonne par métrique.
+    """
+    if not rows:
+        return
+    columns = columns or list(next(iter(rows.values())).keys())
+    name_width = max(len("étape"), max(len(name) for name in rows))
+    header = "étape".ljust(name_width) + "".join(column.rjust(18) for column in columns)
+    print(header)
+    print("-" * len(header))
+    for name, row in rows.items():
+        cells = []
+        for column in columns:
+            value = row.get(column, "")
+            cells.append((f"{value:.2f}" if isinstance(value, float) else str(value)).rjust(18))
+        print(name.ljust(name_width) + "".join(cells))
+
+
+def write_json(path: str, payload: Any) -> None:
+    """
+    Écrit les résultats d'un benchmark au format JSON.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,165 @@
+import io
+import time
+import json
+import base64
+import zipfile
+from typing import Optional, List, Dict, Any, Tuple, Callable, BinaryIO
+
+# Nombre de caractères base64 décodés à la fois lors de l'écriture de l'audio (multiple de 4)
+_BASE64_BLOCK_CHARS = 4 * 256 * 1024
+
+
+def _version(source: Any) -> Any:
+    # Les textes et nombres comptent par leur valeur, les listes et tuples par
+    # leurs éléments, les autres objets (dictionnaires générés) par leur identité
+    if source is None or isinstance(source, (str, int, float, bool)):
+        return source
+    if isinstance(source, (list, tuple)):
+        return tuple(_version(item) for item in source)
+    return id(source)
+
+
+class ExportCache:
+    """
+    Contenus d'export (JSON, texte, audio, archive du cours) calculés une
+    seule fois par version des artefacts dont ils dépendent.
+
+    Les artefacts générés (structure, chapitres, quiz, script) sont remplacés
+    par un nouvel objet à chaque génération, jamais modifiés sur place: leur
+    identité sert de numéro de version, et un export n'est recalculé que
+    lorsque l'un d'eux change, pas à chaque réexécution de la page.
+    """
+
+    def __init__(self):
+        # clé -> (version, sources, contenu); les sources sont gardées pour
+        # qu'aucun nouvel objet ne puisse réutiliser l'identité d'un ancien
+        self._entries: Dict[str, Tuple[Any, Any, Any]] = {}
+
+    def peek(self, key: str, sources: Any) -> Optional[Any]:
+        """
+        Renvoie le contenu d'export s'il est à jour, sans le calculer.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == _version(sources):
+            return entry[2]
+        return None
+
+    def get(self, key: str, sources: Any, build: Callable[[], Any]) -> Any:
+        """
+        Renvoie le contenu d'export pour la version actuelle des sources, en le
+        calculant avec build() seulement si elles ont changé.
+
+        Args:
+            key: Le nom de l'export
+            sources: Les artefacts dont dépend l'export
+            build: La fonction qui calcule le contenu
+
+        Returns:
+            Le contenu d'export
+        """
+        version = _version(sources)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[2]
+        payload = build()
+        self._entries[key] = (version, sources, payload)
+        return payload
+
+
+def json_payload(data: Any) -> bytes:
+    """
+    Sérialise un artefact pour le téléchargement (JSON indenté, UTF-8).
+    """
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def podcast_script_text(podcast_script: Dict[str, Any]) -> str:
+    """
+    Texte complet d'un script de podcast, section après section.
+    """
+    return "".join(section["content"] + "\n\n" for section in podcast_script.get("script_sections", []))
+
+
+def _write_json(archive: zipfile.ZipFile, name: str, data: Any) -> None:
+    # json.dump écrit au fil de l'encodage: le JSON complet n'existe jamais en mémoire
+    with archive.open(name, "w") as raw, io.TextIOWrapper(raw, encoding="utf-8") as text:
+        json.dump(data, text, indent=2, ensure_ascii=False)
+
+
+def _write_base64(archive: zipfile.ZipFile, name: str, data: str) -> None:
+    # Entrée non compressée (ZipInfo par défaut): le MP3 l'est déjà
+    with archive.open(zipfile.ZipInfo(name, time.localtime()[:6]), "w") as target:
+        for start in range(0, len(data), _BASE64_BLOCK_CHARS):
+            target.write(base64.b64decode(data[start:start + _BASE64_BLOCK_CHARS]))
+
+
+def write_course_bundle(target: BinaryIO, course: Dict[str, Any], chapter_contents: Dict[str, Any],
+                        quizzes: Dict[str, Any], podcast_script: Dict[str, Any], podcast_audio: Dict[str, Any]) -> List[str]:
+    """
+    Écrit l'archive ZIP du cours complet, une entrée après l'autre:
+    informations et structure du cours, chapitres, quiz, script et audio du
+    podcast, et un manifeste qui décrit le contenu de l'archive.
+
+    Args:
+        target: Le fichier où écrire l'archive
+        course: Les informations du cours (titre, description, objectifs, prérequis, méthodes, structure)
+        chapter_contents: Le contenu des chapitres générés, par clé 'module_chapitre'
+        quizzes: Les quiz générés, par clé de module
+        podcast_script: Le script du podcast (vide s'il n'a pas été généré)
+        podcast_audio: L'audio du podcast (vide s'il n'a pas été généré)
+
+    Returns:
+        Les noms des entrées de l'archive
+    """
+    # Titres des chapitres de la structure (le contenu généré n'a pas de titre)
+    chapter_titles = {
+        f"{module['module_number']}_{chapter['chapter_number']}": chapter.get("chapter_title", "")
+        for module in (course.get("course_structure") or {}).get("modules", [])
+        for chapter in module.get("chapters", [])
+    }
+
+    resources = []
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        _write_json(archive, "cours.json", course)
+        resources.append({"type": "cours", "href": "cours.json"})
+
+        for chapter_key, chapter_content in chapter_contents.items():
+            if "error" in chapter_content:
+                continue
+            module_number, chapter_number = chapter_key.split("_", 1)
+            name = f"chapitres/module_{module_number}_chapitre_{chapter_number}.json"
+            _write_json(archive, name, chapter_content)
+            resources.append({"type": "chapitre", "href": name, "title": chapter_titles.get(chapter_key, "")})
+
+        for quiz_key, quiz in quizzes.items():
+            if "error" in quiz:
+                continue
+            name = f"quiz/{quiz_key}.json"
+            _write_json(archive, name, quiz)
+            resources.append({"type": "quiz", "href": name, "title": quiz.get("quiz_title", "")})
+
+        if podcast_script and "error" not in podcast_script:
+            _write_json(archive, "podcast/script.json", podcast_script)
+            archive.writestr("podcast/script.txt", podcast_script_text(podcast_script))
+            resources.append({"type": "podcast", "href": "podcast/script.json", "title": podcast_script.get("podcast_title", "")})
+
+        if podcast_audio and "audio_base64" in podcast_audio:
+            _write_base64(archive, "podcast/audio.mp3", podcast_audio["audio_base64"])
+            resources.append({"type": "audio", "href": "podcast/audio.mp3"})
+
+        _write_json(archive, "manifest.json", {"title": course.get("title", ""), "resources": resources})
+        return archive.namelist()
+
+
+def build_course_bundle(course: Dict[str, Any], chapter_contents: Dict[str, Any], quizzes: Dict[str, Any],
+                        podcast_script: Dict[str, Any], podcast_audio: Dict[str, Any]) -> bytes:
+    """
+    Construit en mémoire l'archive du cours complet (voir write_course_bundle),
+    comme les autres contenus d'export: aucun fichier n'est laissé sur le disque.
+
+    Returns:
+        Le contenu de l'archive ZIP
+    """
+    target = io.BytesIO()
+    write_course_bundle(target, course, chapter_contents, quizzes, podcast_script, podcast_audio)
+    return target.getvalue()
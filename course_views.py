@@ -0,0 +1,101 @@
+from typing import List, Dict, Any
+
+# Affichage des artefacts générés. Chaque fonction reçoit le module Streamlit
+# (ou tout objet offrant write, markdown, error et expander) pour que les
+# boucles d'affichage des onglets puissent aussi être mesurées hors de
+# l'application (benchmarks/bench_hotpaths.py).
+
+
+def render_chapter_outline(ui: Any, chapter: Dict[str, Any]) -> None:
+    """
+    Affiche la description et les points clés d'un chapitre de la structure.
+
+    Args:
+        ui: Le module Streamlit
+        chapter: Le chapitre (description, key_points)
+    """
+    ui.write(f"**Description:** {chapter['description']}")
+
+    ui.write("**Points clés:**")
+    for point in chapter['key_points']:
+        ui.write(f"- {point}")
+
+
+def render_chapter_content(ui: Any, chapter_content: Dict[str, Any]) -> None:
+    """
+    Affiche le contenu détaillé d'un chapitre: introduction, sections et
+    exemples, conclusion et exercices (ou l'erreur de génération).
+
+    Args:
+        ui: Le module Streamlit
+        chapter_content: Le contenu généré du chapitre
+    """
+    # Vérifier s'il y a une erreur
+    if "error" in chapter_content:
+        ui.error(f"Erreur: {chapter_content['error']}")
+        return
+
+    # Afficher l'introduction
+    ui.markdown("### Introduction")
+    ui.write(chapter_content["introduction"])
+
+    # Afficher les sections
+    for section in chapter_content["sections"]:
+        ui.markdown(f"### {section['title']}")
+        ui.write(section["content"])
+
+        # Afficher les exemples
+        if "examples" in section and section["examples"]:
+            ui.markdown("**Exemples:**")
+            for example in section["examples"]:
+                ui.markdown(f"- *{example}*")
+
+    # Afficher la conclusion
+    ui.markdown("### Conclusion")
+    ui.write(chapter_content["conclusion"])
+
+    # Afficher les exercices
+    if "exercises" in chapter_content and chapter_content["exercises"]:
+        ui.markdown("### Exercices")
+        for j, exercise in enumerate(chapter_content["exercises"]):
+            ui.markdown(f"**Exercice {j+1}:** {exercise['question']}")
+            ui.markdown(f"*Réponse/Indice:* {exercise['answer']}")
+            ui.markdown("---")
+
+
+def render_quiz_questions(ui: Any, questions: List[Dict[str, Any]]) -> None:
+    """
+    Affiche les questions d'un quiz, une par accordéon, avec options, réponse et explication.
+
+    Args:
+        ui: Le module Streamlit
+        questions: Les questions du quiz
+    """
+    for question in questions:
+        with ui.expander(f"Question {question['question_number']}: {question['question_text']}"):
+            ui.write(f"**Type de question:** {question['question_type']}")
+
+            # Afficher les options pour les questions à choix multiple
+            if question['question_type'] == "Choix multiple" and "options" in question:
+                ui.write("**Options:**")
+                for i, option in enumerate(question["options"]):
+                    ui.write(f"{chr(65+i)}. {option}")
+
+            # Afficher la réponse correcte
+            ui.write(f"**Réponse correcte:** {question['correct_answer']}")
+
+            # Afficher l'explication
+            ui.write(f"**Explication:** {question['explanation']}")
+
+
+def render_podcast_sections(ui: Any, script_sections: List[Dict[str, Any]]) -> None:
+    """
+    Affiche les sections d'un script de podcast, une par accordéon.
+
+    Args:
+        ui: Le module Streamlit
+        script_sections: Les sections du script (section_title, content)
+    """
+    for section in script_sections:
+        with ui.expander(f"{section['section_title']}"):
+            ui.write(section['content'])
@@ -0,0 +1,452 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Tuple, Any
+import numpy as np
+
+from ann_index import IVFIndex, ANN_MIN_VECTORS
+from quantization import (
+    VectorCodec, Float32Codec, Codes, EMBEDDING_STORAGE, PQ_MIN_TRAIN_VECTORS,
+    make_codec, bytes_per_vector, save_codes, load_codes
+)
+
+
+@dataclass
+class DocumentChunk:
+    """
+    Un morceau de document indexé.
+    """
+    document: str
+    position: int
+    text: str
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    # Vecteurs unitaires: la similarité cosinus devient un simple produit scalaire
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class DocumentCorpus:
+    """
+    Corpus des documents de référence d'un cours: le texte intégral de chaque
+    document, découpé en morceaux et indexé par leurs embeddings, pour
+    sélectionner le contexte le plus pertinent pour chaque génération.
+
+    Les embeddings de tous les documents sont rangés dans une seule matrice
+    contiguë (vecteurs normalisés). L'ajout d'un document n'écrit que ses
+    propres lignes: la capacité de la matrice double lorsqu'elle est pleine,
+    sans recalculer les documents existants. Les recherches peuvent être
+    restreintes à une partie des documents.
+
+    Le format de stockage (`storage`) réduit la mémoire par morceau: float16
+    (÷2), int8 avec échelle par vecteur (÷4) ou quantification produit 'pq'
+    (÷32 en 1536 dimensions); les scores sont calculés sur la forme encodée.
+    La quantification produit apprend ses dictionnaires sur les vecteurs du
+    corpus: les morceaux restent en float32 jusqu'à `pq_min_train_vectors`,
+    puis tout le corpus est encodé avec les dictionnaires appris à ce moment.
+
+    Au-delà de `ann_min_vectors` morceaux, les recherches passent par un index
+    approximatif IVF (voir ann_index), construit à la première recherche et
+    reconstruit lorsque les ajouts non indexés dépassent un quart de l'index;
+    ces derniers sont parcourus exactement en attendant.
+    """
+
+    def __init__(
+        self,
+        api_provider: str = "openai",
+        query_cache_size: int = 256,
+        ann_min_vectors: int = ANN_MIN_VECTORS,
+        storage: str = EMBEDDING_STORAGE,
+        pq_min_train_vectors: int = PQ_MIN_TRAIN_VECTORS
+    ):
+        # Fournisseur des embeddings: les requêtes doivent être encodées par le même modèle
+        self.api_provider = api_provider
+        self._lock = threading.Lock()
+        self.storage = storage
+        self.pq_min_train_vectors = pq_min_train_vectors
+        self._codec: VectorCodec = make_codec(storage)
+        if not self._codec.trained:
+            # Stockage exact en attendant assez de vecteurs pour l'apprentissage
+            self._codec = Float32Codec()
+        self._codes: Optional[Codes] = None
+        self._dimension = 0
+        self._document_ids = np.empty(0, dtype=np.int32)
+        # Les morceaux dont l'embedding a échoué (vecteur nul) sont exclus des recherches
+        self._valid = np.empty(0, dtype=bool)
+        self._size = 0
+        self._texts: List[str] = []
+        self._positions: List[int] = []
+        # Identifiant de document -> nom (None pour un document retiré)
+        self._names: List[Optional[str]] = []
+        self._ids: Dict[str, int] = {}
+        # Nombre de morceaux de chaque document (position du prochain morceau ajouté)
+        self._lengths: List[int] = []
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self.ann_min_vectors = ann_min_vectors
+        self._index: Optional[IVFIndex] = None
+        self._index_lock = threading.Lock()
+        # Incrémenté à chaque retrait: un index construit avant n'est plus valable
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def documents(self) -> List[str]:
+        """
+        Retourne le nom des documents du corpus, dans l'ordre d'ajout.
+        """
+        with self._lock:
+            return [name for name in self._names if name is not None]
+
+    def _reserve(self, codes: Codes) -> None:
+        capacity = 0 if self._codes is None else self._codes[0].shape[0]
+        needed = self._size + len(codes[0])
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, 64)
+        arrays = tuple(np.zeros((capacity,) + array.shape[1:], dtype=array.dtype) for array in codes)
+        document_ids = np.zeros(capacity, dtype=np.int32)
+        valid = np.zeros(capacity, dtype=bool)
+        if self._codes is not None:
+            for array, current in zip(arrays, self._codes):
+                array[:self._size] = current[:self._size]
+            document_ids[:self._size] = self._document_ids[:self._size]
+            valid[:self._size] = self._valid[:self._size]
+        # Nouveaux tableaux: les recherches en cours gardent leur instantané intact
+        self._codes, self._document_ids, self._valid = arrays, document_ids, valid
+
+    def _compact(self, keep: np.ndarray) -> None:
+        indices = np.flatnonzero(keep)
+        self._codes = tuple(array[indices].copy() for array in self._codes)
+        self._document_ids = self._document_ids[indices].copy()
+        self._valid = self._valid[indices].copy()
+        self._texts = [self._texts[i] for i in indices]
+        self._positions = [self._positions[i] for i in indices]
+        self._size = len(indices)
+        self._index = None
+        self._generation += 1
+
+    def _quantize(self) -> None:
+        """
+        Passe au format de stockage demandé une fois ses paramètres apprenables.
+        """
+        if self._codec.name == self.storage or self._size < self.pq_min_train_vectors:
+            return
+        vectors = self._codec.decode(tuple(array[:self._size] for array in self._codes))
+        codec = make_codec(self.storage)
+        codec.train(vectors)
+        self._codec, self._codes = codec, codec.encode(vectors)
+        self._index = None
+        self._generation += 1
+
+    def add_document(self, name: str, text_chunks: List[str], embeddings: List[List[float]]) -> None:
+        """
+        Ajoute (ou remplace) un document découpé en morceaux.
+
+        Args:
+            name: Le nom du document
+            text_chunks: Les morceaux de texte, dans l'ordre du document
+            embeddings: L'embedding de chaque morceau
+        """
+        self._add(name, text_chunks, embeddings, replace=True)
+
+    def append_chunks(self, name: str, text_chunks: List[str], embeddings: List[List[float]]) -> None:
+        """
+        Ajoute des morceaux à la fin d'un document (créé s'il n'existe pas):
+        un gros document est ainsi indexé au fil de son extraction.
+
+        Args:
+            name: Le nom du document
+            text_chunks: Les morceaux de texte suivants, dans l'ordre du document
+            embeddings: L'embedding de chaque morceau
+        """
+        self._add(name, text_chunks, embeddings, replace=False)
+
+    def _add(self, name: str, text_chunks: List[str], embeddings: List[List[float]], replace: bool) -> None:
+        if len(text_chunks) != len(embeddings):
+            raise ValueError("Chaque morceau de texte doit avoir un embedding.")
+        if not text_chunks:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.dimension and vectors.shape[1] != self.dimension:
+            raise ValueError(f"Dimension d'embedding incohérente: {vectors.shape[1]} au lieu de {self.dimension}.")
+        valid = np.any(vectors != 0, axis=1)
+
+        with self._lock:
+            if replace and name in self._ids:
+                self._remove(name)
+            if name not in self._ids:
+                self._ids[name] = len(self._names)
+                self._names.append(name)
+                self._lengths.append(0)
+            document_id = self._ids[name]
+
+            codes = self._codec.encode(_normalize(vectors))
+            self._reserve(codes)
+            start, end = self._size, self._size + len(vectors)
+            for array, new in zip(self._codes, codes):
+                array[start:end] = new
+            self._document_ids[start:end] = document_id
+            self._valid[start:end] = valid
+            self._texts.extend(text_chunks)
+            first = self._lengths[document_id]
+            self._positions.extend(range(first, first + len(text_chunks)))
+            self._lengths[document_id] += len(text_chunks)
+            self._size = end
+            self._dimension = vectors.shape[1]
+            self._quantize()
+
+    def _remove(self, name: str) -> None:
+        document_id = self._ids.pop(name)
+        self._names[document_id] = None
+        self._lengths[document_id] = 0
+        self._compact(self._document_ids[:self._size] != document_id)
+
+    def remove_document(self, name: str) -> None:
+        with self._lock:
+            if name in self._ids:
+                self._remove(name)
+
+    def cached_query_embedding(self, query: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._query_cache.get(query)
+            if embedding is not None:
+                self._query_cache.move_to_end(query)
+            return embedding
+
+    def cache_query_embedding(self, query: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._query_cache[query] = embedding
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+
+    def _snapshot(self, documents: Optional[List[str]]) -> Dict[str, Any]:
+        # Instantané cohérent: les ajouts n'écrivent qu'au-delà de `size` et les
+        # retraits remplacent les tableaux, le calcul peut donc se faire sans verrou
+        with self._lock:
+            size = self._size
+            candidates = self._valid[:size].copy() if size else np.zeros(0, dtype=bool)
+            if documents is not None and size:
+                wanted = [self._ids[name] for name in documents if name in self._ids]
+                candidates &= np.isin(self._document_ids[:size], wanted)
+            return {
+                "size": size,
+                "dimension": self._dimension,
+                "codec": self._codec,
+                "codes": self._codes,
+                "document_ids": self._document_ids,
+                "candidates": candidates,
+                "texts": self._texts,
+                "positions": self._positions,
+                "names": list(self._names),
+                "index": self._index,
+                "generation": self._generation,
+            }
+
+    @staticmethod
+    def _chunk(snapshot: Dict[str, Any], index: int) -> DocumentChunk:
+        return DocumentChunk(
+            snapshot["names"][snapshot["document_ids"][index]],
+            snapshot["positions"][index],
+            snapshot["texts"][index]
+        )
+
+    def count(self, documents: Optional[List[str]] = None) -> int:
+        """
+        Nombre de morceaux indexés (éventuellement limité à certains documents).
+        """
+        if documents is None:
+            return self._size
+        with self._lock:
+            wanted = [self._ids[name] for name in documents if name in self._ids]
+            return int(np.isin(self._document_ids[:self._size], wanted).sum())
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 8,
+        documents: Optional[List[str]] = None
+    ) -> List[Tuple[float, DocumentChunk]]:
+        """
+        Retourne les morceaux les plus proches d'une requête (similarité cosinus).
+
+        Args:
+            query_embedding: L'embedding de la requête
+            top_k: Le nombre maximum de morceaux retournés
+            documents: Les documents dans lesquels chercher (tous par défaut)
+
+        Returns:
+            Une liste de couples (score, morceau), du plus au moins pertinent
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        snapshot = self._snapshot(documents)
+        size = snapshot["size"]
+        if not size or not query_norm or query.shape[0] != snapshot["dimension"]:
+            return []
+        codec, codes = snapshot["codec"], snapshot["codes"]
+
+        query = query / query_norm
+        index = self._ann_index(snapshot) if size >= self.ann_min_vectors else None
+        if index is None:
+            indices = np.flatnonzero(snapshot["candidates"])
+            if not len(indices):
+                return []
+            scores = codec.scores(tuple(array[:size] for array in codes), query)[indices]
+        else:
+            # Index approximatif sur les premières lignes, recherche exacte sur les ajouts récents
+            scores, indices = index.search(query, top_k, mask=snapshot["candidates"])
+            tail = np.flatnonzero(snapshot["candidates"][len(index):]) + len(index)
+            if len(tail):
+                scores = np.concatenate((scores, codec.scores(tuple(array[tail] for array in codes), query)))
+                indices = np.concatenate((indices, tail))
+            if not len(indices):
+                return []
+
+        # Sélection partielle des k meilleurs, puis tri de ces seuls k scores
+        k = min(top_k, len(indices))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), self._chunk(snapshot, indices[i])) for i in best]
+
+    def _ann_index(self, snapshot: Dict[str, Any]) -> IVFIndex:
+        """
+        Retourne l'index approximatif, en le (re)construisant si nécessaire.
+        """
+        index, size = snapshot["index"], snapshot["size"]
+        if index is not None and size - len(index) <= len(index) // 4:
+            return index
+        with self._index_lock:
+            # Un autre thread a peut-être construit l'index pendant l'attente
+            with self._lock:
+                current = self._index if self._generation == snapshot["generation"] else None
+            if current is not None and size - len(current) <= len(current) // 4:
+                return current
+            codes = tuple(array[:size] for array in snapshot["codes"])
+            index = IVFIndex.build_from_codes(codes, snapshot["codec"])
+            with self._lock:
+                if self._generation == snapshot["generation"]:
+                    self._index = index
+            return index
+
+    def leading_chunks(self, documents: Optional[List[str]] = None) -> List[DocumentChunk]:
+        """
+        Retourne les morceaux dans l'ordre des documents (sélection sans embeddings).
+        """
+        snapshot = self._snapshot(None)
+        indices = range(snapshot["size"])
+        if documents is not None:
+            wanted = [self._ids.get(name) for name in documents]
+            indices = np.flatnonzero(np.isin(snapshot["document_ids"][:snapshot["size"]], wanted))
+        chunks = [self._chunk(snapshot, i) for i in indices]
+        return sorted(chunks, key=lambda chunk: (snapshot["names"].index(chunk.document), chunk.position))
+
+    def save(self, directory: str) -> None:
+        """
+        Sauvegarde le corpus (vecteurs encodés, textes et index approximatif s'il existe) dans un dossier.
+        """
+        snapshot = self._snapshot(None)
+        size = snapshot["size"]
+        os.makedirs(directory, exist_ok=True)
+        codes = tuple(array[:size] for array in snapshot["codes"]) if size else ()
+        save_codes(directory, "vectors", snapshot["codec"], codes)
+        np.save(os.path.join(directory, "document_ids.npy"), snapshot["document_ids"][:size])
+        with self._lock:
+            valid = self._valid[:size].copy()
+        np.save(os.path.join(directory, "valid.npy"), valid)
+        with open(os.path.join(directory, "corpus.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "api_provider": self.api_provider,
+                "storage": self.storage,
+                "codec": snapshot["codec"].name,
+                "code_arrays": len(codes),
+                "dimension": snapshot["dimension"],
+                "names": snapshot["names"],
+                "texts": snapshot["texts"][:size],
+                "positions": snapshot["positions"][:size],
+            }, f, ensure_ascii=False)
+        if snapshot["index"] is not None:
+            snapshot["index"].save(os.path.join(directory, "ivf"))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "DocumentCorpus":
+        """
+        Recharge un corpus sauvegardé. Avec `mmap`, les vecteurs et l'index
+        restent sur disque et ne sont lus qu'à la demande; le premier ajout
+        de document copie alors les vecteurs en mémoire.
+        """
+        with open(os.path.join(directory, "corpus.json"), encoding="utf-8") as f:
+            metadata = json.load(f)
+        corpus = cls(metadata["api_provider"], storage=metadata["storage"])
+        corpus._texts = metadata["texts"]
+        corpus._positions = metadata["positions"]
+        corpus._names = metadata["names"]
+        corpus._ids = {name: i for i, name in enumerate(corpus._names) if name is not None}
+        corpus._size = len(corpus._texts)
+        if corpus._size:
+            corpus._codec, corpus._codes = load_codes(directory, "vectors", metadata["codec"], metadata["code_arrays"], mmap=mmap)
+            corpus._dimension = metadata["dimension"]
+            corpus._document_ids = np.load(os.path.join(directory, "document_ids.npy"))
+            corpus._valid = np.load(os.path.join(directory, "valid.npy"))
+        corpus._lengths = np.bincount(corpus._document_ids[:corpus._size], minlength=len(corpus._names)).tolist()
+        if os.path.exists(os.path.join(directory, "ivf", "index.json")):
+            corpus._index = IVFIndex.load(os.path.join(directory, "ivf"), mmap=mmap)
+        return corpus
+
+    def restricted_to(self, documents: List[str]) -> "DocumentSubset":
+        """
+        Retourne une vue du corpus limitée à certains documents, sans copie.
+        """
+        return DocumentSubset(self, documents)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Nombre de documents, de morceaux et de caractères indexés, format et mémoire des vecteurs.
+        """
+        with self._lock:
+            return {
+                "documents": len(self._ids),
+                "chunks": self._size,
+                "characters": sum(len(text) for text in self._texts),
+                "storage": self._codec.name,
+                "vector_bytes": 0 if self._codes is None else self._size * bytes_per_vector(self._codes),
+            }
+
+
+class DocumentSubset:
+    """
+    Vue d'un DocumentCorpus restreinte à une liste de documents: mêmes
+    méthodes de recherche, même matrice d'embeddings.
+    """
+
+    def __init__(self, corpus: DocumentCorpus, documents: List[str]):
+        self.corpus = corpus
+        self.api_provider = corpus.api_provider
+        self._documents = list(documents)
+
+    def __len__(self) -> int:
+        return self.corpus.count(self._documents)
+
+    def documents(self) -> List[str]:
+        return [name for name in self.corpus.documents() if name in self._documents]
+
+    def cached_query_embedding(self, query: str) -> Optional[List[float]]:
+        return self.corpus.cached_query_embedding(query)
+
+    def cache_query_embedding(self, query: str, embedding: List[float]) -> None:
+        self.corpus.cache_query_embedding(query, embedding)
+
+    def search(self, query_embedding: List[float], top_k: int = 8) -> List[Tuple[float, DocumentChunk]]:
+        return self.corpus.search(query_embedding, top_k, documents=self._documents)
+
+    def leading_chunks(self) -> List[DocumentChunk]:
+        return self.corpus.leading_chunks(self._documents)
@@ -0,0 +1,456 @@
+import os
+import time
+import queue
+import asyncio
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Optional, List, Dict, Tuple, BinaryIO, Callable
+import numpy as np
+
+from ai_helpers import (
+    iter_document_text,
+    iter_text_chunks,
+    embed_text_batch,
+    DOCUMENT_CHUNK_TOKENS,
+    EMBEDDING_BATCH_SIZE
+)
+from document_corpus import DocumentCorpus
+from llm_coalescing import make_request_key
+from llm_metrics import get_metrics
+from llm_providers import ApiKey, resolve_model
+from shared_store import DocumentStore, get_document_store
+
+# Processus d'extraction partagés par toutes les sessions
+INGESTION_WORKERS = int(os.environ.get("INGESTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Requêtes d'embeddings simultanées par import de documents
+EMBEDDING_CONCURRENCY = int(os.environ.get("EMBEDDING_CONCURRENCY", "4"))
+
+# Lots de morceaux extraits en attente d'embeddings, par fichier: au-delà,
+# l'extraction attend; la mémoire ne dépend donc pas de la taille du fichier
+QUEUED_BATCHES = 4
+
+# Taille des blocs copiés lors de l'écriture d'un fichier importé sur disque
+_SPOOL_BLOCK_SIZE = 1024 * 1024
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_manager = None
+_process_pool_lock = threading.Lock()
+
+
+def _spawn_context():
+    # "spawn": un fork du processus Streamlit (multi-thread) n'est pas sûr
+    return multiprocessing.get_context("spawn")
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(INGESTION_WORKERS, mp_context=_spawn_context())
+        return _process_pool
+
+
+def _get_manager():
+    # Les files d'attente partagées avec les processus d'extraction
+    global _manager
+    with _process_pool_lock:
+        if _manager is None:
+            _manager = _spawn_context().Manager()
+        return _manager
+
+
+def spool_upload(file: BinaryIO, filename: str, on_progress: Optional[Callable[[int], None]] = None) -> Tuple[str, str]:
+    """
+    Copie un fichier importé sur disque, par blocs.
+
+    Args:
+        file: Le fichier importé
+        filename: Le nom du fichier (pour l'extension de la copie)
+        on_progress: Appelée avec le nombre d'octets copiés après chaque bloc
+
+    Returns:
+        Le chemin de la copie et l'empreinte SHA-256 du contenu
+    """
+    digest = hashlib.sha256()
+    copied = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as spooled:
+        file.seek(0)
+        while True:
+            block = file.read(_SPOOL_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            spooled.write(block)
+            copied += len(block)
+            if on_progress is not None:
+                on_progress(copied)
+        return spooled.name, digest.hexdigest()
+
+
+def _file_size(file: BinaryIO) -> int:
+    size = getattr(file, "size", None)
+    if size is None:
+        position = file.tell()
+        size = file.seek(0, os.SEEK_END)
+        file.seek(position)
+    return size
+
+
+def document_store_key(digest: str, api_provider: str) -> str:
+    """
+    Clé d'un document dans le stockage partagé: contenu du fichier,
+    fournisseur et modèle d'embeddings, taille des morceaux.
+    """
+    try:
+        model = resolve_model(api_provider, "embedding")
+    except ValueError:
+        model = ""
+    return make_request_key(digest, api_provider, model, DOCUMENT_CHUNK_TOKENS)
+
+
+def load_stored_document(corpus: DocumentCorpus, name: str, key: str, document_store: DocumentStore) -> Optional[Dict]:
+    """
+    Indexe dans le corpus un document déjà traité, relu depuis le stockage partagé.
+
+    Returns:
+        Le manifeste du document, ou None s'il est absent ou incomplet (rien n'est alors indexé)
+    """
+    manifest = document_store.manifest(key)
+    if manifest is None:
+        return None
+    try:
+        for number, (chunks, embeddings) in enumerate(document_store.batches(key, manifest["batches"])):
+            if number == 0:
+                corpus.add_document(name, chunks, embeddings)
+            else:
+                corpus.append_chunks(name, chunks, embeddings)
+    except KeyError as e:
+        print(f"Document incomplet dans le stockage partagé: {str(e)}")
+        corpus.remove_document(name)
+        return None
+    return manifest
+
+
+def _stream_chunks(path: str, filename: str, chunk_queue, batch_size: int) -> None:
+    """
+    Extraction et découpage d'un document, exécutés dans un processus de travail.
+
+    Les morceaux sont envoyés par lots dans `chunk_queue` dès qu'ils sont
+    produits, avec la part du fichier déjà lue: ("chunks", lot, part lue), puis
+    ("done", durée d'extraction, 1.0) ou ("error", message, 0.0). La durée
+    d'extraction exclut l'attente d'une place dans la file.
+    """
+    start = time.perf_counter()
+    waiting = 0.0
+
+    def send(message) -> None:
+        nonlocal waiting
+        put_start = time.perf_counter()
+        chunk_queue.put(message)
+        waiting += time.perf_counter() - put_start
+
+    try:
+        batch = []
+        size = max(1, os.path.getsize(path))
+        position = 0
+        with open(path, "rb") as file:
+            for chunk in iter_text_chunks(iter_document_text(file, filename), DOCUMENT_CHUNK_TOKENS):
+                batch.append(chunk)
+                if len(batch) == batch_size:
+                    # Les lecteurs PDF et ZIP se déplacent dans le fichier: on garde la position la plus avancée
+                    position = max(position, file.tell())
+                    send(("chunks", batch, min(1.0, position / size)))
+                    batch = []
+        if batch:
+            send(("chunks", batch, 1.0))
+        chunk_queue.put(("done", time.perf_counter() - start - waiting, 1.0))
+    except Exception as e:
+        chunk_queue.put(("error", str(e), 0.0))
+
+
+def _drain(chunk_queue) -> None:
+    # Débloque un processus d'extraction dont les lots ne seront pas traités
+    while chunk_queue.get()[0] == "chunks":
+        pass
+
+
+@dataclass
+class FileProgress:
+    """
+    Avancement du traitement d'un fichier importé.
+    """
+    name: str
+    size: int
+    stage: str = "waiting"  # waiting, copy, extraction, done, error
+    # Octets copiés sur disque
+    copied: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    # Part du fichier lue par l'extraction (estimation)
+    read_fraction: float = 0.0
+    extracted: bool = False
+    error: Optional[str] = None
+
+    @property
+    def fraction(self) -> float:
+        if self.stage in ("done", "error"):
+            return 1.0
+        if not self.chunks:
+            return 0.0
+        # Nombre total de morceaux inconnu avant la fin de l'extraction: estimé d'après la part lue
+        return self.embedded / self.chunks * (1.0 if self.extracted else self.read_fraction)
+
+    def describe(self) -> str:
+        if self.stage == "waiting":
+            return f"{self.name}: en attente"
+        if self.stage == "error":
+            return f"{self.name}: erreur ({self.error})"
+        if self.stage == "done":
+            return f"{self.name}: terminé ({self.chunks} morceaux)"
+        if self.stage == "copy":
+            return f"{self.name}: copie en cours ({100 * self.copied // max(1, self.size)} %)"
+        if not self.extracted:
+            return f"{self.name}: extraction en cours, embeddings {self.embedded}/{self.chunks} morceaux"
+        return f"{self.name}: embeddings {self.embedded}/{self.chunks} morceaux"
+
+
+@dataclass
+class IngestedDocument:
+    """
+    Un document extrait, découpé, encodé et indexé dans le corpus.
+    """
+    name: str
+    size: int
+    preview: str
+    characters: int
+    chunks: int
+    # Clé du document dans le stockage partagé (None sans stockage partagé)
+    store_key: Optional[str] = None
+
+
+class IngestionPipeline:
+    """
+    Import de plusieurs documents en parallèle, hors du thread de l'interface.
+
+    Chaque fichier est d'abord copié sur disque (premier étage, dans un
+    thread: start() rend la main aussitôt), puis lu progressivement dans
+    un pool de processus (PyPDF2 et les analyseurs XML sont limités par le
+    GIL): les morceaux sont transmis par lots, au fil de l'extraction, à
+    l'étage d'embeddings asynchrone (au plus `embedding_concurrency` requêtes
+    simultanées, toutes soumises à l'ordonnanceur), et chaque lot encodé est
+    ajouté au corpus dans l'ordre du document. Une file bornée entre les deux
+    étages limite la mémoire, quelle que soit la taille du fichier. Les
+    fichiers avancent indépendamment: la durée totale tend vers celle du
+    fichier le plus long.
+
+    Avec un stockage partagé, chaque lot indexé y est aussi enregistré, et un
+    fichier déjà traité (même contenu, même modèle d'embeddings) est relu
+    au lieu d'être extrait et encodé à nouveau.
+
+    L'interface suit progress() et récupère les documents terminés avec
+    completed(); rien n'est écrit dans st.session_state depuis un autre thread.
+    """
+
+    def __init__(
+        self,
+        api_key: ApiKey,
+        api_provider: str,
+        corpus: DocumentCorpus,
+        embedding_concurrency: int = EMBEDDING_CONCURRENCY,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        extraction_executor: Optional[Executor] = None,
+        document_store: Optional[DocumentStore] = None
+    ):
+        self.api_key = api_key
+        self.api_provider = api_provider
+        self.corpus = corpus
+        self.embedding_concurrency = embedding_concurrency
+        self.batch_size = batch_size
+        # Pool de processus partagé par défaut; un pool de threads convient aux petits fichiers texte
+        self._extraction_executor = extraction_executor
+        self.document_store = document_store if document_store is not None else get_document_store()
+        self._progress: Dict[str, FileProgress] = {}
+        self._completed: List[IngestedDocument] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, files: List[Tuple[str, BinaryIO]]) -> None:
+        """
+        Lance le traitement des fichiers (nom, fichier binaire) dans un thread
+        d'arrière-plan, copie sur disque comprise. Les fichiers doivent rester
+        lisibles jusqu'à la fin de leur copie.
+        """
+        with self._lock:
+            for name, file in files:
+                self._progress[name] = FileProgress(name, _file_size(file))
+        self._thread = threading.Thread(target=asyncio.run, args=(self._run(files),), name="ingestion", daemon=True)
+        self._thread.start()
+
+    def progress(self) -> List[FileProgress]:
+        """
+        Retourne une copie de l'avancement de chaque fichier, dans l'ordre d'import.
+        """
+        with self._lock:
+            return [replace(progress) for progress in self._progress.values()]
+
+    def completed(self) -> List[IngestedDocument]:
+        """
+        Retourne les documents terminés depuis le dernier appel (chacun une seule fois).
+        """
+        with self._lock:
+            documents, self._completed = self._completed, []
+            return documents
+
+    def done(self) -> bool:
+        return self._thread is not None and not self._thread.is_alive()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _update(self, name: str, **changes) -> None:
+        with self._lock:
+            progress = self._progress[name]
+            for key, value in changes.items():
+                setattr(progress, key, value)
+
+    async def _run(self, files: List[Tuple[str, BinaryIO]]) -> None:
+        semaphore = asyncio.Semaphore(self.embedding_concurrency)
+        # Les clients des fournisseurs sont synchrones: chaque lot occupe un thread le temps de la requête
+        with ThreadPoolExecutor(self.embedding_concurrency, thread_name_prefix="embedding") as threads:
+            await asyncio.gather(*(self._ingest(name, file, semaphore, threads) for name, file in files))
+
+    def _load_stored(self, name: str, store_key: str) -> bool:
+        start = time.perf_counter()
+        manifest = load_stored_document(self.corpus, name, store_key, self.document_store)
+        if manifest is None:
+            return False
+        file_type = os.path.splitext(name)[1].lower()
+        get_metrics().observe("document_stage_duration_seconds", {"stage": "shared_store", "file_type": file_type}, time.perf_counter() - start)
+        with self._lock:
+            progress = self._progress[name]
+            progress.chunks = progress.embedded = manifest["chunks"]
+            progress.extracted = True
+            progress.stage = "done"
+            self._completed.append(IngestedDocument(
+                name, progress.size, manifest["preview"], manifest["characters"], manifest["chunks"], store_key
+            ))
+        return True
+
+    async def _ingest(self, name: str, file: BinaryIO, semaphore: asyncio.Semaphore, threads: Executor) -> None:
+        loop = asyncio.get_running_loop()
+        file_type = os.path.splitext(name)[1].lower()
+        metrics = get_metrics()
+        # Lots encodés en attente d'ajout: ils sont indexés dans l'ordre du document
+        ready: Dict[int, Tuple[List[str], List[List[float]]]] = {}
+        # Un lot en échec (vecteurs nuls) n'est pas publié dans le stockage partagé
+        state = {"next": 0, "characters": 0, "preview": "", "storable": True}
+        path, store_key = None, None
+
+        def index_ready() -> None:
+            while state["next"] in ready:
+                chunks, embeddings = ready.pop(state["next"])
+                if state["next"] == 0:
+                    self.corpus.add_document(name, chunks, embeddings)
+                else:
+                    self.corpus.append_chunks(name, chunks, embeddings)
+                if store_key is not None and state["storable"]:
+                    state["storable"] = bool(np.asarray(embeddings, dtype=np.float32).any(axis=1).all())
+                    if state["storable"]:
+                        self.document_store.put_batch(store_key, state["next"], chunks, embeddings)
+                state["next"] += 1
+
+        async def embed(number: int, chunks: List[str]) -> None:
+            try:
+                embeddings = await loop.run_in_executor(threads, embed_text_batch, chunks, self.api_key, self.api_provider)
+            finally:
+                semaphore.release()
+            ready[number] = (chunks, embeddings)
+            index_ready()
+            with self._lock:
+                self._progress[name].embedded += len(chunks)
+
+        async def next_message(chunk_queue, extraction) -> tuple:
+            while True:
+                try:
+                    return await loop.run_in_executor(None, lambda: chunk_queue.get(timeout=1.0))
+                except queue.Empty:
+                    if extraction.done():
+                        # Processus d'extraction interrompu sans message de fin
+                        extraction.result()
+                        raise RuntimeError("L'extraction s'est arrêtée de façon inattendue.")
+
+        tasks = []
+        chunk_queue, extraction, kind = None, None, None
+        try:
+            # Premier étage: copie sur disque et empreinte du contenu
+            self._update(name, stage="copy")
+            path, digest = await loop.run_in_executor(
+                None, spool_upload, file, name, lambda copied: self._update(name, copied=copied)
+            )
+            if self.document_store is not None:
+                store_key = document_store_key(digest, self.api_provider)
+            
+            if store_key is not None and await loop.run_in_executor(None, self._load_stored, name, store_key):
+                return
+            
+            self._update(name, stage="extraction")
+            chunk_queue = _get_manager().Queue(QUEUED_BATCHES)
+            executor = self._extraction_executor or _get_process_pool()
+            extraction = loop.run_in_executor(executor, _stream_chunks, path, name, chunk_queue, self.batch_size)
+
+            start = time.perf_counter()
+            while True:
+                # Une place d'embedding est réservée avant de lire le lot suivant:
+                # tant qu'aucune n'est libre, la file se remplit puis l'extraction attend
+                await semaphore.acquire()
+                kind, payload, read_fraction = await next_message(chunk_queue, extraction)
+                if kind != "chunks":
+                    semaphore.release()
+                    break
+                if not state["preview"]:
+                    state["preview"] = "\n".join(payload)[:1000]
+                state["characters"] += sum(len(chunk) for chunk in payload)
+                with self._lock:
+                    self._progress[name].chunks += len(payload)
+                    self._progress[name].read_fraction = read_fraction
+                tasks.append(asyncio.ensure_future(embed(len(tasks), payload)))
+            await extraction
+            if kind == "error":
+                raise RuntimeError(payload)
+            metrics.observe("document_stage_duration_seconds", {"stage": "extraction", "file_type": file_type}, payload)
+            self._update(name, extracted=True)
+
+            await asyncio.gather(*tasks)
+            metrics.observe("document_stage_duration_seconds", {"stage": "embedding", "file_type": file_type}, time.perf_counter() - start)
+
+            with self._lock:
+                progress = self._progress[name]
+                document = IngestedDocument(name, progress.size, state["preview"], state["characters"], progress.chunks)
+            if store_key is not None and state["storable"]:
+                # Manifeste écrit en dernier: le document n'est visible qu'une fois complet
+                self.document_store.put_manifest(store_key, {
+                    "batches": state["next"], "chunks": document.chunks,
+                    "characters": document.characters, "preview": document.preview
+                })
+                document.store_key = store_key
+            with self._lock:
+                self._completed.append(document)
+                progress.stage = "done"
+        except Exception as e:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if kind == "chunks" and not extraction.done():
+                await loop.run_in_executor(None, _drain, chunk_queue)
+            # Pas de document à moitié indexé
+            self.corpus.remove_document(name)
+            self._update(name, stage="error", error=str(e))
+        finally:
+            if path is not None:
+                os.unlink(path)
@@ -0,0 +1,100 @@
+import json
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def make_request_key(*parts: Any) -> str:
+    """
+    Construit une clé stable identifiant une requête à partir de ses paramètres.
+
+    Args:
+        parts: Les éléments qui déterminent la réponse (fournisseur, modèle, prompt, clé API...)
+
+    Returns:
+        Une empreinte SHA-256 hexadécimale
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Fusionne les appels identiques simultanés: tant qu'un appel est en cours
+    pour une clé donnée, les appels suivants attendent son résultat au lieu
+    de lancer une nouvelle requête.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InFlightCall] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T], stats: Optional[dict] = None) -> T:
+        """
+        Exécute `fn` une seule fois pour tous les appelants simultanés de même clé.
+
+        Args:
+            key: La clé identifiant la requête (voir make_request_key)
+            fn: La fonction qui effectue réellement la requête
+            stats: Dictionnaire optionnel où 'cache' vaut 'coalesced' si le résultat a été partagé
+
+        Returns:
+            Le résultat de `fn`, partagé entre tous les appelants
+
+        Raises:
+            L'exception levée par `fn`, propagée à tous les appelants
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+                if stats is not None:
+                    stats["cache"] = "coalesced"
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+_single_flight = SingleFlight()
+
+
+def coalesce(key: str, fn: Callable[[], T], stats: Optional[dict] = None) -> T:
+    """
+    Exécute `fn` via l'instance SingleFlight partagée par tout le processus.
+    """
+    return _single_flight.do(key, fn, stats)
+
+
+def get_single_flight() -> SingleFlight:
+    """
+    Retourne l'instance SingleFlight partagée par tout le processus.
+    """
+    return _single_flight
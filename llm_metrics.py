@@ -0,0 +1,341 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, List, Tuple, Any
+
+# Bornes (en secondes) des histogrammes de durée
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Métriques exportées: nom -> (type Prometheus, description)
+METRICS = {
+    "llm_requests_total": ("counter", "Appels aux fournisseurs de modèles, par tâche et résultat."),
+    "llm_request_duration_seconds": ("histogram", "Durée totale d'un appel, attente dans l'ordonnanceur comprise."),
+    "llm_queue_wait_seconds": ("histogram", "Attente dans l'ordonnanceur avant l'envoi de la requête."),
+    "llm_time_to_first_token_seconds": ("histogram", "Délai avant le premier token (réponse complète pour les appels non streamés)."),
+    "llm_tokens_total": ("counter", "Tokens consommés, par type (prompt, completion, cached: part du prompt lue depuis le cache du fournisseur)."),
+    "llm_retries_total": ("counter", "Nouvelles tentatives après une erreur transitoire."),
+    "llm_cache_hits_total": ("counter", "Réponses servies sans appel au fournisseur, par cache."),
+    "llm_errors_total": ("counter", "Appels en échec, par type d'erreur."),
+    "document_stage_duration_seconds": ("histogram", "Durée des étapes de traitement des documents."),
+    "shared_store_requests_total": ("counter", "Lectures du stockage partagé, par espace (responses, documents, drafts), résultat et réplica."),
+}
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estime un quantile à partir des bornes des compartiments.
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class MetricsRegistry:
+    """
+    Registre de métriques en mémoire (compteurs et histogrammes étiquetés),
+    exportable au format texte Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+
+    def inc(self, name: str, labels: Dict[str, Any], value: float = 1.0) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: Dict[str, Any], value: float) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Mesure la durée d'un bloc dans l'histogramme `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, labels, time.perf_counter() - start)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """
+        Somme d'un compteur sur toutes les séries dont les étiquettes contiennent `labels`.
+        """
+        wanted = set(_labels(labels))
+        with self._lock:
+            return sum(value for (metric, key), value in self._counters.items() if metric == name and wanted <= set(key))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """
+        Exporte toutes les métriques au format texte Prometheus (version 0.0.4).
+        """
+        def fmt(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            for name, (metric_type, description) in METRICS.items():
+                if metric_type == "counter":
+                    series = [(labels, value) for (metric, labels), value in self._counters.items() if metric == name]
+                else:
+                    series = [(labels, hist) for (metric, labels), hist in self._histograms.items() if metric == name]
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in sorted(series, key=lambda item: item[0]):
+                    if metric_type == "counter":
+                        lines.append(f"{name}{fmt(labels)} {value:g}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + (float("inf"),), value.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{fmt(labels, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{fmt(labels)} {value.sum:g}")
+                    lines.append(f"{name}_count{fmt(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary_by_task(self) -> List[Dict[str, Any]]:
+        """
+        Résume les appels par tâche pour l'affichage: appels, erreurs,
+        latence moyenne et p95 estimé, tokens, taux de tokens de prompt lus
+        depuis le cache du fournisseur, nouvelles tentatives et cache.
+        """
+        rows: Dict[str, Dict[str, Any]] = {}
+        cached: Dict[str, float] = {}
+
+        def row(labels: Labels) -> Dict[str, Any]:
+            task = dict(labels).get("task", "")
+            return rows.setdefault(task, {
+                "tâche": task, "appels": 0, "erreurs": 0, "latence moy. (s)": 0.0, "latence p95 (s)": 0.0,
+                "tokens prompt": 0, "tokens réponse": 0, "cache prompt (%)": 0.0, "relances": 0, "cache": 0
+            })
+
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                label_dict = dict(labels)
+                if name == "llm_requests_total":
+                    row(labels)["appels"] += int(value)
+                    if label_dict.get("outcome") == "error":
+                        row(labels)["erreurs"] += int(value)
+                elif name == "llm_tokens_total":
+                    kind = label_dict.get("kind")
+                    if kind == "cached":
+                        task = label_dict.get("task", "")
+                        cached[task] = cached.get(task, 0) + value
+                    else:
+                        row(labels)["tokens prompt" if kind == "prompt" else "tokens réponse"] += int(value)
+                elif name == "llm_retries_total":
+                    row(labels)["relances"] += int(value)
+                elif name == "llm_cache_hits_total":
+                    row(labels)["cache"] += int(value)
+
+            merged: Dict[str, _Histogram] = {}
+            for (name, labels), hist in self._histograms.items():
+                if name != "llm_request_duration_seconds":
+                    continue
+                task = dict(labels).get("task", "")
+                target = merged.setdefault(task, _Histogram(hist.buckets))
+                target.counts = [a + b for a, b in zip(target.counts, hist.counts)]
+                target.sum += hist.sum
+                target.count += hist.count
+
+        for task, tokens in cached.items():
+            if task in rows and rows[task]["tokens prompt"]:
+                rows[task]["cache prompt (%)"] = round(100.0 * tokens / rows[task]["tokens prompt"], 1)
+
+        for task, hist in merged.items():
+            if task in rows and hist.count:
+                rows[task]["latence moy. (s)"] = round(hist.sum / hist.count, 3)
+                rows[task]["latence p95 (s)"] = hist.quantile(0.95)
+
+        return sorted(rows.values(), key=lambda r: r["tâche"])
+
+    def error_counts(self) -> Dict[str, int]:
+        """
+        Nombre d'appels en échec par type d'erreur (code HTTP ou exception),
+        sans les messages: le registre est partagé par toutes les sessions.
+        """
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                if name == "llm_errors_total":
+                    kind = dict(labels).get("error", "")
+                    counts[kind] = counts.get(kind, 0) + int(value)
+        return dict(sorted(counts.items()))
+
+    def shared_store_summary(self) -> List[Dict[str, Any]]:
+        """
+        Résume les lectures du stockage partagé par espace pour l'affichage:
+        lectures, taux de succès et erreurs (pour ce réplica).
+        """
+        rows: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                if name != "shared_store_requests_total":
+                    continue
+                label_dict = dict(labels)
+                row = rows.setdefault(label_dict.get("namespace", ""), {"espace": label_dict.get("namespace", ""), "lectures": 0, "succès": 0, "erreurs": 0})
+                row["lectures"] += int(value)
+                if label_dict.get("result") == "hit":
+                    row["succès"] += int(value)
+                elif label_dict.get("result") == "error":
+                    row["erreurs"] += int(value)
+        for row in rows.values():
+            row["taux de succès (%)"] = round(100.0 * row["succès"] / row["lectures"], 1) if row["lectures"] else 0.0
+        return sorted(rows.values(), key=lambda r: r["espace"])
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Retourne le registre de métriques partagé par tout le processus.
+    """
+    return _registry
+
+
+def _error_kind(error: BaseException) -> str:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+
+def record_llm_call(
+    task: str,
+    provider: str,
+    model: str,
+    seconds: float,
+    stats: Dict[str, Any],
+    result: Any = None,
+    error: Optional[BaseException] = None
+) -> None:
+    """
+    Enregistre les métriques d'un appel à un fournisseur.
+
+    Args:
+        task: La tâche ('chapter', 'embedding', ...)
+        provider: Le fournisseur appelé
+        model: Le modèle appelé
+        seconds: La durée totale de l'appel, attente comprise
+        stats: Les informations remontées par l'ordonnanceur et la fusion de requêtes
+            ('queue_seconds', 'attempt_seconds', 'retries', 'cache')
+        result: La réponse, si l'appel a réussi (les tokens sont lus sur un objet Completion)
+        error: L'exception, si l'appel a échoué
+    """
+    labels = {"task": task, "provider": provider, "model": model}
+    registry = _registry
+
+    registry.inc("llm_requests_total", dict(labels, outcome="error" if error is not None else "ok"))
+    registry.observe("llm_request_duration_seconds", labels, seconds)
+
+    if stats.get("retries"):
+        registry.inc("llm_retries_total", labels, stats["retries"])
+
+    cache = stats.get("cache")
+    if cache:
+        registry.inc("llm_cache_hits_total", dict(labels, cache=cache))
+    else:
+        registry.observe("llm_queue_wait_seconds", labels, stats.get("queue_seconds", 0.0))
+        if error is None:
+            first_token = getattr(result, "first_token_seconds", None)
+            if first_token is None:
+                first_token = stats.get("attempt_seconds", seconds)
+            registry.observe("llm_time_to_first_token_seconds", labels, first_token)
+            prompt_tokens = getattr(result, "prompt_tokens", None)
+            if prompt_tokens is None:
+                prompt_tokens = stats.get("estimated_tokens", 0)
+            registry.inc("llm_tokens_total", dict(labels, kind="prompt"), prompt_tokens)
+            registry.inc("llm_tokens_total", dict(labels, kind="completion"), getattr(result, "completion_tokens", 0))
+            cached_tokens = getattr(result, "cached_tokens", 0)
+            if cached_tokens:
+                registry.inc("llm_tokens_total", dict(labels, kind="cached"), cached_tokens)
+
+    if error is not None:
+        kind = _error_kind(error)
+        registry.inc("llm_errors_total", dict(labels, error=kind))
+        # Le message (propre à une session) reste dans les journaux du serveur
+        print(f"Erreur de l'appel {task} ({provider}/{model}): {kind}: {str(error)[:200]}")
+
+
+def document_stage(stage: str, file_type: str = ""):
+    """
+    Mesure une étape du traitement des documents (extraction, découpage, embeddings).
+    """
+    return _registry.timer("document_stage_duration_seconds", stage=stage, file_type=file_type)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = _registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> None:
+    """
+    Démarre (une seule fois par processus) un serveur HTTP exposant les métriques pour Prometheus.
+    Par défaut, il n'écoute que sur la machine locale (METRICS_HOST pour l'ouvrir).
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
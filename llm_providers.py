@@ -0,0 +1,680 @@
+import os
+import re
+import json
+import time
+import zlib
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Tuple, Union
+import anthropic
+import openai
+
+# Modèles utilisés par tâche et par fournisseur: les modèles rapides et peu
+# coûteux traitent les listes et descriptions, les grands modèles la structure
+# et les chapitres. Surchargeable via set_task_model ou la variable
+# d'environnement LLM_TASK_MODELS (JSON: {"openai": {"quiz": "gpt-4o"}}).
+DEFAULT_TASK_MODELS: Dict[str, Dict[str, str]] = {
+    "openai": {
+        "description": "gpt-4o-mini",
+        "objectives": "gpt-4o-mini",
+        "prerequisites": "gpt-4o-mini",
+        "methods": "gpt-4o-mini",
+        "setup": "gpt-4o-mini",
+        "structure": "gpt-4o",
+        "structure_outline": "gpt-4o-mini",
+        "structure_module": "gpt-4o",
+        "chapter": "gpt-4o",
+        "chapter_fragment": "gpt-4o",
+        "quiz": "gpt-4o-mini",
+        "podcast": "gpt-4o-mini",
+        "embedding": "text-embedding-3-small",
+        "speech": "tts-1",
+    },
+    "anthropic": {
+        "description": "claude-3-5-haiku-20241022",
+        "objectives": "claude-3-5-haiku-20241022",
+        "prerequisites": "claude-3-5-haiku-20241022",
+        "methods": "claude-3-5-haiku-20241022",
+        "setup": "claude-3-5-haiku-20241022",
+        "structure": "claude-3-7-sonnet-20250219",
+        "structure_outline": "claude-3-5-haiku-20241022",
+        "structure_module": "claude-3-7-sonnet-20250219",
+        "chapter": "claude-3-7-sonnet-20250219",
+        "chapter_fragment": "claude-3-7-sonnet-20250219",
+        "quiz": "claude-3-5-haiku-20241022",
+        "podcast": "claude-3-5-haiku-20241022",
+    },
+    "mock": {
+        "*": "mock-1",
+    },
+}
+
+# Variables d'environnement contenant les clés API de chaque fournisseur
+API_KEY_ENV_VARS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+}
+
+# Nombre maximal de clients conservés (un par fournisseur et par clé API):
+# au-delà, les clients des clés les moins récemment utilisées sont libérés
+PROVIDER_POOL_SIZE = int(os.environ.get("PROVIDER_POOL_SIZE", "256"))
+
+# Dimension des embeddings de text-embedding-3-small
+EMBEDDING_DIMENSION = 1536
+
+# Comportement du fournisseur local: latence avant le premier token (s),
+# débit de génération (tokens/s, 0 = instantané), taux d'erreurs simulées
+# (429 et 500) et graine du tirage des erreurs. Voir configure_mock.
+MOCK_SETTINGS = {
+    "latency": float(os.environ.get("MOCK_LLM_LATENCY", "0")),
+    "tokens_per_second": float(os.environ.get("MOCK_LLM_TOKENS_PER_SECOND", "0")),
+    "error_rate": float(os.environ.get("MOCK_LLM_ERROR_RATE", "0")),
+    "seed": int(os.environ.get("MOCK_LLM_SEED", "0")),
+}
+
+# Taille minimale (en tokens) d'un préfixe mis en cache par les fournisseurs
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+@dataclass
+class Completion:
+    """
+    Réponse d'un modèle de langage, avec les informations d'usage.
+    """
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Tokens du prompt lus depuis le cache de préfixe du fournisseur (inclus dans prompt_tokens)
+    cached_tokens: int = 0
+    # Délai avant le premier token, lorsque le fournisseur le connaît
+    first_token_seconds: Optional[float] = None
+
+
+class LLMProvider:
+    """
+    Interface commune des fournisseurs de modèles utilisée par tous les générateurs.
+    """
+    name = ""
+    label = ""
+    supports_embeddings = False
+    supports_speech = False
+
+    def complete(
+        self,
+        task: str,
+        system: str,
+        prompt: str,
+        model: str,
+        max_tokens: int,
+        temperature: float = 0.7,
+        json_mode: bool = False,
+        prefix: str = ""
+    ) -> Completion:
+        """
+        Génère une réponse à partir d'un prompt système et d'un prompt utilisateur.
+
+        Le prompt utilisateur envoyé est `prefix` suivi de `prompt`: le préfixe,
+        identique d'un appel à l'autre (contexte du cours, consignes, format),
+        est placé en tête pour profiter du cache de prompt du fournisseur.
+
+        Args:
+            task: La tâche en cours ('structure', 'chapter', 'quiz'...)
+            system: Le prompt système
+            prompt: Le prompt utilisateur (partie variable)
+            model: Le modèle à utiliser
+            max_tokens: Le nombre maximum de tokens en sortie
+            temperature: La température d'échantillonnage
+            json_mode: Si True, la réponse doit être un objet JSON
+            prefix: La partie stable du prompt utilisateur, partagée entre appels
+
+        Returns:
+            La réponse du modèle
+        """
+        raise NotImplementedError
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        """
+        Crée les embeddings d'une liste de textes.
+        """
+        raise NotImplementedError(f"Le fournisseur {self.label} ne prend pas en charge les embeddings.")
+
+    def speech(self, text: str, voice: str, model: str) -> bytes:
+        """
+        Convertit un texte en audio MP3.
+        """
+        raise NotImplementedError(f"Le fournisseur {self.label} ne prend pas en charge la synthèse vocale.")
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+    label = "OpenAI"
+    supports_embeddings = True
+    supports_speech = True
+
+    def __init__(self, api_key: str):
+        # Les relances sont gérées par l'ordonnanceur
+        self.client = openai.OpenAI(api_key=api_key, max_retries=0)
+
+    def complete(self, task, system, prompt, model, max_tokens, temperature=0.7, json_mode=False, prefix=""):
+        kwargs = {}
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+
+        # Le cache de préfixe d'OpenAI est automatique: il suffit que le début
+        # de la requête (système puis préfixe) soit identique d'un appel à l'autre
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prefix + prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        return Completion(
+            text=response.choices[0].message.content or "",
+            model=response.model or model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            cached_tokens=(getattr(details, "cached_tokens", 0) or 0) if details else 0
+        )
+
+    def embed(self, texts, model):
+        response = self.client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in response.data]
+
+    def speech(self, text, voice, model):
+        response = self.client.audio.speech.create(model=model, voice=voice, input=text)
+        return response.content
+
+
+class AnthropicProvider(LLMProvider):
+    name = "anthropic"
+    label = "Anthropic"
+
+    def __init__(self, api_key: str):
+        # Les relances sont gérées par l'ordonnanceur
+        self.client = anthropic.Anthropic(api_key=api_key, max_retries=0)
+
+    def complete(self, task, system, prompt, model, max_tokens, temperature=0.7, json_mode=False, prefix=""):
+        if json_mode:
+            # Claude n'a pas de mode JSON natif: on le demande explicitement
+            system += "\nRéponds uniquement avec un objet JSON valide, sans aucun texte avant ou après."
+
+        content = [{"type": "text", "text": prompt}]
+        if prefix:
+            # Point de cache explicite: système et préfixe sont relus depuis le cache
+            # par les appels suivants qui partagent le même début de requête
+            content.insert(0, {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}})
+
+        message = self.client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system,
+            messages=[
+                {"role": "user", "content": content}
+            ]
+        )
+
+        text = "".join(block.text for block in message.content if getattr(block, "type", "") == "text")
+        if json_mode:
+            text = extract_json_object(text)
+
+        # input_tokens n'inclut ni les tokens lus depuis le cache ni ceux qui y sont écrits
+        usage = message.usage
+        cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        return Completion(
+            text=text,
+            model=message.model or model,
+            prompt_tokens=usage.input_tokens + cache_read + cache_write,
+            completion_tokens=usage.output_tokens,
+            cached_tokens=cache_read
+        )
+
+
+def extract_json_object(text: str) -> str:
+    """
+    Extrait l'objet JSON d'une réponse qui peut contenir du texte ou des balises Markdown autour.
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        return text
+    return text[start:end + 1]
+
+
+class MockAPIError(Exception):
+    """
+    Erreur simulée par le fournisseur local, avec un code HTTP et un en-tête
+    Retry-After comme les erreurs des SDK officiels.
+    """
+
+    class _Response:
+        def __init__(self, status_code: int, headers: Dict[str, str]):
+            self.status_code = status_code
+            self.headers = headers
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"Erreur simulée {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = self._Response(status_code, headers)
+
+
+_mock_error_rng = random.Random(MOCK_SETTINGS["seed"])
+_mock_error_lock = threading.Lock()
+
+
+def configure_mock(
+    latency: Optional[float] = None,
+    tokens_per_second: Optional[float] = None,
+    error_rate: Optional[float] = None,
+    seed: Optional[int] = None
+) -> None:
+    """
+    Configure le comportement du fournisseur local.
+
+    Args:
+        latency: Latence avant le premier token, en secondes
+        tokens_per_second: Débit de génération (0 pour une réponse instantanée)
+        error_rate: Proportion d'appels qui échouent (429 ou 500), entre 0 et 1
+        seed: Graine du tirage des erreurs, pour des exécutions reproductibles
+    """
+    global _mock_error_rng
+    for name, value in (("latency", latency), ("tokens_per_second", tokens_per_second), ("error_rate", error_rate)):
+        if value is not None:
+            MOCK_SETTINGS[name] = float(value)
+    if seed is not None:
+        MOCK_SETTINGS["seed"] = seed
+        with _mock_error_lock:
+            _mock_error_rng = random.Random(seed)
+
+
+def _mock_hash_embedding(text: str) -> List[float]:
+    # Hachage des mots: des textes proches donnent des vecteurs proches
+    vector = [0.0] * EMBEDDING_DIMENSION
+    for word in re.findall(r"\w+", text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vector[h % EMBEDDING_DIMENSION] += 1.0 if h & 0x80000000 else -1.0
+    norm = sum(x * x for x in vector) ** 0.5
+    if not norm:
+        vector[0] = norm = 1.0
+    return [x / norm for x in vector]
+
+
+class MockProvider(LLMProvider):
+    """
+    Fournisseur local déterministe: aucune requête réseau, réponses générées
+    à partir du prompt. La latence, le débit et le taux d'erreurs sont
+    configurables (voir configure_mock) pour mesurer l'application hors ligne.
+    """
+    name = "mock"
+    label = "local (mock)"
+    supports_embeddings = True
+    supports_speech = True
+
+    def __init__(self, api_key: Optional[str] = None):
+        # Préfixes déjà vus, pour simuler le cache de prompt des fournisseurs
+        self._prefix_cache: "OrderedDict[str, None]" = OrderedDict()
+        self._prefix_lock = threading.Lock()
+
+    def _rng(self, *parts: str) -> random.Random:
+        seed = hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+        return random.Random(int(seed[:16], 16))
+
+    def _simulate(self, output_tokens: int) -> None:
+        """
+        Simule la latence réseau, la durée de génération et les erreurs du fournisseur.
+        """
+        time.sleep(MOCK_SETTINGS["latency"])
+
+        if MOCK_SETTINGS["error_rate"] > 0:
+            with _mock_error_lock:
+                draw = _mock_error_rng.random()
+            if draw < MOCK_SETTINGS["error_rate"]:
+                if draw < MOCK_SETTINGS["error_rate"] / 2:
+                    raise MockAPIError(429, retry_after=MOCK_SETTINGS["latency"])
+                raise MockAPIError(500)
+
+        if MOCK_SETTINGS["tokens_per_second"] > 0:
+            time.sleep(output_tokens / MOCK_SETTINGS["tokens_per_second"])
+
+    def _cached_tokens(self, model: str, system: str, prefix: str) -> int:
+        """
+        Simule le cache de préfixe: un préfixe assez long déjà envoyé est relu depuis le cache.
+        """
+        tokens = (len(system) + len(prefix)) // 4
+        if not prefix or tokens < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        key = hashlib.sha256("\x00".join((model, system, prefix)).encode("utf-8")).hexdigest()
+        with self._prefix_lock:
+            if key in self._prefix_cache:
+                self._prefix_cache.move_to_end(key)
+                return tokens
+            self._prefix_cache[key] = None
+            if len(self._prefix_cache) > 1000:
+                self._prefix_cache.popitem(last=False)
+        return 0
+
+    def complete(self, task, system, prompt, model, max_tokens, temperature=0.7, json_mode=False, prefix=""):
+        full_prompt = prefix + prompt
+        builder = _MOCK_BUILDERS.get(task)
+        if builder is not None:
+            result = builder(full_prompt, self._rng(task, full_prompt))
+        else:
+            result = {} if json_mode else f"Réponse simulée ({task})."
+        text = json.dumps(result, ensure_ascii=False) if isinstance(result, (dict, list)) else result
+
+        completion = Completion(
+            text=text,
+            model=model,
+            prompt_tokens=(len(system) + len(full_prompt)) // 4,
+            completion_tokens=min(len(text) // 4, max_tokens),
+            cached_tokens=self._cached_tokens(model, system, prefix),
+            first_token_seconds=MOCK_SETTINGS["latency"]
+        )
+        self._simulate(completion.completion_tokens)
+        return completion
+
+    def embed(self, texts, model):
+        self._simulate(0)
+        return [_mock_hash_embedding(text) for text in texts]
+
+    def speech(self, text, voice, model):
+        self._simulate(len(text) // 4)
+        # Trame MP3 silencieuse répétée proportionnellement à la longueur du texte
+        frame = b"\xff\xfb\x90\x64" + b"\x00" * 413
+        return frame * max(1, len(text) // 100)
+
+
+def _mock_int(pattern: str, prompt: str, default: int) -> int:
+    match = re.search(pattern, prompt)
+    return int(match.group(1)) if match else default
+
+
+def _mock_list(label: str):
+    def build(prompt, rng):
+        return "\n".join(f"{i}. {label} {i} (simulé)" for i in range(1, 6))
+    return build
+
+
+def _mock_setup(prompt, rng):
+    return {
+        "learning_objectives": [f"Objectif {i} (simulé)" for i in range(1, 6)],
+        "prerequisites": [f"Prérequis {i} (simulé)" for i in range(1, 5)],
+        "learning_methods": [f"Méthode {i} (simulée)" for i in range(1, 4)]
+    }
+
+
+def _mock_description(prompt, rng):
+    return "Description simulée du cours: un parcours progressif, concret et engageant."
+
+
+def _mock_structure(prompt, rng):
+    num_modules = _mock_int(r"Nombre de modules souhaité: (\d+)", prompt, 3)
+    return {
+        "modules": [
+            {
+                "module_number": m,
+                "module_title": f"Module simulé {m}",
+                "chapters": [
+                    {
+                        "chapter_number": float(f"{m}.{c}"),
+                        "chapter_title": f"Chapitre simulé {m}.{c}",
+                        "description": f"Description du chapitre {m}.{c}.",
+                        "key_points": [f"Point clé {k}" for k in range(1, 4)]
+                    }
+                    for c in range(1, 4)
+                ]
+            }
+            for m in range(1, num_modules + 1)
+        ]
+    }
+
+
+def _mock_structure_outline(prompt, rng):
+    num_modules = _mock_int(r"Génère exactement (\d+) modules", prompt, 3)
+    return {
+        "modules": [
+            {"module_number": m, "module_title": f"Module simulé {m}", "module_description": f"Description du module {m}."}
+            for m in range(1, num_modules + 1)
+        ]
+    }
+
+
+def _mock_structure_module(prompt, rng):
+    m = _mock_int(r"Module à détailler: (\d+)", prompt, 1)
+    return {
+        "chapters": [
+            {
+                "chapter_number": float(f"{m}.{c}"),
+                "chapter_title": f"Chapitre simulé {m}.{c}",
+                "description": f"Description du chapitre {m}.{c}.",
+                "key_points": [f"Point clé {k}" for k in range(1, 4)]
+            }
+            for c in range(1, 4)
+        ]
+    }
+
+
+def _mock_chapter(prompt, rng):
+    return {
+        "introduction": "Introduction simulée du chapitre.",
+        "sections": [
+            {
+                "title": f"Section {s}",
+                "content": "Contenu simulé. " * rng.randint(20, 40),
+                "examples": [f"Exemple {s}.{e}" for e in range(1, 3)]
+            }
+            for s in range(1, 4)
+        ],
+        "conclusion": "Conclusion simulée du chapitre.",
+        "exercises": [
+            {"question": f"Question {q}", "answer": f"Réponse {q}"}
+            for q in range(1, 3)
+        ]
+    }
+
+
+def _mock_chapter_fragment(prompt, rng):
+    fragment = re.search(r"Partie à réécrire: (\w+)", prompt)
+    fragment = fragment.group(1) if fragment else "introduction"
+    if fragment == "section":
+        return {"section": {"title": "Section réécrite", "content": "Contenu réécrit. " * rng.randint(10, 30), "examples": ["Exemple réécrit"]}}
+    if fragment == "exercises":
+        return {"exercises": [{"question": f"Question réécrite {q}", "answer": f"Réponse {q}"} for q in range(1, 4)]}
+    return {fragment: f"Texte réécrit ({fragment})."}
+
+
+def _mock_quiz(prompt, rng):
+    num_questions = _mock_int(r"Nombre de questions: (\d+)", prompt, 10)
+    module_number = _mock_int(r"Module à évaluer:\s*Module (\d+):", prompt, 1)
+    return {
+        "module_title": f"Module {module_number}",
+        "module_number": module_number,
+        "quiz_title": f"Quiz du module {module_number}",
+        "difficulty_level": "Moyen",
+        "questions": [
+            {
+                "question_number": q,
+                "question_text": f"Question simulée {q}",
+                "question_type": "Choix multiple",
+                "options": ["Option A", "Option B", "Option C", "Option D"],
+                "correct_answer": rng.choice(["Option A", "Option B", "Option C", "Option D"]),
+                "explanation": "Explication simulée."
+            }
+            for q in range(1, num_questions + 1)
+        ]
+    }
+
+
+def _mock_podcast(prompt, rng):
+    return {
+        "podcast_title": "Podcast simulé",
+        "format": "Interview",
+        "duration": "15-20 minutes",
+        "target_audience": "Étudiants",
+        "participants": ["Hôte", "Invité"],
+        "script_sections": [
+            {"section_title": "Introduction", "content": "Bienvenue dans ce podcast simulé."},
+            {"section_title": "Développement", "content": "Discussion simulée. " * 20},
+            {"section_title": "Conclusion", "content": "Merci de votre écoute."}
+        ]
+    }
+
+
+_MOCK_BUILDERS = {
+    "description": _mock_description,
+    "objectives": _mock_list("Objectif"),
+    "prerequisites": _mock_list("Prérequis"),
+    "methods": _mock_list("Méthode"),
+    "setup": _mock_setup,
+    "structure": _mock_structure,
+    "structure_outline": _mock_structure_outline,
+    "structure_module": _mock_structure_module,
+    "chapter": _mock_chapter,
+    "chapter_fragment": _mock_chapter_fragment,
+    "quiz": _mock_quiz,
+    "podcast": _mock_podcast,
+}
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+    "mock": MockProvider,
+}
+
+_task_models: Dict[str, Dict[str, str]] = {provider: dict(models) for provider, models in DEFAULT_TASK_MODELS.items()}
+try:
+    for _provider, _models in json.loads(os.environ.get("LLM_TASK_MODELS", "{}")).items():
+        _task_models.setdefault(_provider, {}).update(_models)
+except (ValueError, AttributeError):
+    print("Variable d'environnement LLM_TASK_MODELS invalide, routage par défaut utilisé.")
+
+_pool: "OrderedDict[Tuple[str, str], LLMProvider]" = OrderedDict()
+_pool_lock = threading.Lock()
+
+
+def set_task_model(provider: str, task: str, model: str) -> None:
+    """
+    Définit le modèle utilisé pour une tâche donnée chez un fournisseur.
+
+    Args:
+        provider: Le fournisseur ('openai', 'anthropic', 'mock')
+        task: La tâche ('structure', 'chapter', ...) ou '*' pour toutes les tâches
+        model: Le nom du modèle
+    """
+    _task_models.setdefault(provider, {})[task] = model
+
+
+def resolve_model(provider: str, task: str) -> str:
+    """
+    Retourne le modèle à utiliser pour une tâche chez un fournisseur.
+    """
+    models = _task_models.get(provider, {})
+    model = models.get(task) or models.get("*")
+    if not model:
+        raise ValueError(f"Aucun modèle configuré pour la tâche '{task}' chez '{provider}'.")
+    return model
+
+
+@dataclass(frozen=True)
+class Credentials:
+    """
+    Clés API d'une session, par fournisseur. Passées explicitement aux
+    fonctions de génération (paramètre api_key), elles ne sont jamais écrites
+    dans os.environ, partagé par toutes les sessions du processus: plusieurs
+    auteurs peuvent utiliser leurs propres clés dans le même serveur.
+    """
+    keys: Tuple[Tuple[str, str], ...] = field(default=(), repr=False)
+
+    @classmethod
+    def from_keys(cls, keys: Dict[str, str]) -> "Credentials":
+        """
+        Crée les identifiants d'une session à partir des clés saisies (les clés vides sont ignorées).
+        """
+        return cls(tuple(sorted((provider, key.strip()) for provider, key in keys.items() if key and key.strip())))
+
+    def key_for(self, provider: str) -> Optional[str]:
+        """
+        Retourne la clé de la session pour un fournisseur, None si elle n'a pas été saisie.
+        """
+        return dict(self.keys).get(provider)
+
+
+# Clé API d'un fournisseur, ou identifiants de la session pour tous les fournisseurs
+ApiKey = Union[str, Credentials, None]
+
+
+def resolve_api_key(provider: str, api_key: ApiKey = None) -> Optional[str]:
+    """
+    Retourne la clé API fournie (ou celle du fournisseur dans les identifiants
+    de la session), sinon celle de la variable d'environnement du fournisseur,
+    configurée pour tout le serveur. Le fournisseur local n'a pas besoin de clé.
+    """
+    if isinstance(api_key, Credentials):
+        api_key = api_key.key_for(provider)
+    if provider == "mock":
+        return api_key or "mock"
+    env_var = API_KEY_ENV_VARS.get(provider)
+    return api_key or (os.environ.get(env_var) if env_var else None)
+
+
+def provider_label(provider: str) -> str:
+    """
+    Retourne le nom affichable d'un fournisseur.
+    """
+    provider_class = PROVIDERS.get(provider.lower())
+    return provider_class.label if provider_class else provider
+
+
+def missing_api_key_message(provider: str) -> str:
+    """
+    Message d'erreur affiché lorsque la clé API d'un fournisseur est introuvable.
+    """
+    label = provider_label(provider)
+    return f"Clé API {label} non trouvée. Veuillez configurer la variable d'environnement {API_KEY_ENV_VARS.get(provider, '')}."
+
+
+def get_provider(provider: str, api_key: str) -> LLMProvider:
+    """
+    Retourne une instance de fournisseur, réutilisée pour une même clé API
+    afin de conserver les connexions HTTP ouvertes. Chaque clé a son propre
+    client: les sessions ne partagent jamais un client configuré pour une
+    autre clé que la leur.
+
+    Args:
+        provider: Le fournisseur ('openai', 'anthropic', 'mock')
+        api_key: La clé API
+
+    Returns:
+        L'instance du fournisseur
+
+    Raises:
+        ValueError: Si le fournisseur n'est pas pris en charge
+    """
+    provider = provider.lower()
+    if provider not in PROVIDERS:
+        raise ValueError(f"Fournisseur d'API non pris en charge: {provider}. Utilisez {', '.join(repr(p) for p in PROVIDERS)}.")
+
+    key = (provider, api_key)
+    with _pool_lock:
+        instance = _pool.get(key)
+        if instance is None:
+            instance = PROVIDERS[provider](api_key)
+            _pool[key] = instance
+            if len(_pool) > PROVIDER_POOL_SIZE:
+                _pool.popitem(last=False)
+        else:
+            _pool.move_to_end(key)
+        return instance
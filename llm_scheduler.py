@@ -0,0 +1,363 @@
+import time
+import random
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Tuple, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Priorités des requêtes: plus la valeur est basse, plus la requête passe tôt
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+PRIORITY_PREFETCH = 20
+
+# Limites par défaut (requêtes/min, tokens/min) par fournisseur et modèle.
+# La clé (fournisseur, "*") sert de valeur par défaut pour un fournisseur.
+DEFAULT_LIMITS: Dict[Tuple[str, str], Tuple[int, int]] = {
+    ("openai", "gpt-4o"): (500, 30000),
+    ("openai", "gpt-4o-mini"): (500, 200000),
+    ("openai", "gpt-4-turbo"): (500, 30000),
+    ("openai", "text-embedding-3-small"): (3000, 1000000),
+    ("openai", "tts-1"): (50, 100000),
+    ("openai", "*"): (500, 30000),
+    ("anthropic", "*"): (50, 40000),
+    ("mock", "*"): (1000000, 1000000000),
+}
+
+# Codes HTTP pour lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Codes HTTP d'une requête refusée pour son contenu
+INVALID_REQUEST_STATUS_CODES = {400, 413}
+
+# Priorité de la requête courante (propagée aux threads via contextvars)
+_current_priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "llm_request_priority", default=PRIORITY_INTERACTIVE
+)
+
+
+@contextmanager
+def use_priority(priority: int):
+    """
+    Définit la priorité des appels LLM effectués dans ce contexte.
+
+    Args:
+        priority: PRIORITY_INTERACTIVE, PRIORITY_BATCH ou toute autre valeur entière
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def estimate_tokens(*texts: str, max_tokens: int = 0) -> int:
+    """
+    Estime grossièrement le nombre de tokens consommés par une requête.
+
+    Args:
+        texts: Les textes envoyés au modèle
+        max_tokens: Le nombre maximum de tokens demandés en sortie
+
+    Returns:
+        Une estimation du nombre total de tokens (entrée + sortie)
+    """
+    # Approximation usuelle: environ 4 caractères par token
+    return sum(len(text) for text in texts if text) // 4 + max_tokens
+
+
+class TokenBucket:
+    """
+    Seau à jetons classique: `capacity` jetons au maximum, rechargés à raison
+    de `capacity` jetons par minute.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Retourne le temps d'attente (en secondes) avant de pouvoir consommer `amount` jetons.
+        """
+        self._refill(now)
+        # Une requête plus grosse que le seau ne doit pas bloquer indéfiniment
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """
+        Corrige le débit d'une requête une fois son coût réel connu: un
+        montant positif est prélevé (le seau peut passer en négatif et retarde
+        alors les requêtes suivantes), un montant négatif est rendu.
+        """
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class _Lane:
+    """
+    File d'attente prioritaire et seaux à jetons d'un couple (fournisseur, modèle).
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.configure(rpm, tpm)
+        self.queue: list = []
+        # Pause imposée par le fournisseur (Retry-After) pour tout le couple
+        self.blocked_until = 0.0
+
+    def configure(self, rpm: int, tpm: int) -> None:
+        # Les seaux sont remplacés sur place: les requêtes en attente gardent la même file
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def wait_time(self, estimated_tokens: int, now: float) -> float:
+        return max(
+            self.blocked_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(estimated_tokens, now),
+        )
+
+
+class RequestScheduler:
+    """
+    Ordonnanceur central des appels LLM.
+
+    Chaque couple (fournisseur, modèle) dispose de deux seaux à jetons
+    (requêtes/min et tokens/min) et d'une file prioritaire: les requêtes
+    interactives passent devant les requêtes batch. Les erreurs transitoires
+    (429, 5xx, coupures réseau) sont relancées avec un backoff exponentiel
+    à gigue, en respectant l'en-tête Retry-After lorsqu'il est présent.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[Tuple[str, str], Tuple[int, int]]] = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lanes: Dict[Tuple[str, str], _Lane] = {}
+        self._cond = threading.Condition()
+        self._counter = itertools.count()
+
+    def configure(self, provider: str, model: str, rpm: int, tpm: int) -> None:
+        """
+        Définit les limites (requêtes/min, tokens/min) d'un couple fournisseur/modèle.
+
+        Args:
+            provider: Le fournisseur ('openai', 'anthropic', ...)
+            model: Le nom du modèle, ou '*' pour la valeur par défaut du fournisseur
+            rpm: Nombre maximum de requêtes par minute
+            tpm: Nombre maximum de tokens par minute
+        """
+        with self._cond:
+            self.limits[(provider, model)] = (rpm, tpm)
+            # Les files existantes (et leurs requêtes en attente) sont gardées,
+            # seules leurs limites changent
+            for key, lane in self._lanes.items():
+                if key == (provider, model) or (model == "*" and key[0] == provider and key not in self.limits):
+                    lane.configure(*self._limits_for(key))
+            self._cond.notify_all()
+
+    def _limits_for(self, key: Tuple[str, str]) -> Tuple[int, int]:
+        return self.limits.get(key) or self.limits.get((key[0], "*"), (60, 60000))
+
+    def _lane(self, provider: str, model: str) -> _Lane:
+        key = (provider, model)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = _Lane(*self._limits_for(key))
+            self._lanes[key] = lane
+        return lane
+
+    def _acquire(self, provider: str, model: str, estimated_tokens: int, priority: int) -> None:
+        with self._cond:
+            lane = self._lane(provider, model)
+            ticket = (priority, next(self._counter))
+            heapq.heappush(lane.queue, ticket)
+            try:
+                while True:
+                    if lane.queue[0] == ticket:
+                        wait = lane.wait_time(estimated_tokens, time.monotonic())
+                        if wait <= 0:
+                            lane.requests.consume(1)
+                            lane.tokens.consume(estimated_tokens)
+                            return
+                        self._cond.wait(timeout=wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                lane.queue.remove(ticket)
+                heapq.heapify(lane.queue)
+                self._cond.notify_all()
+
+    def _settle(self, provider: str, model: str, estimated_tokens: int, result: object) -> None:
+        # Remplace l'estimation prélevée par les tokens réellement consommés,
+        # lorsque la réponse les indique (objet Completion)
+        used = (getattr(result, "prompt_tokens", 0) or 0) + (getattr(result, "completion_tokens", 0) or 0)
+        if not used:
+            return
+        with self._cond:
+            lane = self._lane(provider, model)
+            lane.tokens.adjust(used - min(estimated_tokens, lane.tokens.capacity))
+            self._cond.notify_all()
+
+    def _block(self, provider: str, model: str, delay: float) -> None:
+        with self._cond:
+            lane = self._lane(provider, model)
+            lane.blocked_until = max(lane.blocked_until, time.monotonic() + delay)
+
+    def _backoff(self, attempt: int) -> float:
+        # Backoff exponentiel avec gigue complète
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def submit(
+        self,
+        fn: Callable[[], T],
+        provider: str,
+        model: str,
+        estimated_tokens: int = 0,
+        priority: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        stats: Optional[dict] = None
+    ) -> T:
+        """
+        Exécute `fn` en respectant les limites du fournisseur, avec relances.
+
+        Args:
+            fn: La fonction qui effectue l'appel à l'API
+            provider: Le fournisseur appelé
+            model: Le modèle appelé
+            estimated_tokens: Estimation des tokens consommés (voir estimate_tokens)
+            priority: Priorité de la requête (par défaut celle du contexte courant)
+            max_retries: Nombre maximum de nouvelles tentatives
+            stats: Dictionnaire optionnel complété avec 'retries', 'queue_seconds'
+                et 'attempt_seconds' (durée de la dernière tentative)
+
+        Returns:
+            Le résultat de `fn`
+
+        Raises:
+            La dernière exception levée par `fn` si elle n'est pas transitoire
+            ou si le nombre de tentatives est épuisé
+        """
+        if priority is None:
+            priority = _current_priority.get()
+        if max_retries is None:
+            max_retries = self.max_retries
+
+        if stats is None:
+            stats = {}
+        stats.setdefault("queue_seconds", 0.0)
+
+        attempt = 0
+        while True:
+            stats["retries"] = attempt
+            queued = time.perf_counter()
+            self._acquire(provider, model, estimated_tokens, priority)
+            started = time.perf_counter()
+            stats["queue_seconds"] += started - queued
+            try:
+                result = fn()
+            except Exception as e:
+                # Durée de la tentative seule, sans la pause avant la suivante
+                stats["attempt_seconds"] = time.perf_counter() - started
+                if attempt >= max_retries or not is_retryable_error(e):
+                    raise
+                retry_after = get_retry_after(e)
+                if retry_after is not None:
+                    # Le fournisseur impose une pause: elle s'applique à toute la file
+                    delay = min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+                    self._block(provider, model, delay)
+                else:
+                    delay = self._backoff(attempt)
+                attempt += 1
+                time.sleep(delay)
+                continue
+            stats["attempt_seconds"] = time.perf_counter() - started
+            self._settle(provider, model, estimated_tokens, result)
+            return result
+
+
+def _error_status(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Indique si une erreur d'appel API est transitoire (limite de débit, surcharge, réseau).
+    """
+    status = _error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # Erreurs réseau des bibliothèques requests, openai, anthropic et httpx
+    name = type(error).__name__
+    return "Connection" in name or "Timeout" in name
+
+
+def is_invalid_request_error(error: Exception) -> bool:
+    """
+    Indique si le fournisseur a refusé la requête elle-même (entrée trop
+    longue, paramètre invalide): la renvoyer telle quelle échouera encore.
+    """
+    return _error_status(error) in INVALID_REQUEST_STATUS_CODES
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Extrait le délai Retry-After (en secondes) de la réponse associée à une erreur.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000.0
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # Format date HTTP
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """
+    Retourne l'ordonnanceur partagé par tout le processus.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
@@ -0,0 +1,163 @@
+import os
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Optional, List, Dict, Union, BinaryIO
+
+# Dépendances facultatives: sans elles (ou sans le binaire tesseract), pas d'OCR
+try:
+    import pytesseract
+    import pypdfium2
+except ImportError:
+    pytesseract = None
+    pypdfium2 = None
+
+# OCR des pages sans texte exploitable (désactivable avec OCR_ENABLED=0)
+OCR_ENABLED = os.environ.get("OCR_ENABLED", "1") != "0"
+
+# Langues tesseract, résolution de rendu et nombre de pages reconnues en parallèle
+OCR_LANGUAGES = os.environ.get("OCR_LANGUAGES", "fra+eng")
+OCR_DPI = int(os.environ.get("OCR_DPI", "200"))
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Une page avec moins de caractères que ce seuil est considérée comme numérisée
+OCR_MIN_PAGE_CHARS = int(os.environ.get("OCR_MIN_PAGE_CHARS", "80"))
+
+# Cache disque des textes reconnus, partagé entre les processus d'extraction
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "lms_ocr_cache"))
+
+# Part minimale de caractères lisibles dans le texte d'une page
+_MIN_READABLE_RATIO = 0.7
+_READABLE_PUNCTUATION = set(".,;:!?'\"()[]-–—%/«»’…*+=<>")
+
+_available: Optional[bool] = None
+_available_lock = threading.Lock()
+
+
+def is_low_text_page(text: str) -> bool:
+    """
+    Indique si le texte extrait d'une page est vide, trop court ou illisible
+    (polices sans table de caractères, glyphes '(cid:12)' d'exports de diapositives).
+
+    Args:
+        text: Le texte extrait de la page
+
+    Returns:
+        True si la page doit passer par l'OCR
+    """
+    stripped = text.strip()
+    if len(stripped) < OCR_MIN_PAGE_CHARS or "(cid:" in stripped:
+        return True
+    readable = sum(1 for ch in stripped if ch.isalnum() or ch.isspace() or ch in _READABLE_PUNCTUATION)
+    return readable / len(stripped) < _MIN_READABLE_RATIO
+
+
+def ocr_available() -> bool:
+    """
+    Indique si l'OCR local est activé et utilisable (pytesseract, pypdfium2 et le binaire tesseract).
+    """
+    global _available
+    with _available_lock:
+        if _available is None:
+            _available = False
+            if OCR_ENABLED and pytesseract is not None and pypdfium2 is not None:
+                try:
+                    pytesseract.get_tesseract_version()
+                    _available = True
+                except Exception as e:
+                    print(f"OCR indisponible: {str(e)}")
+        return _available
+
+
+class OCRCache:
+    """
+    Cache disque des textes reconnus, indexé par l'empreinte de l'image de la
+    page: une page déjà reconnue ne repasse jamais par tesseract, même dans
+    un autre document ou un autre processus.
+    """
+
+    def __init__(self, directory: str = OCR_CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".txt")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Écriture atomique: un autre processus ne lit jamais un fichier partiel
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path), delete=False) as f:
+                f.write(text)
+            os.replace(f.name, path)
+        except OSError as e:
+            print(f"Erreur lors de l'écriture du cache OCR: {str(e)}")
+
+
+def _page_key(image) -> str:
+    digest = hashlib.sha256(image.tobytes())
+    digest.update(f"{image.size}|{OCR_LANGUAGES}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _recognize(image) -> str:
+    return pytesseract.image_to_string(image, lang=OCR_LANGUAGES)
+
+
+def ocr_pages(pdf_data: Union[bytes, str, BinaryIO], page_numbers: List[int], cache: Optional[OCRCache] = None) -> Dict[int, str]:
+    """
+    Reconnaît le texte de certaines pages d'un PDF, en parallèle.
+
+    Les pages sont rendues une à une (pdfium n'est pas thread-safe) puis
+    reconnues par OCR_WORKERS appels tesseract simultanés; au plus deux
+    images par processus de reconnaissance sont gardées en mémoire.
+
+    Args:
+        pdf_data: Le fichier PDF (contenu, chemin ou fichier ouvert)
+        page_numbers: Les numéros (à partir de 0) des pages à reconnaître
+        cache: Le cache des pages déjà reconnues (cache disque par défaut)
+
+    Returns:
+        Le texte reconnu par numéro de page (les pages en échec sont absentes)
+    """
+    cache = cache or OCRCache()
+    results: Dict[int, str] = {}
+    pending: Dict[Future, tuple] = {}
+
+    def collect(futures) -> None:
+        for future in futures:
+            number, key = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"Erreur OCR de la page {number + 1}: {str(e)}")
+                continue
+            cache.put(key, text)
+            results[number] = text
+
+    document = pypdfium2.PdfDocument(pdf_data)
+    try:
+        with ThreadPoolExecutor(OCR_WORKERS, thread_name_prefix="ocr") as executor:
+            for number in page_numbers:
+                image = document[number].render(scale=OCR_DPI / 72, grayscale=True).to_pil()
+                key = _page_key(image)
+                cached = cache.get(key)
+                if cached is not None:
+                    results[number] = cached
+                    continue
+                if len(pending) >= 2 * OCR_WORKERS:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(_recognize, image)] = (number, key)
+            collect(list(pending))
+    finally:
+        document.close()
+    return results
@@ -0,0 +1,92 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, List, Tuple, Callable, Any, Hashable
+
+from llm_scheduler import use_priority, PRIORITY_PREFETCH
+
+# Budget de tokens (estimés) alloué au préchargement pour une même structure de cours
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("PREFETCH_TOKEN_BUDGET", "20000"))
+
+# Pool partagé par toutes les sessions: le préchargement reste marginal
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+# Un travail de préchargement: (clé, coût estimé en tokens, fonction de génération)
+PrefetchJob = Tuple[Hashable, int, Callable[[], Any]]
+
+
+def _run_prefetch(fn: Callable[[], Any]) -> Any:
+    with use_priority(PRIORITY_PREFETCH):
+        return fn()
+
+
+class Prefetcher:
+    """
+    Génère en arrière-plan, en priorité basse, les artefacts que l'auteur
+    demandera probablement ensuite. Les résultats sont récupérés par le
+    thread de l'interface via collect(), jamais écrits directement dans
+    st.session_state depuis un autre thread.
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.fingerprint: Optional[str] = None
+        self.spent = 0
+        self._futures: Dict[Hashable, Future] = {}
+        self._scheduled: set = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, fingerprint: str, jobs: List[PrefetchJob]) -> None:
+        """
+        Planifie des travaux de préchargement pour une version des données.
+
+        Si `fingerprint` change (structure régénérée), les travaux en attente
+        sont annulés, leurs résultats ignorés et le budget remis à zéro.
+
+        Args:
+            fingerprint: L'empreinte des données dont dépendent les travaux
+            jobs: Les travaux à planifier, par ordre de priorité
+        """
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                for future in self._futures.values():
+                    future.cancel()
+                self._futures.clear()
+                self._scheduled.clear()
+                self.fingerprint = fingerprint
+                self.spent = 0
+
+            for key, cost, fn in jobs:
+                if key in self._scheduled:
+                    continue
+                if self.spent + cost > self.token_budget:
+                    # Budget épuisé: les travaux suivants ne sont pas lancés
+                    break
+                self.spent += cost
+                self._scheduled.add(key)
+                self._futures[key] = _executor.submit(_run_prefetch, fn)
+
+    def collect(self) -> Dict[Hashable, Any]:
+        """
+        Retourne les résultats des travaux terminés avec succès (chacun une seule fois).
+        """
+        results = {}
+        with self._lock:
+            for key, future in list(self._futures.items()):
+                if not future.done():
+                    continue
+                del self._futures[key]
+                if future.cancelled() or future.exception() is not None:
+                    continue
+                result = future.result()
+                if isinstance(result, dict) and "error" in result:
+                    continue
+                results[key] = result
+        return results
+
+    def pending(self) -> int:
+        """
+        Nombre de travaux encore en cours.
+        """
+        with self._lock:
+            return sum(1 for future in self._futures.values() if not future.done())
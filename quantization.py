@@ -0,0 +1,240 @@
+import os
+from typing import Tuple, Dict, Optional
+import numpy as np
+
+# Format de stockage des embeddings du corpus: float32, float16, int8 ou pq
+EMBEDDING_STORAGE = os.environ.get("EMBEDDING_STORAGE", "float32")
+
+# Nombre de vecteurs nécessaires pour apprendre les dictionnaires de la quantification produit
+PQ_MIN_TRAIN_VECTORS = int(os.environ.get("PQ_MIN_TRAIN_VECTORS", "4096"))
+
+# Vecteurs encodés: un ou plusieurs tableaux de même première dimension
+Codes = Tuple[np.ndarray, ...]
+
+# Nombre de lignes décodées à la fois lors d'un calcul de scores: un bloc
+# décodé de 2048 x 1536 float32 (12 Mo) reste proche des caches du processeur
+_BLOCK_ROWS = 2048
+
+
+def iter_blocks(codes: Codes, block_rows: int = _BLOCK_ROWS):
+    """
+    Parcourt des vecteurs encodés par blocs de lignes: (première ligne, bloc).
+    """
+    for start in range(0, len(codes[0]), block_rows):
+        yield start, tuple(np.asarray(array[start:start + block_rows]) for array in codes)
+
+
+class VectorCodec:
+    """
+    Format de stockage compact des embeddings. Les scores (produit scalaire
+    avec une requête) sont calculés directement sur la forme encodée, bloc
+    par bloc, sans jamais décompresser toute la matrice.
+    """
+    name = ""
+    trained = True
+    # Noms des paramètres appris (voir state)
+    state_keys: Tuple[str, ...] = ()
+
+    def train(self, vectors: np.ndarray) -> None:
+        pass
+
+    def encode(self, vectors: np.ndarray) -> Codes:
+        raise NotImplementedError
+
+    def decode(self, codes: Codes) -> np.ndarray:
+        raise NotImplementedError
+
+    def scores(self, codes: Codes, query: np.ndarray) -> np.ndarray:
+        """
+        Produit scalaire de chaque vecteur encodé avec une requête float32.
+        """
+        result = np.empty(len(codes[0]), dtype=np.float32)
+        for start, block in iter_blocks(codes):
+            result[start:start + len(block[0])] = self.decode(block) @ query
+        return result
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """
+        Paramètres appris, à sauvegarder avec les vecteurs encodés.
+        """
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        pass
+
+
+class Float32Codec(VectorCodec):
+    name = "float32"
+
+    def encode(self, vectors):
+        return (np.asarray(vectors, dtype=np.float32),)
+
+    def decode(self, codes):
+        return np.asarray(codes[0], dtype=np.float32)
+
+    def scores(self, codes, query):
+        return codes[0] @ query
+
+
+class Float16Codec(VectorCodec):
+    """
+    Demi-précision: 2 octets par dimension, erreur relative d'environ 1e-3.
+    """
+    name = "float16"
+
+    def encode(self, vectors):
+        return (np.asarray(vectors, dtype=np.float16),)
+
+    def decode(self, codes):
+        return codes[0].astype(np.float32)
+
+
+class Int8Codec(VectorCodec):
+    """
+    Entiers sur 8 bits avec une échelle par vecteur: 1 octet par dimension
+    plus 4 octets d'échelle.
+    """
+    name = "int8"
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def decode(self, codes):
+        return codes[0].astype(np.float32) * codes[1][:, None]
+
+    def scores(self, codes, query):
+        # L'échelle s'applique au score plutôt qu'à chaque composante
+        result = np.empty(len(codes[0]), dtype=np.float32)
+        for start, (values, scales) in iter_blocks(codes):
+            result[start:start + len(values)] = (values.astype(np.float32) @ query) * scales
+        return result
+
+
+def _euclidean_kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        distances = (centroids ** 2).sum(axis=1) - 2 * vectors @ centroids.T
+        assignments = np.argmin(distances, axis=1)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.stack([np.bincount(assignments, weights=column, minlength=k) for column in vectors.T], axis=1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class PQCodec(VectorCodec):
+    """
+    Quantification produit: chaque vecteur est découpé en `subspaces`
+    sous-vecteurs, chacun remplacé par l'indice (1 octet) du plus proche des
+    256 centroïdes appris pour son sous-espace. Les scores se calculent par
+    table de correspondance (distance asymétrique) sans reconstruire les vecteurs.
+    """
+    name = "pq"
+    state_keys = ("codebooks",)
+
+    def __init__(self, subspaces: Optional[int] = None, iterations: int = 10, sample_size: int = 16384, seed: int = 0):
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.sample_size = sample_size
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dimension = vectors.shape[1]
+        if self.subspaces is None:
+            # 8 dimensions par sous-espace: 1536 dimensions -> 192 octets par vecteur
+            self.subspaces = max(1, dimension // 8)
+        if dimension % self.subspaces:
+            raise ValueError(f"La dimension {dimension} n'est pas divisible par {self.subspaces} sous-espaces.")
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.sample_size:
+            vectors = vectors[np.sort(rng.choice(len(vectors), self.sample_size, replace=False))]
+        k = min(256, len(vectors))
+        parts = vectors.reshape(len(vectors), self.subspaces, -1)
+        self.codebooks = np.stack([
+            _euclidean_kmeans(np.ascontiguousarray(parts[:, j]), k, self.iterations, rng)
+            for j in range(self.subspaces)
+        ])
+
+    def encode(self, vectors):
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        squared_norms = (self.codebooks ** 2).sum(axis=2)
+        for start, (block,) in iter_blocks((vectors,)):
+            parts = block.astype(np.float32).reshape(len(block), self.subspaces, -1)
+            for j, codebook in enumerate(self.codebooks):
+                distances = squared_norms[j] - 2 * parts[:, j] @ codebook.T
+                codes[start:start + len(block), j] = np.argmin(distances, axis=1)
+        return (codes,)
+
+    def decode(self, codes):
+        return self.codebooks[np.arange(self.subspaces), codes[0]].reshape(len(codes[0]), -1)
+
+    def scores(self, codes, query):
+        # Table (sous-espace, centroïde) des produits scalaires avec la requête
+        table = np.einsum("jkd,jd->jk", self.codebooks, query.reshape(self.subspaces, -1))
+        result = np.empty(len(codes[0]), dtype=np.float32)
+        columns = np.arange(self.subspaces)
+        for start, (block,) in iter_blocks(codes):
+            result[start:start + len(block)] = table[columns, block].sum(axis=1)
+        return result
+
+    def state(self):
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state):
+        self.codebooks = np.asarray(state["codebooks"])
+        self.subspaces = len(self.codebooks)
+
+
+CODECS = {
+    "float32": Float32Codec,
+    "float16": Float16Codec,
+    "int8": Int8Codec,
+    "pq": PQCodec,
+}
+
+
+def make_codec(name: str) -> VectorCodec:
+    """
+    Crée un format de stockage à partir de son nom ('float32', 'float16', 'int8' ou 'pq').
+    """
+    if name not in CODECS:
+        raise ValueError(f"Format de stockage inconnu: {name}. Formats disponibles: {', '.join(CODECS)}.")
+    return CODECS[name]()
+
+
+def bytes_per_vector(codes: Codes) -> int:
+    """
+    Taille en octets d'un vecteur encodé.
+    """
+    return sum(array.itemsize * int(np.prod(array.shape[1:])) for array in codes)
+
+
+def save_codes(directory: str, prefix: str, codec: VectorCodec, codes: Codes) -> None:
+    """
+    Sauvegarde des vecteurs encodés et les paramètres de leur format (un fichier .npy par tableau).
+    """
+    for i, array in enumerate(codes):
+        np.save(os.path.join(directory, f"{prefix}_{i}.npy"), array)
+    for key, array in codec.state().items():
+        np.save(os.path.join(directory, f"{prefix}_codec_{key}.npy"), array)
+
+
+def load_codes(directory: str, prefix: str, name: str, count: int, mmap: bool = True) -> Tuple[VectorCodec, Codes]:
+    """
+    Recharge des vecteurs encodés (en mémoire projetée par défaut) et leur format.
+    """
+    codec = make_codec(name)
+    mode = "r" if mmap else None
+    codes = tuple(np.load(os.path.join(directory, f"{prefix}_{i}.npy"), mmap_mode=mode) for i in range(count))
+    codec.load_state({key: np.load(os.path.join(directory, f"{prefix}_codec_{key}.npy")) for key in codec.state_keys})
+    return codec, codes
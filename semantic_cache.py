@@ -0,0 +1,153 @@
+import os
+import re
+import zlib
+import hashlib
+import threading
+from typing import Optional, List, Any, Sequence
+import numpy as np
+
+# Cache sémantique des réponses courtes (description, objectifs, prérequis,
+# méthodes): une requête dont les entrées (titre, description) ne diffèrent
+# d'une requête déjà servie que par une faute de frappe, la casse ou des
+# espaces reçoit la même réponse (les nombres doivent être identiques).
+# Désactivé par défaut: SEMANTIC_CACHE_ENABLED=1.
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "0") == "1"
+
+# Similarité cosinus minimale, champ par champ, pour réutiliser une réponse
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+
+# Nombre maximal d'entrées gardées (les moins récemment utilisées sont évincées)
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "1024"))
+
+# Dimension des vecteurs de trigrammes de caractères
+_DIMENSION = 512
+
+
+def embed_text(text: str, dimension: int = _DIMENSION) -> np.ndarray:
+    """
+    Vecteur local d'un texte: trigrammes de caractères (minuscules, espaces
+    normalisés) répartis par hachage, normalisé. Aucun appel réseau: une
+    correction de faute change quelques trigrammes sur plusieurs centaines.
+
+    Args:
+        text: Le texte
+        dimension: La dimension du vecteur
+
+    Returns:
+        Le vecteur normalisé (float32)
+    """
+    padded = f" {' '.join(text.lower().split())} "
+    grams = (padded[i:i + 3].encode("utf-8") for i in range(max(1, len(padded) - 2)))
+    indices = np.fromiter((zlib.crc32(gram) % dimension for gram in grams), dtype=np.int64)
+    vector = np.bincount(indices, minlength=dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _namespace_id(namespace: str, inputs: Sequence[str]) -> int:
+    # Les nombres des entrées font partie de l'espace de noms: "niveau 1" et
+    # "niveau 2" sont aussi proches en trigrammes qu'une faute de frappe
+    numbers = [re.findall(r"\d+", text) for text in inputs]
+    return int(hashlib.sha256(repr((namespace, numbers)).encode("utf-8")).hexdigest()[:15], 16)
+
+
+class SemanticCache:
+    """
+    Index local (NumPy) des entrées des requêtes déjà servies, de taille
+    bornée, avec éviction de l'entrée la moins récemment utilisée.
+
+    Chaque entrée garde un vecteur par champ (titre, description...): une
+    réponse n'est réutilisée que si chaque champ est assez proche, pour
+    qu'un titre différent avec la même description ne soit pas confondu.
+    Les espaces de noms (fournisseur, modèle, clé API, tâche) ne se mélangent pas.
+    """
+
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD, fields: int = 2):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.fields = fields
+        self._vectors = np.zeros((max_entries, fields, _DIMENSION), dtype=np.float32)
+        self._namespaces = np.zeros(max_entries, dtype=np.int64)
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._values: List[Any] = [None] * max_entries
+        self._count = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, inputs: Sequence[str]) -> np.ndarray:
+        if len(inputs) != self.fields:
+            raise ValueError(f"Le cache sémantique attend {self.fields} champs, {len(inputs)} reçus.")
+        return np.stack([embed_text(text) for text in inputs])
+
+    def lookup(self, namespace: str, inputs: Sequence[str]) -> Optional[Any]:
+        """
+        Cherche une réponse servie pour des entrées assez proches.
+
+        Args:
+            namespace: L'espace de noms de la requête
+            inputs: Les entrées de la requête, un texte par champ
+
+        Returns:
+            La réponse de l'entrée la plus proche au-dessus du seuil, ou None
+        """
+        query = self._embed(inputs)
+        with self._lock:
+            candidates = np.flatnonzero(self._namespaces[:self._count] == _namespace_id(namespace, inputs))
+            if not len(candidates):
+                return None
+            # Similarité de l'entrée: celle de son champ le moins proche
+            similarities = np.einsum("nfd,fd->nf", self._vectors[candidates], query).min(axis=1)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            slot = candidates[best]
+            self._clock += 1
+            self._last_used[slot] = self._clock
+            return self._values[slot]
+
+    def add(self, namespace: str, inputs: Sequence[str], value: Any) -> None:
+        """
+        Enregistre la réponse servie pour des entrées (en évinçant au besoin
+        l'entrée la moins récemment utilisée).
+        """
+        vectors = self._embed(inputs)
+        with self._lock:
+            if self._count < self.max_entries:
+                slot = self._count
+                self._count += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+            self._clock += 1
+            self._vectors[slot] = vectors
+            self._namespaces[slot] = _namespace_id(namespace, inputs)
+            self._last_used[slot] = self._clock
+            self._values[slot] = value
+
+    def __len__(self) -> int:
+        return self._count
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Retourne le cache sémantique du processus, None s'il est désactivé.
+    """
+    global _cache
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
+
+
+def set_semantic_cache(cache: Optional[SemanticCache]) -> None:
+    """
+    Remplace le cache sémantique du processus (None pour le désactiver).
+    """
+    global _cache, SEMANTIC_CACHE_ENABLED
+    with _cache_lock:
+        _cache = cache
+        SEMANTIC_CACHE_ENABLED = cache is not None
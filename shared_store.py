@@ -0,0 +1,373 @@
+import io
+import os
+import json
+import time
+import socket
+import struct
+import sqlite3
+import threading
+from dataclasses import asdict
+from typing import Optional, List, Dict, Tuple, Any, Iterator
+import numpy as np
+
+from llm_metrics import get_metrics
+from llm_providers import Completion
+
+# Dépendance facultative: sans elle, pas de stockage Redis
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Stockage partagé entre les sessions, les processus et les réplicas:
+#   sqlite:///chemin/vers/partage.db (processus d'un même nœud),
+#   redis://hôte:6379/0 (plusieurs nœuds), memory:// (un seul processus).
+# Vide: aucun stockage partagé, l'état reste propre à chaque session.
+SHARED_STORE_URL = os.environ.get("SHARED_STORE_URL", "")
+
+# Identifiant du réplica dans les métriques (taux de succès par réplica)
+REPLICA_ID = os.environ.get("REPLICA_ID", f"{socket.gethostname()}-{os.getpid()}")
+
+# Durées de conservation (s) des réponses des modèles, des documents traités et des brouillons
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+DOCUMENT_STORE_TTL = float(os.environ.get("DOCUMENT_STORE_TTL", str(30 * 24 * 3600)))
+DRAFT_TTL = float(os.environ.get("DRAFT_TTL", str(30 * 24 * 3600)))
+
+# Mise en cache des réponses des modèles (désactivable avec RESPONSE_CACHE_ENABLED=0)
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") != "0"
+
+# Attente maximale (s) d'un verrou SQLite tenu par un autre processus
+SQLITE_BUSY_TIMEOUT = 10.0
+
+# Nombre d'écritures SQLite entre deux purges des entrées expirées
+_PURGE_EVERY = 256
+
+
+class SharedStore:
+    """
+    Stockage clé-valeur (octets) partagé, organisé en espaces de noms
+    ('responses', 'documents', 'drafts'), avec expiration.
+
+    Les lectures sont comptées par espace et par réplica (métrique
+    shared_store_requests_total). Une panne du stockage n'interrompt jamais
+    la génération: l'erreur est comptée et la valeur considérée absente.
+    """
+    name = ""
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        try:
+            value = self._get(namespace, key)
+            result = "hit" if value is not None else "miss"
+        except Exception as e:
+            print(f"Erreur de lecture du stockage partagé ({self.name}): {str(e)}")
+            value, result = None, "error"
+        get_metrics().inc("shared_store_requests_total", {"namespace": namespace, "result": result, "replica": REPLICA_ID})
+        return value
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        try:
+            self._set(namespace, key, value, ttl)
+        except Exception as e:
+            print(f"Erreur d'écriture du stockage partagé ({self.name}): {str(e)}")
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self._delete(namespace, key)
+        except Exception as e:
+            print(f"Erreur de suppression dans le stockage partagé ({self.name}): {str(e)}")
+
+    def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def _set(self, namespace: str, key: str, value: bytes, ttl: Optional[float]) -> None:
+        raise NotImplementedError
+
+    def _delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryStore(SharedStore):
+    """
+    Stockage en mémoire du processus: remplace Redis en local (développement,
+    benchmarks), avec la même interface et la même expiration.
+    """
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Tuple[bytes, Optional[float]]] = {}
+
+    def _get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._entries[(namespace, key)]
+                return None
+            return value
+
+    def _set(self, namespace, key, value, ttl):
+        with self._lock:
+            self._entries[(namespace, key)] = (bytes(value), time.time() + ttl if ttl else None)
+
+    def _delete(self, namespace, key):
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+
+class SQLiteStore(SharedStore):
+    """
+    Stockage dans un fichier SQLite en mode WAL, partagé par les processus
+    d'un même nœud: les lectures ne bloquent pas les écritures, et les
+    écritures concurrentes attendent le verrou du fichier (SQLITE_BUSY_TIMEOUT)
+    au lieu d'échouer. Une connexion par thread.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires REAL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # isolation_level=None: chaque instruction est sa propre transaction, le verrou d'écriture est tenu le moins longtemps possible
+            connection = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _get(self, namespace, key):
+        row = self._connection().execute(
+            "SELECT value, expires FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return bytes(row[0])
+
+    def _set(self, namespace, key, value, ttl):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+            (namespace, key, sqlite3.Binary(value), time.time() + ttl if ttl else None)
+        )
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            connection.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+
+    def _delete(self, namespace, key):
+        self._connection().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+class RedisStore(SharedStore):
+    """
+    Stockage Redis (ou tout serveur compatible avec le protocole Redis),
+    partagé par tous les réplicas. `client` permet de fournir un client
+    compatible redis-py, par exemple un substitut local pour les tests.
+    """
+    name = "redis"
+
+    def __init__(self, url: str = "", client: Any = None, prefix: str = "lms"):
+        if client is None:
+            if redis is None:
+                raise ValueError("Le paquet redis est nécessaire pour SHARED_STORE_URL=redis://... (pip install redis).")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def _get(self, namespace, key):
+        return self.client.get(self._key(namespace, key))
+
+    def _set(self, namespace, key, value, ttl):
+        self.client.set(self._key(namespace, key), value, px=int(ttl * 1000) if ttl else None)
+
+    def _delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+
+def open_store(url: str) -> Optional[SharedStore]:
+    """
+    Ouvre le stockage partagé désigné par une URL (voir SHARED_STORE_URL).
+
+    Returns:
+        Le stockage, ou None si l'URL est vide
+
+    Raises:
+        ValueError: Si le type de stockage n'est pas pris en charge
+    """
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryStore()
+    if url.startswith("sqlite://"):
+        return SQLiteStore(url[len("sqlite://"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    raise ValueError(f"Stockage partagé non pris en charge: {url}. Utilisez sqlite://, redis:// ou memory://.")
+
+
+_store: Optional[SharedStore] = None
+_store_opened = False
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> Optional[SharedStore]:
+    """
+    Retourne le stockage partagé du processus (None si SHARED_STORE_URL est vide).
+    """
+    global _store, _store_opened
+    with _store_lock:
+        if not _store_opened:
+            _store = open_store(SHARED_STORE_URL)
+            _store_opened = True
+        return _store
+
+
+def set_shared_store(store: Optional[SharedStore]) -> None:
+    """
+    Remplace le stockage partagé du processus (benchmarks, tests de charge).
+    """
+    global _store, _store_opened
+    with _store_lock:
+        _store, _store_opened = store, True
+
+
+class ResponseCache:
+    """
+    Réponses déterministes des modèles (embeddings), indexées par la clé de
+    requête (fournisseur, modèle, clé API, prompt...): une requête identique
+    envoyée depuis une autre session ou un autre réplica est servie sans
+    appel au fournisseur. La clé API fait partie de la clé: les réponses ne
+    sont partagées qu'entre les sessions d'un même compte.
+    """
+    namespace = "responses"
+
+    def __init__(self, store: SharedStore, ttl: float = RESPONSE_CACHE_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        data = self.store.get(self.namespace, key)
+        if data is None:
+            return None
+        if data[:1] == b"C":
+            return Completion(**json.loads(data[1:].decode("utf-8")))
+        return np.load(io.BytesIO(data[1:]), allow_pickle=False).tolist()
+
+    def put(self, key: str, result: Any) -> None:
+        if isinstance(result, Completion):
+            data = b"C" + json.dumps(asdict(result), ensure_ascii=False).encode("utf-8")
+        elif isinstance(result, list) and result and isinstance(result[0], list):
+            buffer = io.BytesIO()
+            np.save(buffer, np.asarray(result, dtype=np.float32), allow_pickle=False)
+            data = b"E" + buffer.getvalue()
+        else:
+            return
+        self.store.set(self.namespace, key, data, self.ttl)
+
+
+def _encode_batch(chunks: List[str], embeddings: Any) -> bytes:
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    header = json.dumps({"chunks": chunks, "shape": list(vectors.shape)}, ensure_ascii=False).encode("utf-8")
+    return struct.pack("<I", len(header)) + header + vectors.tobytes()
+
+
+def _decode_batch(data: bytes) -> Tuple[List[str], np.ndarray]:
+    (length,) = struct.unpack("<I", data[:4])
+    header = json.loads(data[4:4 + length].decode("utf-8"))
+    vectors = np.frombuffer(data[4 + length:], dtype=np.float32).reshape(header["shape"])
+    return header["chunks"], vectors
+
+
+class DocumentStore:
+    """
+    Documents déjà traités (morceaux et embeddings, par lots), indexés par
+    l'empreinte du contenu du fichier et les paramètres d'extraction et
+    d'embeddings: un fichier déjà importé dans une autre session ou sur un
+    autre réplica n'est ni extrait ni encodé à nouveau. Le manifeste est
+    écrit en dernier: un document interrompu n'est jamais visible.
+    """
+    namespace = "documents"
+
+    def __init__(self, store: SharedStore, ttl: float = DOCUMENT_STORE_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def put_batch(self, key: str, number: int, chunks: List[str], embeddings: Any) -> None:
+        self.store.set(self.namespace, f"{key}:{number}", _encode_batch(chunks, embeddings), self.ttl)
+
+    def put_manifest(self, key: str, manifest: Dict[str, Any]) -> None:
+        """
+        Publie un document complet: nombre de lots, de morceaux et de caractères, aperçu.
+        """
+        self.store.set(self.namespace, key, json.dumps(manifest, ensure_ascii=False).encode("utf-8"), self.ttl)
+
+    def manifest(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self.store.get(self.namespace, key)
+        return json.loads(data.decode("utf-8")) if data is not None else None
+
+    def batches(self, key: str, count: int) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Relit les lots d'un document, dans l'ordre.
+
+        Raises:
+            KeyError: Si un lot a expiré ou a été évincé du stockage
+        """
+        for number in range(count):
+            data = self.store.get(self.namespace, f"{key}:{number}")
+            if data is None:
+                raise KeyError(f"Lot {number} du document {key} introuvable dans le stockage partagé.")
+            yield _decode_batch(data)
+
+
+class DraftStore:
+    """
+    Brouillons de cours (informations, artefacts générés, documents importés),
+    indexés par un identifiant porté par l'URL: une reconnexion, sur ce
+    réplica ou un autre, retrouve le cours en cours d'édition. Les clés API
+    n'en font jamais partie.
+    """
+    namespace = "drafts"
+
+    def __init__(self, store: SharedStore, ttl: float = DRAFT_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def save(self, draft_id: str, draft: Dict[str, Any]) -> None:
+        self.store.set(self.namespace, draft_id, json.dumps(draft, ensure_ascii=False).encode("utf-8"), self.ttl)
+
+    def load(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        data = self.store.get(self.namespace, draft_id)
+        return json.loads(data.decode("utf-8")) if data is not None else None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Retourne le cache partagé des réponses, None sans stockage partagé ou s'il est désactivé.
+    """
+    store = get_shared_store()
+    return ResponseCache(store) if store is not None and RESPONSE_CACHE_ENABLED else None
+
+
+def get_document_store() -> Optional[DocumentStore]:
+    store = get_shared_store()
+    return DocumentStore(store) if store is not None else None
+
+
+def get_draft_store() -> Optional[DraftStore]:
+    store = get_shared_store()
+    return DraftStore(store) if store is not None else None